@@ -0,0 +1,129 @@
+import os
+from collections import deque
+from queue import Empty
+from threading import Condition
+
+import numpy as np
+
+from config import (
+    AUDIO_QUEUE_MAXSIZE,
+    AUDIO_OVERLOAD_POLICY,
+    AUDIO_SPILL_DIR,
+)
+from audio_capture import temp_audio_files
+from logging_utils import log_and_print, WARNING
+from metrics import AUDIO_CHUNKS_DROPPED, AUDIO_CHUNKS_SPILLED, AUDIO_SPILL_DEPTH
+from pipeline_journal import journal_chunk_done
+
+class BoundedAudioQueue:
+    """
+    Queue of AudioChunks between the capture and transcription workers, holding at most
+    AUDIO_QUEUE_MAXSIZE chunks in memory. What happens when it is full depends on the policy:
+
+    "spill"       => further chunks are saved to AUDIO_SPILL_DIR and read back in order once
+                     the in-memory chunks have been transcribed. Nothing is lost; the transcript
+                     just falls further behind real time.
+    "drop_oldest" => the oldest waiting chunk is discarded to make room, so transcription stays
+                     close to real time at the cost of gaps.
+    "degrade"     => the transcription worker switches to the faster WHISPER_DEGRADED_MODEL while
+                     the backlog is large (see whisper_transcribe); if the queue still fills up,
+                     the oldest chunk is dropped as with "drop_oldest".
+
+    put() never blocks, so the capture worker keeps draining its ring buffer.
+    It offers the subset of the queue.Queue interface the workers use.
+    """
+    def __init__(self, maxsize=AUDIO_QUEUE_MAXSIZE, policy=AUDIO_OVERLOAD_POLICY, spill_dir=AUDIO_SPILL_DIR):
+        self.maxsize = maxsize
+        self.policy = policy.lower()
+        self.spill_dir = spill_dir
+        self._memory = deque()
+        self._spilled = deque()  # AudioChunks whose audio is the path of a spill file (or a temp WAV in "file" mode)
+        self._cond = Condition()
+        self._spill_count = 0
+        self.dropped = 0
+        AUDIO_SPILL_DEPTH.set_function(lambda: len(self._spilled))
+
+        if self.policy == "spill":
+            os.makedirs(spill_dir, exist_ok=True)
+            stale = [name for name in os.listdir(spill_dir) if name.endswith(".npy")]
+            for name in stale:
+                os.remove(os.path.join(spill_dir, name))
+            if stale:
+                log_and_print(f"Removed {len(stale)} audio spill files left over from an earlier session.", level=WARNING)
+
+    def qsize(self):
+        with self._cond:
+            return len(self._memory) + len(self._spilled)
+
+    def empty(self):
+        return self.qsize() == 0
+
+    def put(self, chunk):
+        with self._cond:
+            if self._spilled or len(self._memory) >= self.maxsize:
+                if self.policy == "spill" and chunk is not None:
+                    self._spilled.append(self._spill(chunk))
+                    AUDIO_CHUNKS_SPILLED.inc()
+                    if len(self._spilled) == 1:
+                        log_and_print(f"Transcription is falling behind; spilling audio chunks to '{self.spill_dir}'.", level=WARNING)
+                    self._cond.notify()
+                    return
+                if len(self._memory) >= self.maxsize:
+                    self._drop_oldest()
+            self._memory.append(chunk)
+            self._cond.notify()
+
+    def get(self, block=True, timeout=None):
+        with self._cond:
+            if block and not self._cond.wait_for(lambda: self._memory or self._spilled, timeout):
+                raise Empty
+            if self._memory:
+                return self._memory.popleft()
+            if self._spilled:
+                return self._unspill(self._spilled.popleft())
+            raise Empty
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def task_done(self):
+        pass  # Nothing waits on this queue with join()
+
+    def _spill(self, chunk):
+        # "file" mode chunks already live on disk as temp WAV files
+        if isinstance(chunk.audio, np.ndarray):
+            path = os.path.join(self.spill_dir, f"chunk_{self._spill_count:08d}.npy")
+            self._spill_count += 1
+            np.save(path, chunk.audio)
+            chunk.audio = path
+        return chunk
+
+    def _unspill(self, chunk):
+        if isinstance(chunk.audio, str) and chunk.audio.endswith(".npy"):
+            path = chunk.audio
+            chunk.audio = np.load(path)
+            os.remove(path)
+            if not self._spilled:
+                log_and_print("Audio spill backlog cleared.")
+        return chunk
+
+    def _drop_oldest(self):
+        """
+        Drops the oldest waiting chunk that may be dropped. A final chunk ends its source (e.g. an
+        ingest session, which only closes once it is transcribed) and None stops the worker, so
+        those are never dropped; if nothing else is waiting the queue holds one chunk too many.
+        """
+        oldest = next((chunk for chunk in self._memory if chunk is not None and not chunk.final), None)
+        if oldest is None:
+            return
+        self._memory.remove(oldest)
+        self.dropped += 1
+        AUDIO_CHUNKS_DROPPED.inc()
+        journal_chunk_done(oldest)  # Dropped on purpose; not to be recovered after a crash
+        if isinstance(oldest.audio, str):
+            # Temp WAV from "file" capture mode
+            if os.path.exists(oldest.audio):
+                os.remove(oldest.audio)
+            if oldest.audio in temp_audio_files:
+                temp_audio_files.remove(oldest.audio)
+        log_and_print(f"Audio queue full; dropped the oldest chunk ({self.dropped} dropped so far).", level=WARNING)
@@ -1,35 +1,129 @@
 import os
+import time
 import tempfile
+from threading import Condition
+from queue import Queue
+
+import numpy as np
 import sounddevice as sd
 import soundfile as sf
-from queue import Queue
 
 from config import (
     TRANSCRIPTION_INTERVAL,
     SAMPLERATE,
     CHANNELS,
+    AUDIO_CAPTURE_MODE,
+    AUDIO_RING_BUFFER_CHUNKS,
+    AUDIO_CHUNK_OVERLAP,
+    DEFAULT_AUDIO_SOURCE,
 )
 import config
-from logging_utils import log_and_print, shutdown_event
+from logging_utils import log_and_print, shutdown_event, DEBUG
+from metrics import AUDIO_CHUNKS_CAPTURED, AUDIO_FRAMES_LOST
+from pipeline_journal import journal_chunk
 
+# Only used by the legacy "file" capture mode
 temp_audio_files = []
 
+class AudioChunk:
+    """
+    One captured chunk handed from the capture worker to the transcription worker.
+    'audio' is a 1-D float32 array ("stream" mode) or a temp WAV path ("file" mode).
+    'start_time' is the wall-clock time of the first sample and 'overlap' is how many
+    seconds at the end of this chunk are repeated at the start of the next one.
+    'source' names the microphone (or file, or ingest client) the chunk came from; 'final'
+    marks the last chunk of a source whose audio has ended.
+    """
+    def __init__(self, audio, start_time, duration, overlap=0.0, source=DEFAULT_AUDIO_SOURCE, final=False):
+        self.audio = audio
+        self.start_time = start_time
+        self.duration = duration
+        self.overlap = overlap
+        self.source = source
+        self.final = final
+        self.journal_id = None  # Set once the chunk is recorded in the crash recovery journal
+
+    @property
+    def end_time(self):
+        return self.start_time + self.duration
+
+class AudioRingBuffer:
+    """
+    Preallocated ring buffer filled by the sounddevice stream callback and
+    consumed in fixed-size chunks by the capture worker.
+    Positions are absolute frame counts, so the reader always knows exactly
+    which part of the stream it is looking at.
+    """
+    def __init__(self, capacity_frames, channels):
+        self._buffer = np.zeros((capacity_frames, channels), dtype=np.float32)
+        self._capacity = capacity_frames
+        self._write_pos = 0
+        self._read_pos = 0
+        self._cond = Condition()
+        self.overrun_frames = 0   # Frames overwritten before the reader got to them
+        self.input_overflows = 0  # Overflows reported by PortAudio itself
+
+    def write(self, frames):
+        """Copy frames into the buffer. Called from the audio callback, so it never blocks for long."""
+        n = len(frames)
+        with self._cond:
+            start = self._write_pos % self._capacity
+            first = min(n, self._capacity - start)
+            self._buffer[start:start + first] = frames[:first]
+            if first < n:
+                self._buffer[:n - first] = frames[first:]
+            self._write_pos += n
+
+            behind = self._write_pos - self._read_pos
+            if behind > self._capacity:
+                self.overrun_frames += behind - self._capacity
+                self._read_pos = self._write_pos - self._capacity
+            self._cond.notify()
+
+    def read(self, num_frames, hop_frames=None, timeout=None):
+        """
+        Wait until num_frames unread frames are available and return (chunk, start_frame),
+        where start_frame is the absolute stream position of the chunk's first frame.
+        The read position then advances by hop_frames (default num_frames), so a hop
+        shorter than the chunk makes consecutive chunks overlap.
+        The copy is taken under the lock so the callback can keep writing into the
+        same memory straight away. Returns (None, None) on timeout.
+        """
+        if hop_frames is None:
+            hop_frames = num_frames
+        with self._cond:
+            ready = self._cond.wait_for(lambda: self._write_pos - self._read_pos >= num_frames, timeout)
+            if not ready:
+                return None, None
+            start_frame = self._read_pos
+            start = self._read_pos % self._capacity
+            end = start + num_frames
+            if end <= self._capacity:
+                chunk = self._buffer[start:end].copy()
+            else:
+                chunk = np.concatenate((self._buffer[start:], self._buffer[:end - self._capacity]))
+            self._read_pos += hop_frames
+            return chunk, start_frame
+
+def _to_mono(chunk):
+    """Whisper expects a 1-D float32 signal, so collapse the channel axis."""
+    if chunk.shape[1] == 1:
+        return chunk.reshape(-1)
+    return chunk.mean(axis=1, dtype=np.float32)
+
 def capture_audio_chunk(duration=TRANSCRIPTION_INTERVAL, samplerate=SAMPLERATE, channels=CHANNELS, device=None):
     """
-    Capture audio from the microphone for a fixed duration.
+    Capture audio from the microphone for a fixed duration (legacy "file" mode).
     Returns the path to a temporary WAV file containing the recorded audio.
+    Each recording has its own input stream: sd.rec()/sd.wait() share one global stream,
+    so capture threads of several sources would cut off each other's recordings.
     """
     if device is None:
         device = config.MICROPHONE_INDEX  # Get the current value from config
-        
-    log_and_print(f"Recording audio chunk...")
-    audio_data = sd.rec(
-        int(duration * samplerate),
-        samplerate=samplerate,
-        channels=channels,
-        device=device
-    )
-    sd.wait()
+
+    log_and_print(f"Recording audio chunk from device {device}...")
+    with sd.InputStream(samplerate=samplerate, channels=channels, device=device, dtype="float32") as stream:
+        audio_data, _ = stream.read(int(duration * samplerate))
 
     tmp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".wav")
     tmp_filename = tmp_file.name
@@ -40,17 +134,81 @@ def capture_audio_chunk(duration=TRANSCRIPTION_INTERVAL, samplerate=SAMPLERATE,
     log_and_print(f"Audio chunk saved to {tmp_filename}")
     return tmp_filename
 
-def audio_capture_worker(audio_queue: Queue):
+def _file_capture_loop(audio_queue: Queue, device=None, source=DEFAULT_AUDIO_SOURCE):
+    """Legacy mode: record, save to a temp WAV file and enqueue its path."""
+    if AUDIO_CHUNK_OVERLAP > 0:
+        log_and_print("AUDIO_CHUNK_OVERLAP is only supported in \"stream\" capture mode; recording without overlap.")
+    while not shutdown_event.is_set():
+        start_time = time.time()
+        audio_file = capture_audio_chunk(device=device)
+        chunk = AudioChunk(audio_file, start_time, TRANSCRIPTION_INTERVAL, source=source)
+        journal_chunk(chunk)
+        audio_queue.put(chunk)
+        AUDIO_CHUNKS_CAPTURED.inc()
+
+def _stream_capture_loop(audio_queue: Queue, samplerate=SAMPLERATE, channels=CHANNELS, device=None, source=DEFAULT_AUDIO_SOURCE):
     """
-    Continuously record audio chunks and enqueue their file paths.
-    Runs in its own thread until shutdown_event is set.
+    Keep one input stream open for the whole session and enqueue fixed-size
+    NumPy chunks from the ring buffer. No samples are dropped between chunks.
+    With AUDIO_CHUNK_OVERLAP set, each chunk starts that many seconds before the previous one ended.
     """
-    while not shutdown_event.is_set():
-        audio_file = capture_audio_chunk()
-        audio_queue.put(audio_file)
+    if device is None:
+        device = config.MICROPHONE_INDEX
+
+    chunk_frames = int(TRANSCRIPTION_INTERVAL * samplerate)
+    overlap_frames = min(int(AUDIO_CHUNK_OVERLAP * samplerate), chunk_frames // 2)
+    hop_frames = chunk_frames - overlap_frames
+    ring = AudioRingBuffer(chunk_frames * AUDIO_RING_BUFFER_CHUNKS, channels)
+
+    def _callback(indata, frames, time_info, status):
+        # Runs on the PortAudio thread: no logging or file I/O in here
+        if status.input_overflow:
+            ring.input_overflows += 1
+        ring.write(indata)
+
+    reported_overruns = 0
+    reported_overflows = 0
+    with sd.InputStream(samplerate=samplerate, channels=channels, device=device,
+                        dtype="float32", callback=_callback):
+        # Chunk times are derived from the sample position, so they stay exact relative to each other
+        stream_start_time = time.time()
+        log_and_print(f"Audio input stream '{source}' started on device {device} (chunk {chunk_frames} samples, overlap {overlap_frames} samples).")
+        while not shutdown_event.is_set():
+            chunk, start_frame = ring.read(chunk_frames, hop_frames, timeout=1)
+            if chunk is None:
+                continue
+            audio_chunk = AudioChunk(
+                _to_mono(chunk),
+                stream_start_time + start_frame / samplerate,
+                chunk_frames / samplerate,
+                overlap_frames / samplerate,
+                source
+            )
+            journal_chunk(audio_chunk)
+            audio_queue.put(audio_chunk)
+            log_and_print(f"Audio chunk captured from '{source}' ({chunk_frames} samples).", level=DEBUG)
+            AUDIO_CHUNKS_CAPTURED.inc()
+
+            if ring.overrun_frames != reported_overruns or ring.input_overflows != reported_overflows:
+                AUDIO_FRAMES_LOST.inc(amount=ring.overrun_frames - reported_overruns)
+                reported_overruns = ring.overrun_frames
+                reported_overflows = ring.input_overflows
+                log_and_print(f"Warning: audio samples lost from '{source}' (ring buffer overrun frames: {reported_overruns}, input overflows: {reported_overflows}).")
+
+def audio_capture_worker(audio_queue: Queue, device=None, source=DEFAULT_AUDIO_SOURCE):
+    """
+    Continuously capture audio chunks from one input device and enqueue them for transcription
+    as AudioChunk objects tagged with 'source'. In "stream" mode their audio is a NumPy array,
+    in "file" mode a temp WAV file path. Runs in its own thread until shutdown_event is set;
+    every configured source has its own worker, all feeding the same audio_queue.
+    """
+    if AUDIO_CAPTURE_MODE.lower() == "file":
+        _file_capture_loop(audio_queue, device, source)
+    else:
+        _stream_capture_loop(audio_queue, device=device, source=source)
 
 def cleanup_temp_files():
-    """Delete all temporary audio files created during the session."""
+    """Delete all temporary audio files created during the session (legacy "file" mode only)."""
     log_and_print("\nCleaning up temporary audio files before shutdown...")
     for file in temp_audio_files:
         try:
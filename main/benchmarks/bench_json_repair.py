@@ -0,0 +1,46 @@
+"""
+Regression check and micro-benchmark for the local JSON repair stage in ollama_ai_chat.
+
+Each line of json_repair_corpus.jsonl holds a malformed reply of the kind found in
+process_log.txt ("response") and the bullet points that should be recovered from it
+("expected", or null if the reply has to go to the fix prompt). Add new cases to the
+corpus whenever a reply in the log needed the fix prompt.
+
+Run from the main folder:
+    python benchmarks/bench_json_repair.py
+"""
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ollama_ai_chat import repair_json_array
+
+CORPUS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "json_repair_corpus.jsonl")
+ITERATIONS = 2000
+
+def main():
+    with open(CORPUS_FILE, "r", encoding="utf-8") as f:
+        cases = [json.loads(line) for line in f if line.strip()]
+
+    failures = 0
+    for case in cases:
+        result = repair_json_array(case["response"])
+        if result != case["expected"]:
+            failures += 1
+            print(f"FAIL {case['case']}:\n  expected {case['expected']}\n  got      {result}")
+
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        for case in cases:
+            repair_json_array(case["response"])
+    elapsed = time.perf_counter() - start
+    per_call_us = elapsed / (ITERATIONS * len(cases)) * 1e6
+
+    print(f"{len(cases) - failures}/{len(cases)} corpus cases repaired as expected.")
+    print(f"Average repair time: {per_call_us:.1f} microseconds per reply.")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark of map-reduce summarisation against a single call, run against a running Ollama server.
+
+One long block is summarised both ways and the time to the first streamed bullet point,
+the total time and the number of bullet points are compared. A map-reduce block publishes
+its bullet points only once the reduce step is done, so its first bullet point comes later
+even when the total time is lower. Use it to choose
+OLLAMA_MAP_REDUCE_THRESHOLD_TOKENS for your model and hardware.
+
+Run from the main folder while Ollama is running:
+    python benchmarks/bench_map_reduce.py
+    python benchmarks/bench_map_reduce.py --tokens 1500
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ollama_ai_chat import OllamaAIChat
+from transcript_accumulator import estimate_tokens
+
+ROUNDS = 2
+
+SAMPLE_SENTENCES = [
+    "The plumber is coming on Thursday at ten to look at the leak under the kitchen sink.",
+    "Sam's birthday dinner moved to Saturday evening at the Italian place on Main Street.",
+    "We still need to pick up the cake from the bakery and Alex is bringing the decorations.",
+    "The car is due for its inspection next month and the registration letter came today.",
+    "The rear left tyre keeps losing pressure, so it should be checked at the same time.",
+    "The ferry tickets have to be booked before Friday because the early sailing fills up fast.",
+    "The neighbours can water the plants and feed the cat while we are away.",
+    "The electricity bill was higher than usual, so we should look at the meter readings.",
+]
+
+def _long_block(tokens):
+    sentences = []
+    while estimate_tokens(" ".join(sentences)) < tokens:
+        sentences.append(SAMPLE_SENTENCES[len(sentences) % len(SAMPLE_SENTENCES)] + f" (note {len(sentences) + 1})")
+    return " ".join(sentences)
+
+def _timed(summarise):
+    """Runs summarise(on_bullet) and returns (seconds to the first bullet point, total seconds, bullet points)."""
+    start = time.perf_counter()
+    first = []
+    def _on_bullet(bullet):
+        if not first:
+            first.append(time.perf_counter() - start)
+    tasks = summarise(_on_bullet)
+    total = time.perf_counter() - start
+    return (first[0] if first else total), total, len(tasks)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare map-reduce and single-call summarisation of one long block.")
+    parser.add_argument("--tokens", type=int, default=2500, help="Estimated size of the block in tokens")
+    args = parser.parse_args()
+
+    chat = OllamaAIChat(use_summary_cache=False)
+    chat.warm_up()
+    block = _long_block(args.tokens)
+    modes = {
+        "single call": lambda on_bullet: chat._generate_tasks(chat._build_prompt(block), on_bullet=on_bullet,
+                                                              system=chat._summary_system_prompt()),
+        "map-reduce ": lambda on_bullet: chat._map_reduce_tasks(block, "benchmark"),
+    }
+
+    print(f"Block of ~{estimate_tokens(block)} tokens, {len(chat._split_into_sub_blocks(block))} sub-blocks for map-reduce.")
+    for name, summarise in modes.items():
+        results = [_timed(summarise) for _ in range(ROUNDS)]
+        first = sum(r[0] for r in results) / ROUNDS
+        total = sum(r[1] for r in results) / ROUNDS
+        bullets = sum(r[2] for r in results) / ROUNDS
+        print(f"{name}: first bullet point after {first:.1f}s, done after {total:.1f}s, "
+              f"{bullets:.0f} bullet points (average of {ROUNDS})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmark for OLLAMA_INSTRUCTIONS_AS_SYSTEM_PROMPT against a running Ollama server.
+
+Summary prompts for a few different blocks are sent with the fixed instructions at the start
+of every prompt and as the system prompt, and the prompt evaluation Ollama reports for each
+call is compared. Both ways the instructions are the same prefix of every request, so Ollama
+can reuse their cached evaluation either way; this shows whether the split changes prompt
+evaluation time at all. Only one token is generated per call, so the timings are dominated by
+prompt evaluation. The first call of each mode loads the cache and is left out of the averages.
+The setting is off by default; run this before turning it on.
+
+Run from the main folder while Ollama is running:
+    python benchmarks/bench_system_prompt.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ollama_ai_chat import OllamaAIChat
+from config import OLLAMA_KEEP_ALIVE
+
+ROUNDS = 3
+
+SAMPLE_BLOCKS = [
+    "Okay so the plumber is coming on Thursday at around ten to look at the leak under the kitchen sink, "
+    "and he said it might be the seal on the trap so we should clear out the cupboard before he gets here.",
+    "Remember that Sam's birthday dinner moved to Saturday evening at the Italian place on Main Street. "
+    "We still need to pick up the cake from the bakery and I think Alex is bringing the decorations.",
+    "The car is due for its inspection next month, and the registration renewal letter came in today. "
+    "Also the rear left tyre keeps losing pressure, so we should get that checked at the same time.",
+    "For the trip we need to book the ferry tickets before Friday, because the early sailing fills up fast. "
+    "The neighbours said they can water the plants and feed the cat while we are away.",
+]
+
+def _run(chat, instructions_as_system):
+    chat.instructions_as_system = instructions_as_system
+    results = []
+    for block in [SAMPLE_BLOCKS[0]] + SAMPLE_BLOCKS * ROUNDS:
+        response = chat.client.generate(prompt=chat._build_prompt(block), model=chat.model,
+                                        options={**chat.options, "num_predict": 1}, keep_alive=OLLAMA_KEEP_ALIVE,
+                                        **chat._system_kwargs(chat._summary_system_prompt()))
+        results.append((response.get("prompt_eval_count") or 0, (response.get("prompt_eval_duration") or 0) / 1e6))
+    return results[1:]  # The first call only loads the cache
+
+def main():
+    chat = OllamaAIChat()
+    chat.warm_up()
+
+    summaries = {}
+    for instructions_as_system in (False, True):
+        results = _run(chat, instructions_as_system)
+        tokens = sum(r[0] for r in results) / len(results)
+        millis = sum(r[1] for r in results) / len(results)
+        summaries[instructions_as_system] = millis
+        print(f"Instructions {'as system prompt' if instructions_as_system else 'in the prompt   '}: "
+              f"{tokens:.0f} prompt tokens evaluated, {millis:.1f} ms prompt_eval_duration per call (average of {len(results)})")
+
+    if summaries[False] > 0:
+        print(f"Prompt evaluation with the instructions as system prompt takes {summaries[True] / summaries[False]:.2f}x "
+              f"the time of instructions in the prompt.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+"""
+Bulk ingest: transcribe and summarise existing recordings instead of the live microphone.
+
+    python bulk_ingest.py recordings/ interviews/day1.flac --decode-workers 4 --ollama-concurrency 2
+
+Every file is its own audio source (named after the file) and is cut into TRANSCRIPTION_INTERVAL second chunks (with AUDIO_CHUNK_OVERLAP) and goes
+through the same silence gate, batched Whisper VAD transcription and block accumulation rules
+as live audio; the end of a file ends its last block. Blocks are summarised by OllamaAIChat while
+later files are still being transcribed, and land in the configured output sinks.
+
+Progress is kept in BULK_INGEST_STATE_FILE. Running the same command again skips finished files,
+re-sends only the blocks of a file that were not summarised yet, and transcribes a file again only
+if its transcription was interrupted. A block that ends up in the offline queue is retried from there
+(not re-sent); its file is finished once the offline queue has published it.
+"""
+import argparse
+import os
+import signal
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from queue import Queue
+from threading import Lock, Thread
+
+import numpy as np
+import soundfile as sf
+
+from config import (
+    SAMPLERATE,
+    TRANSCRIPTION_INTERVAL,
+    AUDIO_CHUNK_OVERLAP,
+    WARMUP_ENABLED,
+    BULK_INGEST_STATE_FILE,
+    BULK_DECODE_WORKERS,
+    BULK_OLLAMA_CONCURRENCY,
+    BULK_BATCH_CHUNKS,
+    SUMMARY_CACHE_ENABLED,
+)
+from logging_utils import log_and_print, shutdown_event, WARNING
+from audio_capture import AudioChunk
+import whisper_transcribe
+from whisper_transcribe import initialize_whisper_model, warm_up_whisper_model, transcribe_batch, shutdown_whisper_processes, TranscriptionPipeline
+from ollama_ai_chat import OllamaAIChat
+from output_sinks import create_sinks, SinkWriter, sink_worker, sink_queue
+
+AUDIO_EXTENSIONS = (".wav", ".flac", ".ogg", ".mp3")
+
+def find_audio_files(paths):
+    """Expand directories (recursively) into the audio files they contain, in a stable order."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in names if name.lower().endswith(AUDIO_EXTENSIONS))
+        elif os.path.isfile(path):
+            files.append(path)
+        else:
+            log_and_print(f"[Bulk Ingest] Skipping '{path}': no such file or directory.", level=WARNING)
+    return sorted(dict.fromkeys(os.path.abspath(f) for f in files))
+
+def decode_audio_file(path):
+    """
+    Decode a file to 16 kHz mono float32 (runs in a decode worker process).
+    Other sample rates are resampled by linear interpolation, which is plenty for speech recognition.
+    """
+    audio, samplerate = sf.read(path, dtype="float32", always_2d=True)
+    audio = audio.mean(axis=1, dtype=np.float32)
+    if samplerate != SAMPLERATE and len(audio):
+        duration = len(audio) / samplerate
+        target = np.arange(int(duration * SAMPLERATE)) / SAMPLERATE
+        audio = np.interp(target, np.arange(len(audio)) / samplerate, audio).astype(np.float32)
+    return audio
+
+def split_into_chunks(audio, source):
+    """Cut a decoded file into AudioChunks the way the live capture does; times are offsets into the file."""
+    chunk_frames = int(TRANSCRIPTION_INTERVAL * SAMPLERATE)
+    overlap_frames = min(int(AUDIO_CHUNK_OVERLAP * SAMPLERATE), chunk_frames // 2)
+    hop_frames = chunk_frames - overlap_frames
+    chunks = []
+    for start in range(0, max(len(audio) - overlap_frames, 1), hop_frames):
+        piece = audio[start:start + chunk_frames]
+        chunks.append(AudioChunk(piece, start / SAMPLERATE, len(piece) / SAMPLERATE, overlap_frames / SAMPLERATE, source))
+    if chunks:
+        chunks[-1].overlap = 0.0  # Nothing follows the last chunk
+    return chunks
+
+class IngestState:
+    """
+    Progress of a bulk ingest in SQLite: one row per file (identified by path, size and mtime)
+    and one row per transcript block, so an interrupted run can pick up where it stopped.
+    Used from the main thread and the Ollama threads, hence the lock.
+    """
+    def __init__(self, state_file=BULK_INGEST_STATE_FILE):
+        self._lock = Lock()
+        self.conn = sqlite3.connect(state_file, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "path TEXT PRIMARY KEY, size INTEGER, mtime REAL, status TEXT, audio_seconds REAL)"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS blocks ("
+                "path TEXT, idx INTEGER, text TEXT, done INTEGER DEFAULT 0, offline_block_id INTEGER, PRIMARY KEY (path, idx))"
+            )
+            columns = [row[1] for row in self.conn.execute("PRAGMA table_info(blocks)")]
+            if "offline_block_id" not in columns:
+                # State files from before blocks were tracked in the offline queue
+                self.conn.execute("ALTER TABLE blocks ADD COLUMN offline_block_id INTEGER")
+
+    def file_status(self, path):
+        """'transcribed', 'done', or None if the file is new, changed or was interrupted mid-transcription."""
+        stat = os.stat(path)
+        with self._lock:
+            row = self.conn.execute("SELECT size, mtime, status FROM files WHERE path = ?", (path,)).fetchone()
+        if row is None or row[0] != stat.st_size or row[1] != stat.st_mtime:
+            return None
+        return row[2] if row[2] in ("transcribed", "done") else None
+
+    def start_file(self, path):
+        stat = os.stat(path)
+        with self._lock, self.conn:
+            row = self.conn.execute("SELECT size, mtime FROM files WHERE path = ?", (path,)).fetchone()
+            if row is not None and (row[0], row[1]) != (stat.st_size, stat.st_mtime):
+                self.conn.execute("DELETE FROM blocks WHERE path = ?", (path,))  # The file changed; start over
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files (path, size, mtime, status, audio_seconds) VALUES (?, ?, ?, 'transcribing', NULL)",
+                (path, stat.st_size, stat.st_mtime)
+            )
+
+    def set_file_status(self, path, status, audio_seconds=None):
+        with self._lock, self.conn:
+            if audio_seconds is None:
+                self.conn.execute("UPDATE files SET status = ? WHERE path = ?", (status, path))
+            else:
+                self.conn.execute("UPDATE files SET status = ?, audio_seconds = ? WHERE path = ?", (status, audio_seconds, path))
+
+    def add_block(self, path, idx, text):
+        """Record a block; returns False if it was already summarised (or stored offline) in an earlier run."""
+        with self._lock, self.conn:
+            row = self.conn.execute("SELECT done, offline_block_id FROM blocks WHERE path = ? AND idx = ?", (path, idx)).fetchone()
+            if row is not None and (row[0] or row[1] is not None):
+                return False
+            self.conn.execute("INSERT OR REPLACE INTO blocks (path, idx, text, done) VALUES (?, ?, ?, 0)", (path, idx, text))
+            return True
+
+    def pending_blocks(self, path):
+        """Blocks of a file still to be sent to Ollama (not summarised and not waiting in the offline queue)."""
+        with self._lock:
+            return self.conn.execute(
+                "SELECT idx, text FROM blocks WHERE path = ? AND done = 0 AND offline_block_id IS NULL ORDER BY idx", (path,)
+            ).fetchall()
+
+    def has_unfinished_blocks(self, path):
+        with self._lock:
+            return self.conn.execute("SELECT 1 FROM blocks WHERE path = ? AND done = 0 LIMIT 1", (path,)).fetchone() is not None
+
+    def set_block_offline(self, path, idx, block_id):
+        """Remember that a block was stored in the offline queue under 'block_id'; it stays unfinished."""
+        with self._lock, self.conn:
+            self.conn.execute("UPDATE blocks SET offline_block_id = ? WHERE path = ? AND idx = ?", (block_id, path, idx))
+
+    def offline_blocks(self):
+        """(path, idx, block_id) of every unfinished block that is waiting in the offline queue."""
+        with self._lock:
+            return self.conn.execute(
+                "SELECT path, idx, offline_block_id FROM blocks WHERE done = 0 AND offline_block_id IS NOT NULL"
+            ).fetchall()
+
+    def finish_block(self, path, idx):
+        """Mark a block summarised; returns True once every block of a transcribed file is done."""
+        with self._lock, self.conn:
+            self.conn.execute("UPDATE blocks SET done = 1 WHERE path = ? AND idx = ?", (path, idx))
+            status = self.conn.execute("SELECT status FROM files WHERE path = ?", (path,)).fetchone()
+            left = self.conn.execute("SELECT COUNT(*) FROM blocks WHERE path = ? AND done = 0", (path,)).fetchone()[0]
+            if status is not None and status[0] == "transcribed" and left == 0:
+                self.conn.execute("UPDATE files SET status = 'done' WHERE path = ?", (path,))
+                return True
+            return False
+
+class _FileBlockQueue:
+    """
+    Block queue of the file currently being transcribed (instead of ollama_queue): every block
+    is numbered within its file, recorded in the state, and queued for the Ollama threads.
+    """
+    def __init__(self, state, work_queue):
+        self.state = state
+        self.work_queue = work_queue
+        self.path = None
+        self.next_idx = 0
+
+    def start(self, path):
+        self.path = path
+        self.next_idx = 0
+
+    def put(self, block):
+        _, text = block
+        idx = self.next_idx
+        self.next_idx += 1
+        if self.state.add_block(self.path, idx, text):
+            self.work_queue.put((self.path, idx, text))
+
+class BulkIngest:
+    def __init__(self, files, decode_workers, ollama_concurrency, batch_chunks, state):
+        self.files = files
+        self.decode_workers = max(decode_workers, 1)
+        self.ollama_concurrency = max(ollama_concurrency, 1)
+        self.batch_chunks = max(batch_chunks, 1)
+        self.state = state
+        # Bounded so transcription cannot run arbitrarily far ahead of summarisation
+        self.work_queue = Queue(maxsize=self.ollama_concurrency * 4)
+        self.block_queue = _FileBlockQueue(state, self.work_queue)
+        self._block_id = int(time.time())
+        self._block_id_lock = Lock()
+        self.audio_seconds = 0.0
+        self.blocks_summarised = 0
+
+    def _next_block_id(self):
+        with self._block_id_lock:
+            self._block_id += 1
+            return self._block_id
+
+    def _finish_block(self, path, idx):
+        if self.state.finish_block(path, idx):
+            log_and_print(f"[Bulk Ingest] Finished '{path}'.")
+        self.blocks_summarised += 1
+
+    def _ollama_worker(self, ai_chat):
+        """
+        Summarise queued blocks. A failing block is stored in the offline queue by process_block;
+        it is only recorded as such here, and its file stays unfinished (see finish_offline_blocks).
+        """
+        while True:
+            item = self.work_queue.get()
+            if item is None:
+                self.work_queue.task_done()
+                return
+            path, idx, text = item
+            block_id = self._next_block_id()
+            try:
+                if ai_chat.process_block(text, block_id, os.path.basename(path)) == "offline":
+                    self.state.set_block_offline(path, idx, block_id)
+                else:
+                    self._finish_block(path, idx)
+            except Exception as e:
+                log_and_print(f"[Bulk Ingest] Block {idx} of '{path}' failed: {e}")
+            self.work_queue.task_done()
+
+    def finish_offline_blocks(self, offline_queue):
+        """Finishes the blocks stored offline (by this or an earlier run) that the offline queue has since published."""
+        for path, idx, block_id in self.state.offline_blocks():
+            if not offline_queue.contains(block_id, os.path.basename(path)):
+                self._finish_block(path, idx)
+
+    def _transcribe_file(self, path, audio):
+        self.state.start_file(path)
+        self.block_queue.start(path)
+        source = os.path.basename(path)
+        chunks = split_into_chunks(audio, source)
+        pipeline = whisper_transcribe.pipelines[source] = TranscriptionPipeline(source, block_queue=self.block_queue)
+        try:
+            for start in range(0, len(chunks), self.batch_chunks):
+                if shutdown_event.is_set():
+                    return False
+                transcribe_batch(chunks[start:start + self.batch_chunks])
+            pipeline.end_of_stream()
+        finally:
+            del whisper_transcribe.pipelines[source]
+        seconds = len(audio) / SAMPLERATE
+        self.audio_seconds += seconds
+        self.state.set_file_status(path, "transcribed", seconds)
+        if not self.state.has_unfinished_blocks(path):
+            self.state.set_file_status(path, "done")
+        log_and_print(f"[Bulk Ingest] Transcribed '{path}' ({seconds / 60:.1f} min of audio, {self.block_queue.next_idx} blocks).")
+        return True
+
+    def run(self, ai_chat):
+        self.finish_offline_blocks(ai_chat.offline_queue)
+        threads = [Thread(target=self._ollama_worker, args=(ai_chat,), daemon=True) for _ in range(self.ollama_concurrency)]
+        for thread in threads:
+            thread.start()
+
+        to_decode = []
+        for path in self.files:
+            status = self.state.file_status(path)
+            if status == "done":
+                log_and_print(f"[Bulk Ingest] Skipping '{path}' (already done).")
+            elif status == "transcribed":
+                pending = self.state.pending_blocks(path)
+                log_and_print(f"[Bulk Ingest] '{path}' already transcribed; summarising its {len(pending)} remaining blocks.")
+                for idx, text in pending:
+                    self.work_queue.put((path, idx, text))
+            else:
+                to_decode.append(path)
+
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=self.decode_workers) as executor:
+            # Keep only a few decoded files in memory: decoding runs ahead of Whisper by decode_workers files
+            futures = {}
+            for i, path in enumerate(to_decode):
+                for ahead in to_decode[i:i + self.decode_workers + 1]:
+                    if ahead not in futures:
+                        futures[ahead] = executor.submit(decode_audio_file, ahead)
+                try:
+                    audio = futures.pop(path).result()
+                except Exception as e:
+                    log_and_print(f"[Bulk Ingest] Could not decode '{path}': {e}", level=WARNING)
+                    continue
+                if not self._transcribe_file(path, audio):
+                    break
+                del audio
+
+        for _ in threads:
+            self.work_queue.put(None)
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcribe and summarise existing recordings.")
+    parser.add_argument("paths", nargs="+", help="Audio files or directories (searched recursively)")
+    parser.add_argument("--decode-workers", type=int, default=BULK_DECODE_WORKERS, help="Processes decoding audio files ahead of Whisper")
+    parser.add_argument("--ollama-concurrency", type=int, default=BULK_OLLAMA_CONCURRENCY, help="Blocks summarised at the same time")
+    parser.add_argument("--batch-chunks", type=int, default=BULK_BATCH_CHUNKS, help="Audio chunks per batched Whisper call")
+    parser.add_argument("--state-file", default=BULK_INGEST_STATE_FILE, help="Progress database used to resume")
+    parser.add_argument("--no-summary-cache", action="store_true", help="Summarise every block with Ollama, even if it was summarised before")
+    args = parser.parse_args()
+
+    files = find_audio_files(args.paths)
+    if not files:
+        log_and_print("[Bulk Ingest] No audio files found.")
+        return
+    log_and_print(f"[Bulk Ingest] {len(files)} audio files to process.")
+
+    # Ctrl+C stops after the current batch; everything finished so far is kept in the state file
+    signal.signal(signal.SIGINT, lambda signum, frame: shutdown_event.set())
+
+    initialize_whisper_model()
+    ai_chat = OllamaAIChat(use_summary_cache=False if args.no_summary_cache else SUMMARY_CACHE_ENABLED)
+    if WARMUP_ENABLED:
+        warm_up_whisper_model()
+        ai_chat.warm_up()
+
+    sink_thread = Thread(target=sink_worker, args=(SinkWriter(create_sinks()),), daemon=True)
+    sink_thread.start()
+
+    ingest = BulkIngest(files, args.decode_workers, args.ollama_concurrency, args.batch_chunks, IngestState(args.state_file))
+    try:
+        wall_seconds = ingest.run(ai_chat)
+        if len(ai_chat.offline_queue) and not shutdown_event.is_set():
+            log_and_print("[Bulk Ingest] Retrying blocks stored in the offline queue.")
+            ai_chat._try_offline_queue(limit=len(ai_chat.offline_queue), ignore_schedule=True)
+            ingest.finish_offline_blocks(ai_chat.offline_queue)
+    finally:
+        sink_queue.put(None)
+        sink_thread.join(timeout=60)
+        shutdown_whisper_processes()
+
+    audio_hours = ingest.audio_seconds / 3600
+    wall_hours = wall_seconds / 3600
+    log_and_print(f"[Bulk Ingest] Transcribed {audio_hours:.2f} audio hours and summarised {ingest.blocks_summarised} blocks "
+                  f"in {wall_seconds / 60:.1f} min: {audio_hours / wall_hours if wall_hours else 0:.1f} audio-hours per wall-hour.")
+    blocks_offline = len(ingest.state.offline_blocks())
+    if blocks_offline:
+        log_and_print(f"[Bulk Ingest] {blocks_offline} blocks are still in the offline queue; their files finish once it has summarised them.")
+    if ai_chat.summary_cache is not None:
+        log_and_print(f"[Bulk Ingest] Summary cache: {ai_chat.summary_cache.hits} hits, {ai_chat.summary_cache.misses} misses.")
+    if shutdown_event.is_set():
+        log_and_print("[Bulk Ingest] Interrupted; run the same command again to resume.")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
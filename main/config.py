@@ -14,25 +14,186 @@ OLLAMA_PROMPT_MODE = "default"  # "default" or "restrictive"
 # The microphone index can be updated by `select_microphone.py`
 MICROPHONE_INDEX = None  # We set it to None initially
 
+# Audio sources
+# Name -> input device index of every microphone to capture at the same time, e.g. {"kitchen": 1, "office": 3}.
+# All sources share one loaded Whisper model (their chunks are transcribed in the same batched call), each source
+# builds its own blocks, and every summary row records the source it came from.
+# Empty => pick a single microphone at startup, as before.
+AUDIO_SOURCES = {}
+DEFAULT_AUDIO_SOURCE = "default"   # Source name used when AUDIO_SOURCES is empty
+AUDIO_SOURCE_BATCH_WAIT = 0.5      # Seconds the transcription worker waits for the other sources' chunks of the same interval
+
 # Audio recording settings
 TRANSCRIPTION_INTERVAL = 20   # Duration (in seconds) for each recorded audio chunk
 SAMPLERATE = 16000            # Audio sampling rate (Hz)
 CHANNELS = 1                  # Number of audio channels (1 = mono, 2 = stereo)
 
+# Audio capture mode
+# "stream" => Continuous input stream feeding an in-memory ring buffer (no gaps between chunks, no temp files)
+# "file" => Legacy mode: record each chunk on its own input stream and hand it over as a temporary WAV file
+AUDIO_CAPTURE_MODE = "stream"  # "stream" or "file"
+AUDIO_RING_BUFFER_CHUNKS = 4   # Ring buffer capacity (in chunks) absorbing stalls of the capture thread
+AUDIO_CHUNK_OVERLAP = 0       # Seconds of audio shared by consecutive chunks ("stream" mode only, 0 = no overlap).
+                              # Words cut at a chunk boundary are then heard whole by one of the two chunks,
+                              # and utterance timestamps are used so overlapping text is only emitted once.
+
 # Whisper Model Settings (Advanced)
 WHISPER_MODEL = "small"        # Whisper model size ("tiny", "small", "medium", "large")
 WHISPER_BACKEND = "CTranslate2"
 WHISPER_COMPUTE_TYPE = "float32"
+WHISPER_MAX_BATCH_CHUNKS = 8   # Max queued audio chunks transcribed together in one batched call when transcription falls behind
+
+# Whisper execution mode
+# "thread" => Whisper runs in a thread of the main process
+# "process" => Whisper runs in WHISPER_PROCESS_COUNT separate processes, so its Python-side work cannot delay the
+#              audio callback or the Ollama threads. Audio is handed over through shared memory. Process i uses
+#              GPU WHISPER_PROCESS_DEVICE_INDICES[i % len(...)]; on CPU use several processes for several cores.
+#              The "degrade" overload policy is only available in "thread" mode.
+WHISPER_EXECUTION_MODE = "thread"   # "thread" or "process"
+WHISPER_PROCESS_COUNT = 1
+WHISPER_PROCESS_DEVICE_INDICES = [0]
+WHISPER_PROCESS_TIMEOUT = 600       # Seconds a worker process may take to load the model or transcribe one batch
+
+# Overload handling when Whisper is slower than real time (e.g. CPU mode with a large model)
+# At most AUDIO_QUEUE_MAXSIZE chunks wait in memory. When the queue is full:
+# "spill" => further chunks are saved to AUDIO_SPILL_DIR and transcribed later, in order (nothing is lost)
+# "drop_oldest" => the oldest waiting chunk is discarded (transcription stays close to real time)
+# "degrade" => switch to WHISPER_DEGRADED_MODEL once AUDIO_DEGRADE_HIGH_WATER chunks are waiting and back to
+#              WHISPER_MODEL once at most AUDIO_DEGRADE_LOW_WATER are left; the oldest chunk is dropped if the queue still fills up.
+#              Both models are kept loaded.
+AUDIO_QUEUE_MAXSIZE = 16
+AUDIO_OVERLOAD_POLICY = "spill"   # "spill", "drop_oldest" or "degrade"
+AUDIO_DEGRADE_HIGH_WATER = 6
+AUDIO_DEGRADE_LOW_WATER = 1
+WHISPER_DEGRADED_MODEL = "tiny"
+WHISPER_DEGRADED_COMPUTE_TYPE = "int8"
 
 # Speech detection settings
 NO_SPEECH_PROB_CUTOFF = 0.15   # If min_no_speech_prob < NO_SPEECH_PROB_CUTOFF, consider it valid speech (recommended 0.11-0.15)
 
-# Maximum speech accumulation before forcing Ollama processing
-MAX_CONSECUTIVE_SPEECH_CHUNKS = 22  # 7min 20sec (22 chunks * 20s each)
+# Silence gate (cheap energy check before Whisper; obviously silent chunks skip the model entirely)
+# The gate uses hysteresis: while closed, a louder level is needed to open it than to keep it open.
+SILENCE_GATE_ENABLED = True
+SILENCE_GATE_OPEN_DBFS = -40.0     # Frame level (dBFS) needed to open the gate after a silent chunk
+SILENCE_GATE_CLOSE_DBFS = -48.0    # Frame level (dBFS) that keeps the gate open after a speech chunk
+SILENCE_GATE_FRAME_MS = 30         # Frame length used for the RMS measurement
+SILENCE_GATE_MIN_ACTIVE_FRAMES = 5 # Frames above the threshold needed for a chunk to count as possible speech
+
+# Pause detection using Whisper utterance timestamps
+# A pause longer than this between speech utterances (inside a chunk or across chunks) ends the current
+# block immediately instead of waiting for a whole silent chunk. Set to 0 to only flush on silent chunks.
+SPEECH_GAP_FLUSH_SECONDS = 4.0
 
 # Ollama Model Settings
 OLLAMA_MODEL = "llama3.2"   # Define the Ollama model to use
-OLLAMA_OPTIONS = {"temperature": 0.9, "top_p": 0.9}  # Ollama tuning options
+OLLAMA_NUM_CTX = 4096       # Context window (tokens) requested from Ollama for every call
+OLLAMA_OPTIONS = {"temperature": 0.9, "top_p": 0.9, "num_ctx": OLLAMA_NUM_CTX}  # Ollama tuning options
+OLLAMA_KEEP_ALIVE = "30m"   # How long Ollama keeps the model loaded after each request (-1 = until Ollama stops)
+OLLAMA_INSTRUCTIONS_AS_SYSTEM_PROMPT = False  # True = send the fixed summary instructions as the system prompt and only
+                                              # the transcript as the user prompt (no measured benefit yet; False = one prompt)
+
+# Warm-up
+# Run one dummy inference on Whisper and Ollama at startup so the first real block does not pay
+# for model loading and CUDA initialisation.
+WARMUP_ENABLED = True
+
+# Maximum speech accumulation before forcing Ollama processing
+# A block is sent to Ollama once the transcript would no longer fit in what is left of the context window
+# after the prompt instructions and room for the reply (about 10 minutes of speech with the defaults).
+PROMPT_OVERHEAD_TOKENS = 400     # Tokens used by the prompt instructions
+RESPONSE_RESERVE_TOKENS = 1024   # Tokens kept free for the JSON bullet-point reply
+TRANSCRIPT_TOKEN_BUDGET = OLLAMA_NUM_CTX - PROMPT_OVERHEAD_TOKENS - RESPONSE_RESERVE_TOKENS
+
+# Map-reduce summarisation for long blocks
+# Blocks above the threshold are split into overlapping sub-blocks that are summarised in parallel,
+# then a final prompt merges the bullet points and removes duplicates.
+# Requests only run concurrently if the Ollama server allows it (OLLAMA_NUM_PARALLEL on the server side).
+# A map-reduce block is published only once its reduce step is done, so its first bullet point comes later
+# than with one call; only blocks near TRANSCRIPT_TOKEN_BUDGET use it (see benchmarks/bench_map_reduce.py).
+OLLAMA_MAP_REDUCE_ENABLED = True
+OLLAMA_MAP_REDUCE_THRESHOLD_TOKENS = 2400  # Blocks estimated above this many tokens use map-reduce
+OLLAMA_SUB_BLOCK_TOKENS = 800              # Target size of each sub-block
+OLLAMA_SUB_BLOCK_OVERLAP_TOKENS = 80       # Text shared by consecutive sub-blocks so no sentence loses its context
+OLLAMA_MAX_PARALLEL_REQUESTS = 2           # Max sub-blocks summarised at the same time
+
+# Structured output
+# Ask Ollama to constrain its reply to a JSON array of strings (needs Ollama server 0.5 or newer).
+# Older servers are detected on the first call and the bracket extraction / fix prompt path is used instead.
+OLLAMA_STRUCTURED_OUTPUT = True
+
+# Streaming generation
+# Bullet points are parsed out of the reply and published while it is being generated. A reply that turns out
+# not to be a JSON array of strings is abandoned right away and requested again without streaming (the fallback
+# parsing takes over). A block retried after failing part-way skips the bullet points it already published.
+OLLAMA_STREAMING = True
+OLLAMA_STREAM_MAX_PREAMBLE_CHARS = 200  # Text allowed before the opening '[' (e.g. a ```json fence)
+
+# Ollama health
+# Requests go through a circuit breaker: after OLLAMA_BREAKER_FAILURE_THRESHOLD failed requests in a row new blocks
+# go straight to the offline queue, until a liveness probe (listing the local models, no generation) succeeds again.
+OLLAMA_HEALTH_PROBE_TTL = 15           # Seconds a liveness probe result is reused
+OLLAMA_BREAKER_FAILURE_THRESHOLD = 3
+OLLAMA_BREAKER_RESET_SECONDS = 30      # Seconds the circuit stays open before Ollama is probed again
+
+# Logging
+# Log messages are written to LOG_FILE by a background thread. Full transcripts and Ollama responses are
+# logged at "DEBUG" level; set LOG_LEVEL to "DEBUG" to keep them in the log file.
+LOG_LEVEL = "INFO"            # Lowest level written to LOG_FILE ("DEBUG", "INFO", "WARNING", "ERROR")
+LOG_CONSOLE_LEVEL = "INFO"    # Lowest level printed to the console
+LOG_ROTATION = "size"         # "size" => start a new file after LOG_MAX_BYTES, "daily" => start a new file every midnight
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5          # Rotated log files kept (process_log.txt.1, .2, ...)
+
+# Metrics
+# Queue depths, Whisper speed, Ollama token rates and sink latencies are served in the Prometheus text format on
+# http://127.0.0.1:METRICS_PORT/metrics (JSON on /metrics.json) and written to METRICS_SNAPSHOT_FILE.
+METRICS_PORT = 9464               # 0 = no HTTP endpoint
+METRICS_SNAPSHOT_INTERVAL = 60    # Seconds between JSON snapshots (0 = no snapshot file)
+
+# Offline queue
+# Blocks that fail (e.g. Ollama is not running) are stored in OFFLINE_QUEUE_DB and retried by a background
+# drainer thread. Each failure doubles the block's retry delay, from OFFLINE_RETRY_BASE_SECONDS up to OFFLINE_RETRY_MAX_SECONDS.
+OFFLINE_RETRY_BASE_SECONDS = 30
+OFFLINE_RETRY_MAX_SECONDS = 1800
+OFFLINE_DRAIN_INTERVAL = 10         # Seconds between checks for blocks that are due for a retry
+OFFLINE_DRAIN_BATCH_SIZE = 8        # Due blocks fetched per check
+OFFLINE_DRAIN_MAX_CONCURRENCY = 1   # Queued blocks retried at the same time (new blocks keep being processed meanwhile)
+
+# Summary cache
+# Bullet points are cached in SUMMARY_CACHE_DB, keyed by a hash of the block text (whitespace normalised), the model,
+# OLLAMA_OPTIONS and the prompt settings. A block summarised again (offline retries, restarts, bulk re-ingests) is then
+# published straight from the cache without calling Ollama.
+SUMMARY_CACHE_ENABLED = True        # False => always ask Ollama (bulk_ingest.py also has --no-summary-cache)
+SUMMARY_CACHE_MAX_ENTRIES = 5000    # Least recently used summaries beyond this are evicted
+SUMMARY_CACHE_MAX_AGE_DAYS = 30     # Summaries older than this are evicted (0 = no age limit)
+
+# Crash recovery journal
+# Captured chunks not transcribed yet (audio in JOURNAL_AUDIO_DIR), the transcript of each source's unfinished block
+# and blocks waiting for Ollama are journaled to JOURNAL_FILE. After a crash or power loss the next start replays it,
+# so work resumes where it stopped without transcribing anything twice. A background thread writes and fsyncs the
+# journal in batches, so at most the last JOURNAL_FLUSH_INTERVAL seconds of work can be lost. The audio of a chunk is
+# only written once it has waited JOURNAL_AUDIO_DELAY seconds for Whisper, so while transcription keeps up nothing is
+# written per chunk; a crash can then also lose the audio captured in the last JOURNAL_AUDIO_DELAY seconds.
+JOURNAL_ENABLED = True
+JOURNAL_FLUSH_INTERVAL = 1.0                # Seconds between journal writes (one fsync each)
+JOURNAL_AUDIO_DELAY = 10.0                  # Seconds a captured chunk waits before its audio is journaled (0 = at once)
+JOURNAL_COMPACT_BYTES = 4 * 1024 * 1024     # The journal is rewritten with only the live state once it grows past this
+
+# Bulk ingest (bulk_ingest.py)
+# Transcribes and summarises existing recordings; progress is kept in BULK_INGEST_STATE_FILE so runs can be resumed.
+BULK_DECODE_WORKERS = 2       # Processes decoding audio files ahead of Whisper
+BULK_OLLAMA_CONCURRENCY = 2   # Blocks summarised at the same time while later files are transcribed
+BULK_BATCH_CHUNKS = 32        # Audio chunks per batched Whisper call
+
+# Ingest server (ingest_server.py)
+# Thin clients stream 16 kHz mono PCM over HTTP to one machine running Whisper and Ollama. Every client session is
+# an audio source of its own; chunks of all sessions are transcribed together in one batched Whisper call.
+INGEST_SERVER_HOST = "127.0.0.1"      # "0.0.0.0" to accept clients from the local network
+INGEST_SERVER_PORT = 8765
+INGEST_BATCH_DEADLINE = 1.0           # Seconds a chunk may wait for other sessions' chunks to share its Whisper call
+INGEST_SESSION_IDLE_TIMEOUT = 120     # Sessions that send no audio for this many seconds are closed
+INGEST_SESSION_RETENTION = 3600       # Seconds a finished session (and its summaries) stays available to its client
+INGEST_MAX_REQUEST_BYTES = 16 * 1024 * 1024  # Largest accepted request body (about 8 minutes of 16-bit audio)
 
 import os
 
@@ -46,11 +207,34 @@ os.makedirs(FINAL_OUTPUTS_DIR, exist_ok=True)
 
 # Run time file paths
 LOG_FILE = os.path.join(RUNTIME_DIR, "process_log.txt")
-OFFLINE_QUEUE_FILE = os.path.join(RUNTIME_DIR, "ollama_offline_queue.txt")
+METRICS_SNAPSHOT_FILE = os.path.join(RUNTIME_DIR, "metrics.json")
+AUDIO_SPILL_DIR = os.path.join(RUNTIME_DIR, "audio_spill")
+OFFLINE_QUEUE_DB = os.path.join(RUNTIME_DIR, "ollama_offline_queue.sqlite")
+OFFLINE_QUEUE_FILE = os.path.join(RUNTIME_DIR, "ollama_offline_queue.txt")  # Old queue format, migrated into OFFLINE_QUEUE_DB on start
+SUMMARY_CACHE_DB = os.path.join(RUNTIME_DIR, "summary_cache.sqlite")
+JOURNAL_FILE = os.path.join(RUNTIME_DIR, "pipeline_journal.jsonl")
+JOURNAL_AUDIO_DIR = os.path.join(RUNTIME_DIR, "journal_audio")
+BULK_INGEST_STATE_FILE = os.path.join(RUNTIME_DIR, "bulk_ingest_state.sqlite")
 
 # Final output file paths
 EXCEL_FILE = os.path.join(FINAL_OUTPUTS_DIR, "Nosy_Neighbour_log.xlsx")
 FALLBACK_TEXT_FILE = os.path.join(FINAL_OUTPUTS_DIR, "fallback_Nosy_Neighbour_log.txt")
+CSV_FILE = os.path.join(FINAL_OUTPUTS_DIR, "Nosy_Neighbour_log.csv")
+JSONL_FILE = os.path.join(FINAL_OUTPUTS_DIR, "Nosy_Neighbour_log.jsonl")
+SQLITE_FILE = os.path.join(FINAL_OUTPUTS_DIR, "Nosy_Neighbour_log.sqlite")
+
+# Output sinks
+# Summaries are written by a dedicated writer thread to every sink listed here; the first one is the primary sink,
+# whose rows go to FALLBACK_TEXT_FILE while it is unavailable (e.g. the workbook is open in Excel).
+# "xlsx" => EXCEL_FILE, "csv" => CSV_FILE, "jsonl" => JSONL_FILE, "sqlite" => SQLITE_FILE
+OUTPUT_SINKS = ["xlsx"]
+SINK_COMMIT_INTERVAL = 30    # Seconds between commits (workbook saves, file syncs, database commits); always committed at shutdown
+SINK_QUEUE_MAXSIZE = 10000   # Summary rows that may wait for the writer thread
+
+# Excel output
+# "none" => every block goes into EXCEL_FILE
+# "daily" => one workbook per day (e.g. Nosy_Neighbour_log_2025-01-31.xlsx), so saving never slows down as the log grows
+EXCEL_ROTATION = "none"  # "none" or "daily"
 
 # Random Color List for Excel Rows
 EXCEL_COLOR_LIST = [
@@ -0,0 +1,147 @@
+"""
+Load generator for ingest_server.py: N simulated clients stream audio at the same time.
+
+    python ingest_load_client.py --clients 8 --seconds 120
+    python ingest_load_client.py --clients 4 --wav meeting.wav --speed 0   # as fast as possible
+
+Every client opens a session, sends its audio in --frame-ms pieces paced at --speed times real
+time, ends the session and polls until its summaries are done. Without --wav the audio is a
+synthetic signal (tone bursts and pauses), which exercises batching and the silence gate but
+gives Whisper nothing to transcribe. Prints request latencies and end-of-audio-to-summary times.
+"""
+import argparse
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from config import SAMPLERATE, INGEST_SERVER_HOST, INGEST_SERVER_PORT
+
+class HttpClient:
+    """One keep-alive HTTP/1.1 connection speaking JSON, enough for the ingest server."""
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self._reader = None
+        self._writer = None
+
+    async def request(self, method, path, body=b""):
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        self._writer.write(f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+        await self._writer.drain()
+        status = int((await self._reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self._reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+        payload = json.loads(await self._reader.readexactly(length)) if length else {}
+        if status >= 400:
+            raise Exception(f"{method} {path} failed with {status}: {payload.get('error')}")
+        return payload
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+def synthetic_audio(seconds, seed):
+    """Tone bursts separated by pauses, roughly like speech turns, as 16-bit PCM."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLERATE)) / SAMPLERATE
+    envelope = (np.sin(2 * np.pi * t / rng.uniform(4, 8)) > 0).astype(np.float32)
+    signal = 0.2 * np.sin(2 * np.pi * rng.uniform(150, 300) * t) * envelope + 0.005 * rng.standard_normal(len(t))
+    return (np.clip(signal, -1, 1) * 32767).astype("<i2").tobytes()
+
+def wav_audio(path, seconds):
+    import soundfile as sf
+    audio, samplerate = sf.read(path, dtype="float32", always_2d=True)
+    if samplerate != SAMPLERATE:
+        raise Exception(f"'{path}' is sampled at {samplerate} Hz; the ingest server expects {SAMPLERATE} Hz")
+    audio = audio.mean(axis=1)
+    if seconds:
+        audio = audio[:int(seconds * SAMPLERATE)]
+    return (np.clip(audio, -1, 1) * 32767).astype("<i2").tobytes()
+
+async def run_client(index, args, pcm, results):
+    client = HttpClient(args.host, args.port)
+    post_latencies = []
+    try:
+        session = await client.request("POST", f"/sessions?name=load-{index}&format=s16le")
+        path = f"/sessions/{session['session']}"
+        frame_bytes = int(SAMPLERATE * args.frame_ms / 1000) * 2
+        start = time.perf_counter()
+        for i, offset in enumerate(range(0, len(pcm), frame_bytes)):
+            if args.speed > 0:
+                # Pace against the start time so slow requests do not add up
+                await asyncio.sleep(max(0.0, start + i * args.frame_ms / 1000 / args.speed - time.perf_counter()))
+            sent = time.perf_counter()
+            await client.request("POST", path + "/audio", pcm[offset:offset + frame_bytes])
+            post_latencies.append(time.perf_counter() - sent)
+
+        closed = time.perf_counter()
+        await client.request("DELETE", path)
+        while True:
+            state = await client.request("GET", path)
+            if state["status"] == "done":
+                break
+            await asyncio.sleep(args.poll_interval)
+        results.append({
+            "client": index,
+            "post_latencies": post_latencies,
+            "finish_seconds": time.perf_counter() - closed,
+            "blocks": state["blocks"],
+            "summaries": len(state["summaries"]),
+        })
+    except Exception as e:
+        results.append({"client": index, "error": str(e)})
+    finally:
+        client.close()
+
+def _percentile(values, q):
+    return float(np.percentile(values, q)) if values else float("nan")
+
+async def main_async(args):
+    if args.wav:
+        pcm = wav_audio(args.wav, args.seconds)
+    results = []
+    start = time.perf_counter()
+    await asyncio.gather(*(run_client(i, args, pcm if args.wav else synthetic_audio(args.seconds, i), results)
+                           for i in range(args.clients)))
+    elapsed = time.perf_counter() - start
+
+    failed = [r for r in results if "error" in r]
+    done = [r for r in results if "error" not in r]
+    for r in failed:
+        print(f"client {r['client']}: {r['error']}")
+    latencies = [latency for r in done for latency in r["post_latencies"]]
+    finish = [r["finish_seconds"] for r in done]
+    audio_seconds = len(pcm) / 2 / SAMPLERATE if args.wav else args.seconds
+    print(f"{len(done)}/{args.clients} clients finished in {elapsed:.1f}s "
+          f"({len(done) * audio_seconds / elapsed:.2f} audio seconds per second).")
+    print(f"audio POST latency: p50 {_percentile(latencies, 50) * 1000:.1f} ms, p95 {_percentile(latencies, 95) * 1000:.1f} ms, "
+          f"max {max(latencies, default=float('nan')) * 1000:.1f} ms")
+    print(f"end of audio to summaries done: p50 {_percentile(finish, 50):.1f}s, max {max(finish, default=float('nan')):.1f}s")
+    print(f"blocks: {sum(r['blocks'] for r in done)}, summary rows: {sum(r['summaries'] for r in done)}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for the ingest server.")
+    parser.add_argument("--url", default=f"http://{INGEST_SERVER_HOST}:{INGEST_SERVER_PORT}")
+    parser.add_argument("--clients", type=int, default=4, help="Simultaneous sessions")
+    parser.add_argument("--seconds", type=float, default=60, help="Audio per client (with --wav: at most)")
+    parser.add_argument("--wav", help="16 kHz recording every client sends instead of synthetic audio")
+    parser.add_argument("--frame-ms", type=int, default=500, help="Audio per POST request")
+    parser.add_argument("--speed", type=float, default=1.0, help="Sending speed relative to real time (0 = no pacing)")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds between status polls after the audio ends")
+    args = parser.parse_args()
+    url = urlsplit(args.url)
+    args.host, args.port = url.hostname, url.port or 80
+    asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+"""
+Ingest server: thin clients stream audio over HTTP to one machine that runs Whisper and Ollama.
+
+    python ingest_server.py                   # listens on INGEST_SERVER_HOST:INGEST_SERVER_PORT
+
+Every client session is an audio source of its own, with its own blocks, just like a microphone
+in AUDIO_SOURCES. The usual transcription worker transcribes the chunks of all sessions together:
+it waits up to INGEST_BATCH_DEADLINE seconds for the other sessions' chunks so they share one
+batched Whisper call. Blocks are summarised by the usual Ollama worker, written to the output
+sinks tagged with the session's source name, and returned to the client.
+
+Audio is raw 16 kHz mono PCM, 16-bit little endian ("s16le", default) or float32 ("f32le").
+
+    POST   /sessions?name=kitchen&format=s16le  -> {"session": id, "source": name}
+    POST   /sessions/<id>/audio                 body: PCM bytes, any length
+    GET    /sessions/<id>?since=N               -> status and summary rows from row N on
+    DELETE /sessions/<id>                       end of audio; the rest is transcribed and summarised
+    GET    /health
+
+A session's status goes from "open" to "closing" (last audio being transcribed), "summarising"
+(blocks waiting for Ollama) and "done". See ingest_load_client.py for a load generator.
+"""
+import asyncio
+import json
+import signal
+import time
+import uuid
+from threading import Lock, Thread
+from urllib.parse import urlsplit, parse_qs
+
+import numpy as np
+
+from config import (
+    SAMPLERATE,
+    TRANSCRIPTION_INTERVAL,
+    AUDIO_CHUNK_OVERLAP,
+    AUDIO_QUEUE_MAXSIZE,
+    WARMUP_ENABLED,
+    INGEST_SERVER_HOST,
+    INGEST_SERVER_PORT,
+    INGEST_BATCH_DEADLINE,
+    INGEST_SESSION_IDLE_TIMEOUT,
+    INGEST_SESSION_RETENTION,
+    INGEST_MAX_REQUEST_BYTES,
+)
+from logging_utils import log_and_print, shutdown_event, WARNING
+from audio_capture import AudioChunk
+import whisper_transcribe
+from whisper_transcribe import initialize_whisper_model, warm_up_whisper_model, transcription_worker, TranscriptionPipeline, shutdown_whisper_processes
+from ollama_worker import ollama_worker, offline_queue_worker, ollama_queue
+from ollama_ai_chat import OllamaAIChat
+from output_sinks import create_sinks, SinkWriter, sink_worker, sink_queue, summary_listeners
+from audio_backlog import BoundedAudioQueue
+from metrics import AUDIO_QUEUE_DEPTH, INGEST_SESSIONS, INGEST_BYTES, start_metrics_server, write_snapshot
+
+PCM_FORMATS = {"s16le": np.dtype("<i2"), "f32le": np.dtype("<f4")}
+
+class IngestSession:
+    """
+    One client stream: cuts the received PCM into overlapping AudioChunks exactly like the
+    live capture does and collects the summary rows of its source.
+    Audio arrives on the event loop; rows and the final status come from worker threads.
+    """
+    def __init__(self, session_id, source, pcm_format, audio_queue):
+        self.session_id = session_id
+        self.source = source
+        self.dtype = PCM_FORMATS[pcm_format]
+        self.audio_queue = audio_queue
+        self.status = "open"
+        self.created = time.time()
+        self.last_activity = time.monotonic()
+        self.finished_at = None
+        self.chunk_frames = int(TRANSCRIPTION_INTERVAL * SAMPLERATE)
+        self.overlap_frames = min(int(AUDIO_CHUNK_OVERLAP * SAMPLERATE), self.chunk_frames // 2)
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._pending_start = 0     # Stream position (in frames) of the first pending frame
+        self._leftover = b""        # Bytes of an incomplete sample at the end of the last request
+        self._rows = []
+        self._lock = Lock()
+        self.blocks = 0
+
+    @property
+    def audio_seconds(self):
+        return (self._pending_start + len(self._pending)) / SAMPLERATE
+
+    def add_audio(self, data):
+        """Append PCM bytes and queue every complete chunk for transcription."""
+        self.last_activity = time.monotonic()
+        data = self._leftover + data
+        usable = len(data) - len(data) % self.dtype.itemsize
+        self._leftover = data[usable:]
+        samples = np.frombuffer(data[:usable], dtype=self.dtype)
+        if self.dtype.kind == "i":
+            samples = samples.astype(np.float32) / 32768.0
+        self._pending = np.concatenate((self._pending, samples.astype(np.float32, copy=False)))
+
+        hop_frames = self.chunk_frames - self.overlap_frames
+        while len(self._pending) >= self.chunk_frames:
+            self._queue_chunk(self._pending[:self.chunk_frames].copy(), self.overlap_frames)
+            self._pending = self._pending[hop_frames:]
+            self._pending_start += hop_frames
+
+    def close(self):
+        """The client's audio has ended: queue what is left as the source's final chunk."""
+        if self.status != "open":
+            return
+        self.status = "closing"
+        audio = self._pending if len(self._pending) else np.zeros(SAMPLERATE // 2, dtype=np.float32)
+        self._queue_chunk(audio.copy(), 0.0, final=True)
+        self._pending = np.zeros(0, dtype=np.float32)
+
+    def _queue_chunk(self, audio, overlap_frames, final=False):
+        start_time = self.created + self._pending_start / SAMPLERATE
+        self.audio_queue.put(AudioChunk(audio, start_time, len(audio) / SAMPLERATE,
+                                        overlap_frames / SAMPLERATE, self.source, final=final))
+
+    def add_rows(self, rows):
+        with self._lock:
+            self._rows.extend(rows)
+
+    def rows_since(self, since):
+        with self._lock:
+            return list(self._rows[since:]), len(self._rows)
+
+    def transcribed(self):
+        """Called on the transcription thread once the final chunk is accumulated."""
+        self.status = "summarising"
+        # Runs on the Ollama worker after every block queued before it, i.e. all of this session's blocks
+        ollama_queue.put(self._summarised)
+
+    def _summarised(self):
+        self.status = "done"
+        self.finished_at = time.monotonic()
+
+class _SessionPipeline(TranscriptionPipeline):
+    """Transcription pipeline of a session, counting its blocks and reporting the end of its stream."""
+    def __init__(self, session):
+        super().__init__(session.source, block_queue=self)
+        self.session = session
+
+    def put(self, block):
+        self.session.blocks += 1
+        ollama_queue.put(block)
+
+    def end_of_stream(self):
+        super().end_of_stream()
+        self.session.transcribed()
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+class IngestServer:
+    """Minimal HTTP/1.1 server (keep-alive, Content-Length bodies) on asyncio streams."""
+    def __init__(self, audio_queue, host=INGEST_SERVER_HOST, port=INGEST_SERVER_PORT):
+        self.audio_queue = audio_queue
+        self.host = host
+        self.port = port
+        self.sessions = {}            # session id -> IngestSession
+        self.sessions_by_source = {}  # source -> IngestSession
+        INGEST_SESSIONS.set_function(lambda: sum(s.status == "open" for s in self.sessions.values()))
+        # Rows are published on the Ollama worker before its end-of-session marker runs, so a "done" session has them all
+        summary_listeners.append(self._on_summary_row)
+
+    def _on_summary_row(self, row):
+        timestamp, block_id, bullet, source = row
+        session = self.sessions_by_source.get(source)
+        if session is not None:
+            session.add_rows([{"timestamp": timestamp, "block_id": block_id, "bullet_point": bullet}])
+
+    async def serve(self):
+        server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        log_and_print(f"[Ingest Server] Listening on http://{self.host}:{self.port}")
+        housekeeping = asyncio.create_task(self._housekeeping())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            housekeeping.cancel()
+
+    async def _housekeeping(self):
+        """Close idle sessions and forget finished ones after INGEST_SESSION_RETENTION."""
+        while True:
+            await asyncio.sleep(5)
+            now = time.monotonic()
+            for session in list(self.sessions.values()):
+                if session.status == "open" and now - session.last_activity > INGEST_SESSION_IDLE_TIMEOUT:
+                    log_and_print(f"[Ingest Server] Session '{session.source}' idle for {INGEST_SESSION_IDLE_TIMEOUT}s; closing it.")
+                    session.close()
+                elif session.status == "done" and now - session.finished_at > INGEST_SESSION_RETENTION:
+                    del self.sessions[session.session_id]
+                    if self.sessions_by_source.get(session.source) is session:
+                        del self.sessions_by_source[session.source]
+
+    def close_all(self):
+        for session in self.sessions.values():
+            session.close()
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                if length > INGEST_MAX_REQUEST_BYTES:
+                    await self._respond(writer, 413, {"error": f"request body larger than {INGEST_MAX_REQUEST_BYTES} bytes"})
+                    break
+                body = await reader.readexactly(length) if length else b""
+                try:
+                    status, payload = self._route(method, target, body)
+                except HttpError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except Exception as e:
+                    log_and_print(f"[Ingest Server] Error handling {method} {target}: {e}")
+                    status, payload = 500, {"error": str(e)}
+                await self._respond(writer, status, payload)
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass  # Client went away or sent something that is not HTTP
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        writer.write(f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(data)}\r\n\r\n".encode("latin-1") + data)
+        await writer.drain()
+
+    def _session(self, session_id):
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise HttpError(404, f"unknown session '{session_id}'")
+        return session
+
+    def _route(self, method, target, body):
+        url = urlsplit(target)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        parts = [part for part in url.path.split("/") if part]
+
+        if parts == ["health"] and method == "GET":
+            return 200, {"status": "ok", "sessions": len(self.sessions), "audio_queue": self.audio_queue.qsize(),
+                         "ollama_queue": ollama_queue.qsize()}
+        if parts == ["sessions"] and method == "POST":
+            return self._open_session(query)
+        if len(parts) == 3 and parts[0] == "sessions" and parts[2] == "audio" and method == "POST":
+            session = self._session(parts[1])
+            if session.status != "open":
+                raise HttpError(409, "session is closed")
+            session.add_audio(body)
+            INGEST_BYTES.inc(amount=len(body))
+            return 200, {"audio_seconds": round(session.audio_seconds, 3)}
+        if len(parts) == 2 and parts[0] == "sessions":
+            session = self._session(parts[1])
+            if method == "GET":
+                rows, total = session.rows_since(int(query.get("since", 0)))
+                return 200, {"session": session.session_id, "source": session.source, "status": session.status,
+                             "audio_seconds": round(session.audio_seconds, 3), "blocks": session.blocks,
+                             "next": total, "summaries": rows}
+            if method == "DELETE":
+                session.close()
+                return 200, {"session": session.session_id, "status": session.status}
+            raise HttpError(405, f"{method} not allowed here")
+        raise HttpError(404, f"no route for {method} {url.path}")
+
+    def _open_session(self, query):
+        pcm_format = query.get("format", "s16le").lower()
+        if pcm_format not in PCM_FORMATS:
+            raise HttpError(400, f"unknown format '{pcm_format}', use one of {', '.join(PCM_FORMATS)}")
+        if int(query.get("rate", SAMPLERATE)) != SAMPLERATE:
+            raise HttpError(400, f"audio must be sampled at {SAMPLERATE} Hz")
+        session_id = uuid.uuid4().hex[:12]
+        source = query.get("name") or f"client-{session_id}"
+        existing = self.sessions_by_source.get(source)
+        if existing is not None and existing.status != "done":
+            raise HttpError(409, f"a session named '{source}' is still running")
+
+        session = IngestSession(session_id, source, pcm_format, self.audio_queue)
+        whisper_transcribe.pipelines[source] = _SessionPipeline(session)
+        self.sessions[session_id] = session
+        self.sessions_by_source[source] = session
+        log_and_print(f"[Ingest Server] Session '{source}' opened ({pcm_format}).")
+        return 201, {"session": session_id, "source": source}
+
+def _wait_for_sessions(server, timeout):
+    """Graceful shutdown: let every session's remaining audio be transcribed and summarised."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and any(s.status != "done" for s in server.sessions.values()):
+        time.sleep(0.5)
+
+def main():
+    try:
+        initialize_whisper_model()
+        ai_chat = OllamaAIChat()
+    except Exception as e:
+        log_and_print(f"Critical error: failed to initialize the models: {e}")
+        return
+    if WARMUP_ENABLED:
+        warm_up_whisper_model()
+        ai_chat.warm_up()
+
+    audio_queue = BoundedAudioQueue(maxsize=AUDIO_QUEUE_MAXSIZE * 4)
+    AUDIO_QUEUE_DEPTH.set_function(audio_queue.qsize)
+    start_metrics_server()
+    server = IngestServer(audio_queue)
+
+    sink_thread = Thread(target=sink_worker, args=(SinkWriter(create_sinks()),), daemon=True)
+    sink_thread.start()
+    Thread(target=transcription_worker, args=(audio_queue, INGEST_BATCH_DEADLINE), daemon=True).start()
+    Thread(target=ollama_worker, args=(ai_chat,), daemon=True).start()
+    Thread(target=offline_queue_worker, args=(ai_chat,), daemon=True).start()
+
+    # Stop serving on SIGTERM as on Ctrl+C; the workers keep running until the sessions are finished
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
+    log_and_print("[Ingest Server] Shutting down; finishing the open sessions...")
+    server.close_all()
+    _wait_for_sessions(server, timeout=300)
+    ollama_queue.join()
+    try:
+        ai_chat._try_offline_queue(limit=len(ai_chat.offline_queue), ignore_schedule=True)
+    except Exception as e:
+        log_and_print(f"Error while trying final offline queue reprocessing: {e}", level=WARNING)
+
+    shutdown_event.set()
+    sink_queue.put(None)
+    sink_thread.join(timeout=60)
+    try:
+        write_snapshot()
+    except Exception as e:
+        log_and_print(f"Error writing the final metrics snapshot: {e}")
+    shutdown_whisper_processes()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import json
+import re
+
+def closes_string(text, pos, complete=True):
+    """
+    Decides whether the quote at text[pos] ends the current string or is an unescaped quote
+    inside it. It ends the string if what follows is the end of the text, ']', another
+    element's opening quote (missing comma), or a comma followed by one of those or by the
+    start of a non-string element (a number, '[' or '{').
+    With complete=False the text is still growing, so None is returned while what follows
+    the quote does not decide it yet.
+    """
+    i = pos + 1
+    while i < len(text) and text[i].isspace():
+        i += 1
+    if i >= len(text):
+        return True if complete else None
+    if text[i] in ']"':
+        return True
+    if text[i] == ",":
+        i += 1
+        while i < len(text) and text[i].isspace():
+            i += 1
+        if i >= len(text):
+            return True if complete else None
+        return text[i] in ']"[{-' or text[i].isdigit()
+    return False
+
+class JsonArrayStreamParser:
+    """
+    Incremental parser for a streamed JSON array of strings, e.g. the bullet points
+    Ollama generates token by token.
+
+    Text is fed in as it arrives; a string element is returned once the text after its
+    closing quote shows that the quote really ends it (see closes_string), so an unescaped
+    quote inside a bullet point is kept as part of it. As soon as the text can no longer
+    become an array of strings (too much text before '[', a non-string element, a missing
+    comma...), 'malformed' is set to the reason and nothing more is parsed; the caller
+    then has to repair the complete reply. 'done' is set once the closing ']' has been seen.
+    """
+    _PREAMBLE, _EXPECT_VALUE, _IN_STRING, _AFTER_VALUE, _DONE = range(5)
+
+    def __init__(self, max_preamble_chars=200):
+        self.max_preamble_chars = max_preamble_chars
+        self.items = []
+        self.malformed = None
+        self._state = self._PREAMBLE
+        self._preamble_chars = 0
+        self._current = []
+        self._escaped = False
+        self._lookahead = None  # Text after a quote that may or may not end the current string
+
+    @property
+    def done(self):
+        return self._state == self._DONE
+
+    def feed(self, text):
+        """Consume the next piece of text and return the list of string elements it completed."""
+        completed = []
+        for ch in text:
+            if self.malformed or self._state == self._DONE:
+                break
+            if self._lookahead is not None:
+                self._lookahead += ch
+                closes = closes_string('"' + self._lookahead, 0, complete=False)
+                if closes is None:
+                    continue
+                lookahead, self._lookahead = self._lookahead, None
+                if closes:
+                    self._end_string(completed)
+                else:
+                    self._current.append('\\"')  # An unescaped quote inside the string
+                completed.extend(self.feed(lookahead))
+                continue
+            if self._state == self._PREAMBLE:
+                if ch == "[":
+                    self._state = self._EXPECT_VALUE
+                else:
+                    self._preamble_chars += 1
+                    if self._preamble_chars > self.max_preamble_chars:
+                        self.malformed = f"no '[' within the first {self.max_preamble_chars} characters"
+            elif self._state == self._EXPECT_VALUE:
+                if ch == '"':
+                    self._state = self._IN_STRING
+                elif ch == "]":
+                    self._state = self._DONE
+                elif not ch.isspace():
+                    self.malformed = f"unexpected {ch!r} where a string element should start"
+            elif self._state == self._IN_STRING:
+                if self._escaped:
+                    self._current.append(ch)
+                    self._escaped = False
+                elif ch == "\\":
+                    self._current.append(ch)
+                    self._escaped = True
+                elif ch == '"':
+                    self._lookahead = ""
+                else:
+                    self._current.append(ch)
+            elif self._state == self._AFTER_VALUE:
+                if ch == ",":
+                    self._state = self._EXPECT_VALUE
+                elif ch == "]":
+                    self._state = self._DONE
+                elif not ch.isspace():
+                    self.malformed = f"unexpected {ch!r} after a string element"
+        return completed
+
+    def _end_string(self, completed):
+        item = self._decode("".join(self._current))
+        self._current = []
+        if item is None:
+            self.malformed = "invalid escape sequence in a string element"
+        else:
+            self.items.append(item)
+            completed.append(item)
+            self._state = self._AFTER_VALUE
+
+    @staticmethod
+    def _decode(raw):
+        """Decode the body of a JSON string; raw newlines/tabs (common in model output) become spaces."""
+        raw = re.sub(r"[\n\r\t]", " ", raw)
+        try:
+            return json.loads(f'"{raw}"')
+        except json.JSONDecodeError:
+            return None
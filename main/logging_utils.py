@@ -1,20 +1,98 @@
+import atexit
+import logging
+import logging.handlers
 import time
-from threading import Event, Lock
-from config import LOG_FILE  # Now we import LOG_FILE from config.py
+from queue import Queue
+from threading import Event, Lock, Thread
+from config import (
+    LOG_FILE,
+    LOG_LEVEL,
+    LOG_CONSOLE_LEVEL,
+    LOG_ROTATION,
+    LOG_MAX_BYTES,
+    LOG_BACKUP_COUNT,
+)
 
 shutdown_event = Event()
 text_lock = Lock()
 
-def log_and_print(message):
+# Levels accepted by log_and_print
+DEBUG, INFO, WARNING, ERROR = logging.DEBUG, logging.INFO, logging.WARNING, logging.ERROR
+
+class _BatchedFlushMixin:
     """
-    Prints the message to the console and logs it to the log file.
+    File handler variant whose emit() does not flush the file; the log writer thread
+    flushes once per batch instead, so a burst of messages costs a single write.
     """
-    timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-    formatted_message = f"[{timestamp}] {message}"
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        logging.StreamHandler.flush(self)
+
+class _BatchedRotatingFileHandler(_BatchedFlushMixin, logging.handlers.RotatingFileHandler):
+    pass
+
+class _BatchedTimedRotatingFileHandler(_BatchedFlushMixin, logging.handlers.TimedRotatingFileHandler):
+    pass
+
+def _create_file_handler():
+    if LOG_ROTATION.lower() == "daily":
+        handler = _BatchedTimedRotatingFileHandler(LOG_FILE, when="midnight", backupCount=LOG_BACKUP_COUNT,
+                                                   encoding="utf-8", delay=True)
+    else:
+        handler = _BatchedRotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT,
+                                              encoding="utf-8", delay=True)
+    handler.setFormatter(logging.Formatter("[%(asctime)s] [%(levelname)s] %(message)s", datefmt="%Y-%m-%d %H:%M:%S"))
+    return handler
+
+# Log records waiting for the log writer thread; None stops it
+_log_queue = Queue()
+_file_level = logging.getLevelName(LOG_LEVEL.upper())
+_console_level = logging.getLevelName(LOG_CONSOLE_LEVEL.upper())
 
-    # Print to console
-    print(formatted_message)
+def _log_writer(handler):
+    """Writes queued log records to the log file in batches until it receives None."""
+    while True:
+        batch = [_log_queue.get()]
+        while not _log_queue.empty() and len(batch) < 1000:
+            batch.append(_log_queue.get_nowait())
+        for record in batch:
+            if record is not None:
+                try:
+                    handler.handle(record)
+                except Exception:
+                    pass  # Logging must never take a worker down
+        try:
+            handler.flush_batch()
+        except Exception:
+            pass
+        for _ in batch:
+            _log_queue.task_done()
+        if None in batch:
+            handler.close()
+            return
+
+_log_writer_thread = Thread(target=_log_writer, args=(_create_file_handler(),), daemon=True)
+_log_writer_thread.start()
+
+def flush_logs():
+    """Write out every queued log message and stop the log writer. Runs automatically at exit."""
+    if _log_writer_thread.is_alive():
+        _log_queue.put(None)
+        _log_writer_thread.join(timeout=10)
+
+atexit.register(flush_logs)
+
+def log_and_print(message, level=INFO):
+    """
+    Prints the message to the console and logs it to the log file.
+    The file is written by a background thread, so this never waits on disk I/O.
+    Full transcripts and Ollama responses are logged at DEBUG level, which LOG_LEVEL hides by default.
+    """
+    if level >= _console_level:
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+        print(f"[{timestamp}] {message}")
 
-    # Log to file
-    with open(LOG_FILE, "a", encoding="utf-8") as f:
-        f.write(formatted_message + "\n")
\ No newline at end of file
+    if level >= _file_level and _log_writer_thread.is_alive():
+        _log_queue.put(logging.LogRecord("nosy_neighbour", level, __file__, 0, message, None, None))
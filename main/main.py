@@ -3,17 +3,22 @@ import time
 import signal
 from threading import Thread
 
-from config import LOG_FILE
+from config import LOG_FILE, AUDIO_CAPTURE_MODE, WARMUP_ENABLED, AUDIO_SOURCES, DEFAULT_AUDIO_SOURCE, AUDIO_QUEUE_MAXSIZE, JOURNAL_ENABLED
+import config
 from logging_utils import log_and_print, shutdown_event
 from select_microphone import list_mics_and_select
-from audio_capture import audio_capture_worker, cleanup_temp_files
-from whisper_transcribe import initialize_whisper_model, transcription_worker, _drain_accumulated_text
-from ollama_worker import ollama_worker, ollama_queue
+from audio_capture import AudioChunk, audio_capture_worker, cleanup_temp_files
+from whisper_transcribe import initialize_whisper_model, warm_up_whisper_model, transcription_worker, get_pipeline, pipelines, _drain_accumulated_text, shutdown_whisper_processes
+from ollama_worker import ollama_worker, offline_queue_worker, ollama_queue
 from ollama_ai_chat import OllamaAIChat
-from queue import Queue
+from output_sinks import create_sinks, SinkWriter, sink_worker, sink_queue
+from audio_backlog import BoundedAudioQueue
+from metrics import AUDIO_QUEUE_DEPTH, start_metrics_server, metrics_snapshot_worker, write_snapshot
+from pipeline_journal import open_journal, close_journal, load_chunk_audio
 
 # Hold a reference to OllamaAIChat here so _handle_graceful_shutdown can see it
 ai_chat_global = None
+sink_thread_global = None
 
 def _handle_graceful_shutdown(signum, frame):
     log_and_print("\nTermination signal received.")
@@ -25,23 +30,70 @@ def _handle_graceful_shutdown(signum, frame):
     log_and_print("Waiting for Ollama worker to finish any newly queued items...")
     ollama_queue.join()  # Blocks until all items have been processed
 
-    # 3) Attempt re-processing offline blocks if needed, after checking if Ollama is online
+    # 3) Give every offline block one last attempt (ignoring its backoff), after checking if Ollama is online
     if ai_chat_global is not None:
         try:
-            ai_chat_global._try_offline_queue()
+            ai_chat_global._try_offline_queue(limit=len(ai_chat_global.offline_queue), ignore_schedule=True)
             log_and_print("Offline queue reprocessing attempt completed.")
         except Exception as e:
             log_and_print(f"Error while trying final offline queue reprocessing: {e}")
+        cache = ai_chat_global.summary_cache
+        if cache is not None:
+            log_and_print(f"Summary cache: {cache.hits} hits, {cache.misses} misses this session.")
 
-    # 4) Signal the shutdown event so worker threads can stop
+    # 4) Signal the shutdown event so worker threads can stop, then let the sink writer commit everything
     shutdown_event.set()
+    if sink_thread_global is not None:
+        sink_queue.put(None)
+        sink_thread_global.join(timeout=60)
+    try:
+        write_snapshot()
+    except Exception as e:
+        log_and_print(f"Error writing the final metrics snapshot: {e}")
+    close_journal()
 
-    # 5) Cleanup temp files, etc.
-    cleanup_temp_files()
+    # 5) Stop the Whisper worker processes and cleanup temp files (only the legacy file capture mode creates them)
+    shutdown_whisper_processes()
+    if AUDIO_CAPTURE_MODE.lower() == "file":
+        cleanup_temp_files()
 
     # 6) Exit the program gracefully
     sys.exit(0)
 
+def _recover_from_journal(journal, audio_queue, sources):
+    """
+    Requeue what the previous session journaled but did not finish: blocks, then segments, then audio.
+    A source that is no longer configured gets a temporary pipeline, which its last recovered chunk
+    ends and removes, so the transcription worker does not keep waiting for that source's audio.
+    """
+    state = journal.state
+    for source, text in state.blocks:
+        ollama_queue.put((source, text))
+
+    chunks = []
+    for chunk_id in sorted(state.chunks):
+        record = state.chunks[chunk_id]
+        try:
+            chunk = AudioChunk(load_chunk_audio(record), record["start_time"], record["duration"], record["overlap"], record["source"])
+        except Exception as e:
+            log_and_print(f"[Journal] Could not load the audio of journaled chunk {chunk_id}: {e}")
+            journal.record({"op": "chunk_done", "id": chunk_id})
+            continue
+        chunk.journal_id = chunk_id
+        chunks.append(chunk)
+    last_chunks = {chunk.source: chunk for chunk in chunks if chunk.source not in sources}
+    for chunk in last_chunks.values():
+        chunk.final = True
+
+    for source, segments in list(state.segments.items()):
+        pipeline = get_pipeline(source)
+        pipeline.restore_segments(segments)
+        if source not in sources and source not in last_chunks:
+            pipeline.end_of_stream()
+            pipelines.pop(source, None)
+    for chunk in chunks:
+        audio_queue.put(chunk)
+
 def main():
     # 1) Setup signal handlers
     signal.signal(signal.SIGINT, _handle_graceful_shutdown)
@@ -64,26 +116,53 @@ def main():
         shutdown_event.set()
         sys.exit(1)
 
-    list_mics_and_select()  # let the user pick the mic
+    # Warm up both models so the first block is as fast as the rest
+    if WARMUP_ENABLED:
+        warm_up_whisper_model()
+        ai_chat_global.warm_up()
+
+    # Every configured source is captured at once; without AUDIO_SOURCES the user picks a single mic
+    if AUDIO_SOURCES:
+        sources = dict(AUDIO_SOURCES)
+    else:
+        list_mics_and_select()  # let the user pick the mic
+        sources = {DEFAULT_AUDIO_SOURCE: config.MICROPHONE_INDEX}
+    for source in sources:
+        get_pipeline(source)
    
-    # 4) Create the main audio queue
-    audio_queue = Queue()
+    # 4) Create the main audio queue (bounded, see AUDIO_OVERLOAD_POLICY, shared by all sources) and start the metrics endpoint
+    audio_queue = BoundedAudioQueue(maxsize=AUDIO_QUEUE_MAXSIZE * len(sources))
+    AUDIO_QUEUE_DEPTH.set_function(audio_queue.qsize)
+    start_metrics_server()
+    Thread(target=metrics_snapshot_worker, daemon=True).start()
 
-    # 5) Start audio capture worker
-    audio_thread = Thread(target=audio_capture_worker, args=(audio_queue,), daemon=True)
-    audio_thread.start()
-    log_and_print("Audio capture worker started.")
-
-    # 6) Start transcription worker
+    # 5) Start the transcription worker (one shared Whisper model for all sources)
     transcription_thread = Thread(target=transcription_worker, args=(audio_queue,), daemon=True)
     transcription_thread.start()
     log_and_print("Transcription worker started.")
 
-    # 7) Start Ollama worker
+    # 6) Replay the crash recovery journal, so recovered work is queued ahead of new audio, then start one audio capture worker per source
+    if JOURNAL_ENABLED:
+        _recover_from_journal(open_journal(), audio_queue, sources)
+    for source, device in sources.items():
+        audio_thread = Thread(target=audio_capture_worker, args=(audio_queue, device, source), daemon=True)
+        audio_thread.start()
+        log_and_print(f"Audio capture worker started for source '{source}' (device {device}).")
+
+    # 7) Start the output sink writer, then the Ollama worker that feeds it
+    global sink_thread_global
+    sink_thread_global = Thread(target=sink_worker, args=(SinkWriter(create_sinks()),), daemon=True)
+    sink_thread_global.start()
+    log_and_print("Output sink writer started.")
+
     ollama_thread = Thread(target=ollama_worker, args=(ai_chat_global,), daemon=True)
     ollama_thread.start()
     log_and_print("Ollama worker started.")
 
+    offline_thread = Thread(target=offline_queue_worker, args=(ai_chat_global,), daemon=True)
+    offline_thread.start()
+    log_and_print("Offline queue worker started.")
+
     # Main loop
     try:
         while not shutdown_event.is_set():
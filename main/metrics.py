@@ -0,0 +1,254 @@
+import json
+import os
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+
+from config import (
+    METRICS_PORT,
+    METRICS_SNAPSHOT_FILE,
+    METRICS_SNAPSHOT_INTERVAL,
+)
+from logging_utils import log_and_print, shutdown_event
+
+_registry = []
+
+def _format_labels(label_names, label_values, extra=None):
+    pairs = list(zip(label_names, label_values)) + (extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+class Counter:
+    """Monotonically increasing count, optionally split by label values."""
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = Lock()
+        _registry.append(self)
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            return [(self.name, labels, None, value) for labels, value in self._values.items()]
+
+    def snapshot(self):
+        with self._lock:
+            if not self.label_names:
+                return self._values.get((), 0)
+            return {",".join(labels): value for labels, value in self._values.items()}
+
+class Gauge:
+    """Current value, either set directly or read from a function (e.g. a queue's qsize) when scraped."""
+    kind = "gauge"
+
+    def __init__(self, name, help_text, function=None):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = ()
+        self._value = 0
+        self._function = function
+        _registry.append(self)
+
+    def set(self, value):
+        self._value = value
+
+    def set_function(self, function):
+        self._function = function
+
+    def snapshot(self):
+        if self._function is not None:
+            try:
+                return self._function()
+            except Exception:
+                return None
+        return self._value
+
+    def _samples(self):
+        value = self.snapshot()
+        return [] if value is None else [(self.name, (), None, value)]
+
+class Histogram:
+    """Distribution of observed values in cumulative buckets (Prometheus style), plus their count and sum."""
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self.buckets = sorted(buckets)
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = Lock()
+        _registry.append(self)
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.setdefault(label_values, [0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def _samples(self):
+        samples = []
+        with self._lock:
+            for labels, series in self._series.items():
+                for bound, count in zip(self.buckets, series):
+                    samples.append((self.name + "_bucket", labels, ("le", f"{bound:g}"), count))
+                samples.append((self.name + "_bucket", labels, ("le", "+Inf"), series[-2]))
+                samples.append((self.name + "_count", labels, None, series[-2]))
+                samples.append((self.name + "_sum", labels, None, series[-1]))
+        return samples
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for labels, series in self._series.items():
+                count, total = series[-2], series[-1]
+                result[",".join(labels) or "all"] = {"count": count, "sum": round(total, 6),
+                                                     "mean": round(total / count, 6) if count else None}
+            return result
+
+# Capture
+AUDIO_CHUNKS_CAPTURED = Counter("nosy_audio_chunks_captured_total", "Audio chunks handed to the transcription worker")
+AUDIO_FRAMES_LOST = Counter("nosy_audio_frames_lost_total", "Audio frames lost to ring buffer overruns")
+AUDIO_QUEUE_DEPTH = Gauge("nosy_audio_queue_depth", "Audio chunks waiting for transcription")
+AUDIO_SPILL_DEPTH = Gauge("nosy_audio_spill_depth", "Audio chunks waiting on disk (\"spill\" overload policy)")
+AUDIO_CHUNKS_SPILLED = Counter("nosy_audio_chunks_spilled_total", "Audio chunks spilled to disk because the audio queue was full")
+AUDIO_CHUNKS_DROPPED = Counter("nosy_audio_chunks_dropped_total", "Audio chunks dropped because the audio queue was full")
+
+# Transcription
+WHISPER_CHUNKS = Counter("nosy_whisper_chunks_total", "Audio chunks by silence gate result", labels=("result",))
+WHISPER_BATCH_SECONDS = Histogram("nosy_whisper_batch_seconds", "Wall time of one batched Whisper call",
+                                  buckets=(0.25, 0.5, 1, 2, 5, 10, 20, 40))
+TRANSCRIPTION_LAG_SECONDS = Gauge("nosy_transcription_lag_seconds", "How far behind real time the last transcribed chunk ended")
+TRANSCRIPTION_LAG = Histogram("nosy_transcription_lag_seconds_distribution", "Time from the end of a chunk's audio to the end of its transcription",
+                              buckets=(5, 10, 20, 40, 60, 120, 300, 600, 1800))
+WHISPER_DEGRADED = Gauge("nosy_whisper_degraded", "1 while the faster degraded Whisper model is in use")
+WHISPER_REAL_TIME_FACTOR = Histogram("nosy_whisper_real_time_factor", "Whisper processing time per second of audio, per chunk",
+                                     buckets=(0.02, 0.05, 0.1, 0.2, 0.5, 1, 2))
+
+# Ingest server
+INGEST_SESSIONS = Gauge("nosy_ingest_sessions", "Open ingest server sessions")
+INGEST_BYTES = Counter("nosy_ingest_audio_bytes_total", "PCM bytes received by the ingest server")
+
+# Ollama
+OLLAMA_QUEUE_DEPTH = Gauge("nosy_ollama_queue_depth", "Text blocks waiting for Ollama")
+OLLAMA_BLOCKS = Counter("nosy_ollama_blocks_total", "Text blocks by outcome", labels=("result",))
+OLLAMA_BLOCK_SECONDS = Histogram("nosy_ollama_block_seconds", "Wall time to summarise one block",
+                                 buckets=(1, 2, 5, 10, 20, 40, 80, 160))
+OLLAMA_EVAL_TOKENS = Counter("nosy_ollama_eval_tokens_total", "Tokens generated by Ollama")
+OLLAMA_PROMPT_EVAL_TOKENS = Counter("nosy_ollama_prompt_eval_tokens_total", "Prompt tokens evaluated by Ollama")
+OLLAMA_EVAL_SECONDS = Histogram("nosy_ollama_eval_seconds", "Generation time reported by Ollama (eval_duration)",
+                                buckets=(0.5, 1, 2, 5, 10, 20, 40, 80))
+OLLAMA_PROMPT_EVAL_SECONDS = Histogram("nosy_ollama_prompt_eval_seconds", "Prompt evaluation time reported by Ollama",
+                                       buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10))
+OLLAMA_TOKENS_PER_SECOND = Histogram("nosy_ollama_tokens_per_second", "Generation speed per request",
+                                     buckets=(5, 10, 20, 40, 60, 80, 120, 200))
+OLLAMA_OUTPUT_PATHS = Counter("nosy_ollama_output_paths_total", "How replies were turned into bullet points (one path per reply)",
+                              labels=("path",))
+SUMMARY_CACHE_LOOKUPS = Counter("nosy_summary_cache_lookups_total", "Summary cache lookups by result", labels=("result",))
+
+# Output sinks
+SINK_QUEUE_DEPTH = Gauge("nosy_sink_queue_depth", "Summary rows waiting for the sink writer")
+SINK_ROWS = Counter("nosy_sink_rows_total", "Summary rows handed to the sink writer")
+SINK_COMMIT_SECONDS = Histogram("nosy_sink_commit_seconds", "Time to commit one batch to a sink",
+                                buckets=(0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 5), labels=("sink",))
+SINK_COMMIT_FAILURES = Counter("nosy_sink_commit_failures_total", "Failed sink commits", labels=("sink",))
+
+def record_ollama_response(response):
+    """Record the timing fields Ollama returns with a finished generation (durations are in nanoseconds)."""
+    try:
+        eval_count = response.get("eval_count") or 0
+        eval_duration = (response.get("eval_duration") or 0) / 1e9
+        prompt_eval_count = response.get("prompt_eval_count") or 0
+        prompt_eval_duration = (response.get("prompt_eval_duration") or 0) / 1e9
+    except Exception:
+        return
+    OLLAMA_EVAL_TOKENS.inc(amount=eval_count)
+    OLLAMA_PROMPT_EVAL_TOKENS.inc(amount=prompt_eval_count)
+    if eval_duration > 0:
+        OLLAMA_EVAL_SECONDS.observe(eval_duration)
+        OLLAMA_TOKENS_PER_SECOND.observe(eval_count / eval_duration)
+    if prompt_eval_duration > 0:
+        OLLAMA_PROMPT_EVAL_SECONDS.observe(prompt_eval_duration)
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.help_text}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, extra, value in metric._samples():
+            lines.append(f"{name}{_format_labels(metric.label_names, labels, [extra] if extra else None)} {value:g}")
+    return "\n".join(lines) + "\n"
+
+def snapshot():
+    """All metrics as a plain dictionary, plus the derived fix prompt rate (share of replies that needed the fix prompt)."""
+    data = {metric.name: metric.snapshot() for metric in _registry}
+    paths = OLLAMA_OUTPUT_PATHS.snapshot()
+    replies = sum(paths.values())  # Every reply is counted under exactly one path
+    data["fix_prompt_rate"] = round(paths.get("fix_prompt", 0) / replies, 4) if replies else None
+    data["timestamp"] = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+    return data
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = render_prometheus(), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body, content_type = json.dumps(snapshot(), indent=2), "application/json"
+        else:
+            self.send_error(404)
+            return
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes would flood the log
+
+def start_metrics_server(port=METRICS_PORT):
+    """Serve /metrics (Prometheus text) and /metrics.json on localhost in a daemon thread. Port 0 disables it."""
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer(("127.0.0.1", port), _MetricsHandler)
+    except OSError as e:
+        log_and_print(f"[Metrics] Could not start the metrics endpoint on port {port}: {e}")
+        return None
+    Thread(target=server.serve_forever, daemon=True).start()
+    log_and_print(f"[Metrics] Serving metrics on http://127.0.0.1:{port}/metrics")
+    return server
+
+def write_snapshot(snapshot_file=METRICS_SNAPSHOT_FILE):
+    """Write the JSON snapshot atomically, so readers never see a half-written file."""
+    tmp_file = snapshot_file + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(snapshot(), f, indent=2)
+    os.replace(tmp_file, snapshot_file)
+
+def metrics_snapshot_worker(interval=METRICS_SNAPSHOT_INTERVAL):
+    """Write the JSON snapshot every 'interval' seconds until shutdown, and once more at the end."""
+    if interval <= 0:
+        return
+    while not shutdown_event.wait(interval):
+        try:
+            write_snapshot()
+        except Exception as e:
+            log_and_print(f"[Metrics] Could not write metrics snapshot: {e}")
+    try:
+        write_snapshot()
+    except Exception:
+        pass
@@ -0,0 +1,133 @@
+import json
+import os
+import random
+import sqlite3
+import time
+from threading import Lock
+
+from config import (
+    OFFLINE_QUEUE_DB,
+    OFFLINE_QUEUE_FILE,
+    OFFLINE_RETRY_BASE_SECONDS,
+    OFFLINE_RETRY_MAX_SECONDS,
+)
+from logging_utils import log_and_print
+
+class OfflineQueue:
+    """
+    Durable queue of blocks that could not be summarised, stored in SQLite (WAL mode).
+
+    Every block keeps its attempt count and the time of its next retry, which grows
+    exponentially (with jitter) up to OFFLINE_RETRY_MAX_SECONDS, and how many of its
+    bullet points an attempt that failed part-way has already published. Enqueueing is a single
+    insert, fetching due blocks is an indexed lookup and every change is its own
+    transaction, so a crash can never lose or half-write the queue.
+    """
+    def __init__(self, db_file=OFFLINE_QUEUE_DB, legacy_file=OFFLINE_QUEUE_FILE):
+        self.db_file = db_file
+        self._lock = Lock()
+        # Shared by the Ollama worker and the drainer thread; every use is under self._lock
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS blocks ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, block_id INTEGER, raw_text TEXT NOT NULL, "
+                "attempts INTEGER NOT NULL DEFAULT 0, next_retry REAL NOT NULL, last_error TEXT, created REAL NOT NULL, source TEXT, published INTEGER NOT NULL DEFAULT 0)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS blocks_next_retry ON blocks (next_retry)")
+            # Legacy queue files already imported, recorded in the same transaction as their blocks
+            self.conn.execute("CREATE TABLE IF NOT EXISTS migrated_files (path TEXT PRIMARY KEY, migrated REAL NOT NULL)")
+            columns = [row[1] for row in self.conn.execute("PRAGMA table_info(blocks)")]
+            if "source" not in columns:
+                # Queues created before multi-source capture
+                self.conn.execute("ALTER TABLE blocks ADD COLUMN source TEXT")
+            if "published" not in columns:
+                # Queues created before bullet points were published while streaming
+                self.conn.execute("ALTER TABLE blocks ADD COLUMN published INTEGER NOT NULL DEFAULT 0")
+        if legacy_file:
+            self._migrate_legacy_file(legacy_file)
+
+    @staticmethod
+    def retry_delay(attempts):
+        """Seconds to wait before the next retry of a block that has failed 'attempts' times."""
+        delay = min(OFFLINE_RETRY_BASE_SECONDS * (2 ** max(attempts - 1, 0)), OFFLINE_RETRY_MAX_SECONDS)
+        return delay * random.uniform(0.8, 1.2)
+
+    def put(self, block_id, raw_text, error=None, source=None, published=0):
+        """Store a block that failed for the first time; it becomes due after the base delay."""
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO blocks (block_id, raw_text, attempts, next_retry, last_error, created, source, published) VALUES (?, ?, 1, ?, ?, ?, ?, ?)",
+                (block_id, raw_text, now + self.retry_delay(1), error, now, source, published)
+            )
+
+    def due(self, limit, ignore_schedule=False):
+        """Return up to 'limit' (id, block_id, raw_text, attempts, source, published) rows whose retry time has come, oldest first."""
+        cutoff = float("inf") if ignore_schedule else time.time()
+        with self._lock:
+            return self.conn.execute(
+                "SELECT id, block_id, raw_text, attempts, source, published FROM blocks WHERE next_retry <= ? ORDER BY next_retry LIMIT ?",
+                (cutoff, limit)
+            ).fetchall()
+
+    def contains(self, block_id, source):
+        """Whether a block (block ID and source) is still waiting in the queue."""
+        with self._lock:
+            return self.conn.execute(
+                "SELECT 1 FROM blocks WHERE block_id = ? AND source IS ? LIMIT 1", (block_id, source)
+            ).fetchone() is not None
+
+    def remove(self, entry_id):
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM blocks WHERE id = ?", (entry_id,))
+
+    def reschedule(self, entry_id, attempts, error, published=0):
+        """Record another failed attempt (and how many bullet points are published by now) and push the block's next retry back."""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE blocks SET attempts = ?, next_retry = ?, last_error = ?, published = ? WHERE id = ?",
+                (attempts + 1, time.time() + self.retry_delay(attempts + 1), str(error), published, entry_id)
+            )
+
+    def __len__(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM blocks").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def _migrate_legacy_file(self, legacy_file):
+        """
+        Move blocks from the old JSON-lines queue file into the database (due immediately), then delete the file.
+        The file is recorded as migrated together with its blocks, so a crash before the delete never imports it twice.
+        """
+        if not os.path.exists(legacy_file):
+            return
+        key = os.path.abspath(legacy_file)
+        with self._lock:
+            already_migrated = self.conn.execute("SELECT 1 FROM migrated_files WHERE path = ?", (key,)).fetchone()
+        if already_migrated:
+            os.remove(legacy_file)
+            log_and_print(f"[OfflineQueue] '{legacy_file}' was already migrated into '{self.db_file}'; removed it.")
+            return
+        rows = []
+        now = time.time()
+        with open(legacy_file, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    obj = json.loads(line)
+                    rows.append((obj["block_id"], obj["raw_text"], now))
+                except (json.JSONDecodeError, KeyError):
+                    continue  # Corrupted lines were skipped by the old queue too
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO blocks (block_id, raw_text, attempts, next_retry, created) VALUES (?, ?, 0, ?, ?)",
+                [(block_id, raw_text, now, created) for block_id, raw_text, created in rows]
+            )
+            self.conn.execute("INSERT INTO migrated_files (path, migrated) VALUES (?, ?)", (key, now))
+        os.remove(legacy_file)
+        log_and_print(f"[OfflineQueue] Migrated {len(rows)} blocks from '{legacy_file}' into '{self.db_file}'.")
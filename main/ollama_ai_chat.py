@@ -1,51 +1,232 @@
 import json
-import os
 import re
-import random
-import openpyxl
-from datetime import datetime
-from openpyxl.styles import PatternFill
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
 
 import ollama
-from logging_utils import log_and_print
+from logging_utils import log_and_print, DEBUG
+from output_sinks import publish_summary_rows
+from offline_queue import OfflineQueue
+from summary_cache import SummaryCache
+from ollama_health import OllamaCircuitBreaker
+from transcript_accumulator import estimate_tokens, CHARS_PER_TOKEN
+from json_array_stream import JsonArrayStreamParser, closes_string
+from metrics import OLLAMA_BLOCKS, OLLAMA_OUTPUT_PATHS, record_ollama_response
 from config import (
     OLLAMA_MODEL,
     OLLAMA_OPTIONS,
+    OLLAMA_KEEP_ALIVE,
+    OLLAMA_INSTRUCTIONS_AS_SYSTEM_PROMPT,
     OLLAMA_PROMPT_MODE,
-    OFFLINE_QUEUE_FILE,
-    EXCEL_FILE,
-    FALLBACK_TEXT_FILE,
-    EXCEL_COLOR_LIST)
-last_chosen_color = None
+    OFFLINE_DRAIN_BATCH_SIZE,
+    OFFLINE_DRAIN_MAX_CONCURRENCY,
+    OLLAMA_MAP_REDUCE_ENABLED,
+    OLLAMA_MAP_REDUCE_THRESHOLD_TOKENS,
+    OLLAMA_SUB_BLOCK_TOKENS,
+    OLLAMA_SUB_BLOCK_OVERLAP_TOKENS,
+    OLLAMA_MAX_PARALLEL_REQUESTS,
+    OLLAMA_STREAMING,
+    OLLAMA_STREAM_MAX_PREAMBLE_CHARS,
+    OLLAMA_STRUCTURED_OUTPUT,
+    SUMMARY_CACHE_ENABLED)
+
+# JSON schema passed as Ollama's 'format' so the reply can only be an array of bullet point strings
+BULLET_LIST_SCHEMA = {"type": "array", "items": {"type": "string"}}
+
+# Characters that models use in place of plain JSON quotes
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "„": '"', "‟": '"', "″": '"'})
+_JSON_ESCAPE = re.compile(r'\\(u[0-9a-fA-F]{4}|.)', flags=re.DOTALL)
+_JSON_ESCAPE_CHARS = {"n": "\n", "r": "\r", "t": "\t", "b": "", "f": ""}
+_JSON_NUMBER = re.compile(r"-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?")
+
+def _decode_json_string(raw):
+    """
+    Decodes a JSON string body leniently: raw control characters become spaces and an
+    invalid escape such as \\x just yields the character, instead of failing the parse.
+    """
+    def _unescape(match):
+        seq = match.group(1)
+        if len(seq) == 5:
+            return chr(int(seq[1:], 16))
+        return _JSON_ESCAPE_CHARS.get(seq, seq)
+
+    text = _JSON_ESCAPE.sub(_unescape, re.sub(r"[\n\r\t]", " ", raw))
+    try:
+        # Join any \uXXXX surrogate pairs (emoji etc.) into real characters
+        text = text.encode("utf-16", "surrogatepass").decode("utf-16")
+    except UnicodeError:
+        pass
+    return text.strip()
+
+def _flatten_bullets(value):
+    """
+    The bullet points of a parsed JSON array: nested arrays are flattened and numbers become
+    strings. Returns None if it holds anything else (objects, true/false/null).
+    """
+    items = []
+    for element in value:
+        if isinstance(element, list):
+            nested = _flatten_bullets(element)
+            if nested is None:
+                return None
+            items.extend(nested)
+        elif isinstance(element, str):
+            if element.strip():
+                items.append(element.strip())
+        elif isinstance(element, (int, float)) and not isinstance(element, bool):
+            items.append(str(element))
+        else:
+            return None
+    return items
+
+def repair_json_array(raw_response):
+    """
+    Deterministic, local repair of a reply that should have been a JSON array of strings.
+    Handles the usual model mistakes without another LLM call: text or code fences around
+    the array, missing '[' or ']', trailing or missing commas, smart quotes, unescaped quotes
+    inside a bullet point, raw newlines, invalid escapes and a final string cut off mid-way.
+    Nested arrays are flattened and number elements become strings (see _flatten_bullets).
+    Returns the list of strings, or None if the reply does not look like a list of strings
+    at all (e.g. a list of objects), in which case the fix prompt is still needed.
+    """
+    text = raw_response.translate(_SMART_QUOTES)
+    if '"' not in text and "'" in text:
+        # Python-style ['a', 'b']: only quotes next to brackets/commas are delimiters, the rest are apostrophes
+        text = re.sub(r"([\[,]\s*)'", r'\1"', text)
+        text = re.sub(r"'(\s*[,\]])", r'"\1', text)
+    start = text.find("[")
+
+    # Valid JSON around the array (e.g. nested arrays or numbers) only needs flattening
+    end = text.rfind("]")
+    if start != -1 and end > start:
+        try:
+            parsed = json.loads(text[start:end + 1])
+        except json.JSONDecodeError:
+            parsed = None
+        if isinstance(parsed, list):
+            return _flatten_bullets(parsed) or None
+
+    if start == -1:
+        start = text.find('"')
+        if start == -1:
+            return None
+    else:
+        start += 1
+
+    items = []
+    depth = 1  # Nesting of the arrays around position i
+    i = start
+    while i < len(text):
+        ch = text[i]
+        if ch == '"':
+            j = i + 1
+            escaped = False
+            while j < len(text):
+                if escaped:
+                    escaped = False
+                elif text[j] == "\\":
+                    escaped = True
+                elif text[j] == '"' and closes_string(text, j):
+                    break
+                j += 1
+            # j == len(text) means the final string was cut off; keep what we have
+            item = _decode_json_string(text[i + 1:j].rstrip("\\"))
+            if item:
+                items.append(item)
+            i = j + 1
+        elif ch == "[":
+            depth += 1
+            i += 1
+        elif ch == "]":
+            depth -= 1
+            if depth > 0:
+                i += 1
+                continue
+            next_start = text.find("[", i)
+            if items or next_start == -1:
+                break
+            # Brackets in text before the real array (e.g. "[Summary]:"); try the next '['
+            depth = 1
+            i = next_start + 1
+        elif ch in "{}":
+            return None
+        elif _JSON_NUMBER.match(text, i) and text[:i].rstrip()[-1:] in ("[", ","):
+            # A number element
+            number = _JSON_NUMBER.match(text, i).group(0)
+            items.append(number)
+            i += len(number)
+        else:
+            # Commas, whitespace and stray characters between elements are skipped
+            i += 1
+    return items if items else None
+
+def _prepend_part(first_part, stream):
+    """Yield an already fetched first stream part, then the rest; closing this also closes the stream."""
+    try:
+        yield first_part
+        yield from stream
+    finally:
+        stream.close()
 
 class OllamaAIChat:
     """
     AI component for sending raw text blocks to Ollama using the generate API
     and logging actionable tasks into an Excel sheet.
     """
-    def __init__(self, model=OLLAMA_MODEL, options=None):
+    def __init__(self, model=OLLAMA_MODEL, options=None, use_summary_cache=SUMMARY_CACHE_ENABLED):
         if options is None:
             options = OLLAMA_OPTIONS
         self.model = model
         self.options = options
+        # None until the first constrained request tells us whether the server supports JSON schemas
+        self.structured_output_supported = None if OLLAMA_STRUCTURED_OUTPUT else False
+        # Send the fixed summary instructions as the system prompt, separate from the transcript
+        self.instructions_as_system = OLLAMA_INSTRUCTIONS_AS_SYSTEM_PROMPT
+        # How each reply was turned into bullet points (exactly one path per reply)
+        self.output_path_counts = {"constrained": 0, "unconstrained": 0, "bracket_extraction": 0, "local_repair": 0, "fix_prompt": 0}
+        self._counts_lock = Lock()
+        # Held while queued blocks are being retried, so the drainer and shutdown never retry the same block twice
+        self._offline_drain_lock = Lock()
+        self.offline_queue = OfflineQueue()
+        # Summaries of blocks already seen; None bypasses the cache
+        self.summary_cache = SummaryCache() if use_summary_cache else None
         try:
             self.client = ollama.Client()
+            self.breaker = OllamaCircuitBreaker(self.client)
             log_and_print(f"OllamaAIChat initialized with model '{self.model}'.")
         except Exception as e:
             log_and_print(f"Failed to initialize Ollama client: {e}")
             raise e
 
-    def _build_prompt(self, raw_text):
+    def warm_up(self):
         """
-        Builds a prompt for Ollama based on the mode specified in the config.
-        
+        Loads the model into Ollama with a one-token generation of a normal prompt, so the
+        first real block runs at steady-state speed. The model then stays resident for
+        OLLAMA_KEEP_ALIVE after every request. Failures are logged only.
+        """
+        start = time.perf_counter()
+        try:
+            self.breaker.call(self.client.generate, prompt=self._build_prompt("Warm-up."), model=self.model,
+                              options={**self.options, "num_predict": 1}, keep_alive=OLLAMA_KEEP_ALIVE,
+                              **self._system_kwargs(self._summary_system_prompt()))
+            log_and_print(f"[OllamaAIChat] Warm-up of '{self.model}' finished in {time.perf_counter() - start:.2f}s.")
+        except Exception as e:
+            log_and_print(f"[OllamaAIChat] Warm-up of '{self.model}' failed after {time.perf_counter() - start:.2f}s: {e}")
+
+    def _summary_instructions(self):
+        """
+        The fixed instructions of the summary prompt, based on the mode specified in the config.
+
         - If OLLAMA_PROMPT_MODE is set to "restrictive", instructs Ollama to extract only the most critical details
         and return a concise JSON array of bullet points.
         - Otherwise, it uses the default summarization prompt to generate a comprehensive bullet-point summary.
+        Sent as the system prompt, they point to the user message for the text instead of the end of the prompt.
         """
+        where = "in the user message" if self.instructions_as_system else "at the end of this prompt"
         if OLLAMA_PROMPT_MODE.lower() == "restrictive":
-            prompt = (
-                "Your job is to analyze a block of text provided to you at the end of this prompt, extract the explicit details, and organize those details into bullet points.\n"
+            return (
+                f"Your job is to analyze a block of text provided to you {where}, extract the explicit details, and organize those details into bullet points.\n"
                 "Each bullet point should use the full context of the text to ensure clarity. For example, replace vague references like 'it' or 'they' with the actual subject or object they refer to.\n"
                 "Your job is NOT to not summarize with creative freedom.\n"
                 "Your job is NOT to break the provided block of text into individual words.\n"
@@ -56,28 +237,40 @@ class OllamaAIChat:
                 "- Exclude any additional commentary, explanations, or formatting outside the JSON array.\n"
                 "- Avoid backticks (`), code block formatting (e.g., ```json), or extra symbols.\n"
                 "- Only return a plain JSON array of strings, nothing else.\n\n"
-                f"Here is the text to analyze:\n\"\"\"{raw_text}\"\"\"\n\n"
-                "Now return a JSON array of bullet points:"
-            )
-        else:
-            prompt = (
-                "Your job is to analyze a block of text provided to you at the end of this prompt and transform it into a comprehensive bullet-point summary.\n"
-                "Your job is NOT to break the provided block of text into individual words.\n"
-                "Ensure every single detail in the provided block of text is captured and converted into a bullet point.\n\n"
-                "Each bullet point should:\n"
-                "- Be clear and concise, summarizing the text effectively while retaining all relevant details.\n"
-                "- Use the full context of the text to ensure clarity. For example, replace vague references like 'it' or 'they' with the actual subject or object they refer to.\n"
-                "- NOT be a duplicate of the previous bullet point\n\n"
-                "Your output should:\n"
-                "- Be organized into a JSON array, where each bullet point is a separate string. Example: [\"bullet point 1\", \"bullet point 2\", \"bullet point 3\"]\n"
-                "- Contain nothing but the JSON array of summarized bullet points.\n"
-                "- Exclude any additional commentary, explanations, or formatting outside the JSON array.\n"
-                "- Avoid backticks (`), code block formatting (e.g., ```json), or extra symbols.\n"
-                "- Only return a plain JSON array of strings, nothing else.\n\n"
-                f"Here is the text to analyze:\n\"\"\"{raw_text}\"\"\"\n\n"
-                "Now return a JSON array of bullet points:"
             )
-        return prompt
+        return (
+            f"Your job is to analyze a block of text provided to you {where} and transform it into a comprehensive bullet-point summary.\n"
+            "Your job is NOT to break the provided block of text into individual words.\n"
+            "Ensure every single detail in the provided block of text is captured and converted into a bullet point.\n\n"
+            "Each bullet point should:\n"
+            "- Be clear and concise, summarizing the text effectively while retaining all relevant details.\n"
+            "- Use the full context of the text to ensure clarity. For example, replace vague references like 'it' or 'they' with the actual subject or object they refer to.\n"
+            "- NOT be a duplicate of the previous bullet point\n\n"
+            "Your output should:\n"
+            "- Be organized into a JSON array, where each bullet point is a separate string. Example: [\"bullet point 1\", \"bullet point 2\", \"bullet point 3\"]\n"
+            "- Contain nothing but the JSON array of summarized bullet points.\n"
+            "- Exclude any additional commentary, explanations, or formatting outside the JSON array.\n"
+            "- Avoid backticks (`), code block formatting (e.g., ```json), or extra symbols.\n"
+            "- Only return a plain JSON array of strings, nothing else.\n\n"
+        )
+
+    def _summary_system_prompt(self):
+        """The system prompt to send with summary prompts: the fixed instructions, or None if they are part of the prompt."""
+        return self._summary_instructions() if self.instructions_as_system else None
+
+    def _build_prompt(self, raw_text):
+        """
+        Builds the summary prompt for one block of text.
+        With OLLAMA_INSTRUCTIONS_AS_SYSTEM_PROMPT the fixed instructions are left out, because
+        they are sent as the system prompt instead (see _summary_system_prompt).
+        """
+        prompt = (
+            f"Here is the text to analyze:\n\"\"\"{raw_text}\"\"\"\n\n"
+            "Now return a JSON array of bullet points:"
+        )
+        if self.instructions_as_system:
+            return prompt
+        return self._summary_instructions() + prompt
 
     def _build_fix_prompt(self, raw_response):
         """
@@ -95,6 +288,28 @@ class OllamaAIChat:
         )
         return prompt
 
+    def _build_reduce_prompt(self, bullet_points):
+        """
+        Prompt used to merge the bullet points produced for the overlapping sub-blocks
+        of one long block into a single de-duplicated list.
+        """
+        prompt = (
+            "Your job is to merge bullet points that were written for consecutive, slightly overlapping parts of the same text.\n"
+            "Because the parts overlapped, some bullet points repeat or describe the same thing in different words.\n\n"
+            "Your output should:\n"
+            "- Keep every distinct detail from the bullet points; do not drop information.\n"
+            "- Combine bullet points that describe the same thing into one, and remove duplicates.\n"
+            "- Keep the original order of topics.\n"
+            "- Be organized into a JSON array, where each bullet point is a separate string. Example: [\"bullet point 1\", \"bullet point 2\", \"bullet point 3\"]\n"
+            "- Contain nothing but the JSON array of merged bullet points.\n"
+            "- Exclude any additional commentary, explanations, or formatting outside the JSON array.\n"
+            "- Avoid backticks (`), code block formatting (e.g., ```json), or extra symbols.\n"
+            "- Only return a plain JSON array of strings, nothing else.\n\n"
+            f"Here are the bullet points to merge:\n\"\"\"{json.dumps(bullet_points, ensure_ascii=False)}\"\"\"\n\n"
+            "Now return the merged JSON array of bullet points:"
+        )
+        return prompt
+
     def _attempt_fix_prompt(self, raw_response):
         """
         Single helper function that re-feeds 'raw_response' to Ollama
@@ -102,9 +317,12 @@ class OllamaAIChat:
         If bracketed_fix is "[]", return None to signal a dead-end.
         """
         fix_prompt = self._build_fix_prompt(raw_response)
+        self._count_output_path("fix_prompt")
         try:
-            fix_data = self.client.generate(prompt=fix_prompt, model=self.model, options=self.options)
-            log_and_print(f"\n[OllamaAIChat] Second Attempt Fix Prompt Response:\n{fix_data}")
+            fix_data = self.breaker.call(self.client.generate, prompt=fix_prompt, model=self.model, options=self.options,
+                                         keep_alive=OLLAMA_KEEP_ALIVE)
+            record_ollama_response(fix_data)
+            log_and_print(f"\n[OllamaAIChat] Second Attempt Fix Prompt Response:\n{fix_data}", level=DEBUG)
             fixed_response = fix_data.get("response", "")
 
             # Attempt bracket extraction again
@@ -138,148 +356,323 @@ class OllamaAIChat:
 
     def _pulse_check_ollama(self):
         """
-        Sends a minimal prompt to check if the Ollama client is online.
-        Returns True if the client responds without error, False otherwise.
+        Checks if the Ollama server is online without running a generation: the circuit
+        breaker must allow requests and the (cached) liveness probe must succeed.
         """
+        return self.breaker.allow_request() and self.breaker.probe()
+
+    
+    def _store_offline_block(self, block_id, raw_text, error=None, source=None, published=0):
+        """
+        Adds a single block to the offline queue; the drainer retries it after a backoff delay.
+        'published' is how many of its bullet points the failed attempt already published.
+        """
+        self.offline_queue.put(block_id, raw_text, error=None if error is None else str(error), source=source,
+                               published=published)
+        log_and_print(f"[OllamaAIChat] Stored block {block_id} offline in {self.offline_queue.db_file}.")
+
+    def _summary_cache_key(self, raw_text):
+        """Cache key of a block: its text plus everything that changes what the summary of that text looks like."""
+        prompt_settings = {
+            "instructions": self._summary_instructions(),
+            "instructions_as_system": self.instructions_as_system,
+            "map_reduce": [OLLAMA_MAP_REDUCE_ENABLED, OLLAMA_MAP_REDUCE_THRESHOLD_TOKENS,
+                           OLLAMA_SUB_BLOCK_TOKENS, OLLAMA_SUB_BLOCK_OVERLAP_TOKENS],
+        }
+        return SummaryCache.make_key(raw_text, self.model, self.options, prompt_settings)
+
+    def _publish_cached_summary(self, raw_text, block_id, source=None, published=0):
+        """
+        Publishes the cached summary of an identical block, if there is one, skipping the first
+        'published' bullet points (already published by a failed attempt). Returns whether it did.
+        """
+        if self.summary_cache is None:
+            return False
         try:
-            test_prompt = "ping"
-            # Sending a minimal prompt; we don't need a complex response.
-            self.client.generate(prompt=test_prompt, model=self.model, options=self.options)
-            return True
+            tasks = self.summary_cache.get(self._summary_cache_key(raw_text))
         except Exception as e:
-            log_and_print(f"[OllamaAIChat] Pulse check failed: {e}")
+            log_and_print(f"[OllamaAIChat] Summary cache lookup failed: {e}")
+            return False
+        if tasks is None:
             return False
+        log_and_print(f"[OllamaAIChat] Block {block_id} was summarised before; publishing {len(tasks)} cached bullet points.")
+        if tasks[published:]:
+            self._log_tasks_to_excel(block_id, tasks[published:], source)
+        return True
+
+    def _retry_offline_entry(self, entry):
+        entry_id, block_id, raw_text, attempts, source, published = entry
+        log_and_print(f"[OllamaAIChat] Re-processing offline block {block_id} (attempt {attempts + 1}).")
+        log_and_print(f"[OllamaAIChat] Raw transcribed text of block {block_id}: {raw_text}", level=DEBUG)
+        progress = {"published": published}
+        try:
+            if not self._publish_cached_summary(raw_text, block_id, source, published):
+                self._process_block_internal(raw_text, block_id, source, progress)
+        except Exception as e:
+            self.offline_queue.reschedule(entry_id, attempts, e, progress["published"])
+            OLLAMA_BLOCKS.inc("retry_failed")
+            log_and_print(f"[OllamaAIChat] Block {block_id} still failing: {e}.")
+            return False
+        self.offline_queue.remove(entry_id)
+        OLLAMA_BLOCKS.inc("retried")
+        return True
 
-    
-    def _store_offline_block(self, block_id, raw_text):
+    def _try_offline_queue(self, limit=OFFLINE_DRAIN_BATCH_SIZE, ignore_schedule=False):
         """
-        Appends a single block to the offline queue file as a JSON line:
-          {"block_id": 123, "raw_text": "..."}
+        Retries up to 'limit' queued blocks whose retry time has come (all of them with
+        ignore_schedule, e.g. at shutdown), at most OFFLINE_DRAIN_MAX_CONCURRENCY at a time.
+        Succeeded blocks are removed from the queue, failing ones get a later retry time.
+        Returns how many blocks were attempted.
         """
-        obj = {"block_id": block_id, "raw_text": raw_text}
-        line = json.dumps(obj, ensure_ascii=False)
-        with open(OFFLINE_QUEUE_FILE, "a", encoding="utf-8") as f:
-            f.write(line + "\n")
-
-        log_and_print(f"[OllamaAIChat] Stored block {block_id} offline in {OFFLINE_QUEUE_FILE}.")
-    
-    def _try_offline_queue(self):
-        """
-        Attempts to load and process queued blocks from OFFLINE_QUEUE_FILE in order.
-        Instead of stopping at the first failure, it processes every line.
-        Successfully processed blocks are removed from the file, while any blocks
-        that still fail are written back to the file.
-        """
-        if (not os.path.exists(OFFLINE_QUEUE_FILE)) or (os.path.getsize(OFFLINE_QUEUE_FILE) == 0):
-            log_and_print("Offline queue is empty or offline queue file does not exist yet")
-            return  # No offline queue yet or it's empty
-        
-        # Pulse check to verify if Ollama is available
-        if not self._pulse_check_ollama():
-            log_and_print("[OllamaAIChat] Pulse check failed. Skipping offline queue processing.")
-            return
-        else:
-            log_and_print("[OllamaAIChat] Pulse check passed. Processing offline queue...")
+        with self._offline_drain_lock:
+            entries = self.offline_queue.due(limit, ignore_schedule=ignore_schedule)
+            if not entries:
+                return 0
 
-        # Read all lines once
-        with open(OFFLINE_QUEUE_FILE, "r", encoding="utf-8") as f:
-            lines = f.readlines()
+            # Pulse check to verify if Ollama is available
+            if not self._pulse_check_ollama():
+                log_and_print("[OllamaAIChat] Pulse check failed. Skipping offline queue processing.")
+                return 0
+            log_and_print(f"[OllamaAIChat] Pulse check passed. Retrying {len(entries)} queued blocks...")
 
-        still_failing = []
-        total_count = 0
-        success_count = 0
+            with ThreadPoolExecutor(max_workers=OFFLINE_DRAIN_MAX_CONCURRENCY) as executor:
+                success_count = sum(executor.map(self._retry_offline_entry, entries))
 
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-            total_count += 1
-            try:
-                obj = json.loads(line)
-                block_id = obj["block_id"]
-                raw_text = obj["raw_text"]
-            except (json.JSONDecodeError, KeyError):
-                # If the line is corrupted, skip it
-                continue
-
-            log_and_print(f"[OllamaAIChat] Re-processing offline block {block_id} from queue. Raw transcribed text: {raw_text}")
-            try:
-                self._process_block_internal(raw_text, block_id)
-                success_count += 1
-            except Exception as e:
-                log_and_print(f"[OllamaAIChat] Block {block_id} still failing: {e}.")
-                still_failing.append(line)
+            log_and_print(f"[OllamaAIChat] Retried {len(entries)} queued blocks. {success_count} succeeded, {len(entries) - success_count} remain failing.")
+            return len(entries)
 
-        # Re-write the offline queue file with all still failing blocks
-        with open(OFFLINE_QUEUE_FILE, "w", encoding="utf-8") as f:
-            for fail_line in still_failing:
-                f.write(fail_line + "\n")
-
-        if total_count > 0:
-            log_and_print(f"[OllamaAIChat] Retried {total_count} queued blocks. {success_count} succeeded, {total_count - success_count} remain failing.")
-    
-    def process_block(self, raw_text, block_id):
+    def process_block(self, raw_text, block_id, source=None):
         """
-        Public method. On each new block from the transcription worker:
-        1) Process any offline queue blocks.
-        2) Then process this new block. If that fails, store it offline.
+        Public method. Processes a new block from the transcription worker; 'source' is the
+        audio source it was transcribed from and is recorded with every summary row.
+        If that fails, the block is stored offline; the offline queue worker retries it later.
+        A block summarised before is published from the summary cache without calling Ollama.
+        While the circuit breaker is open the block goes straight to the offline queue.
+        Returns what happened to the block: "summarised", "cached" or "offline".
         """
-        # 1) First, process any offline queue blocks
-        self._try_offline_queue()
-
-        # 2) Now process THIS block
+        if self._publish_cached_summary(raw_text, block_id, source):
+            OLLAMA_BLOCKS.inc("cached")
+            return "cached"
+        if not self.breaker.allow_request():
+            log_and_print(f"[OllamaAIChat] Ollama is unavailable (circuit {self.breaker.state}). Storing block {block_id} offline.")
+            self._store_offline_block(block_id, raw_text, error="circuit open", source=source)
+            OLLAMA_BLOCKS.inc("offline")
+            return "offline"
+        progress = {"published": 0}
         try:
-            self._process_block_internal(raw_text, block_id)
+            self._process_block_internal(raw_text, block_id, source, progress)
+            OLLAMA_BLOCKS.inc("ok")
+            return "summarised"
         except Exception as e:
             log_and_print(f"[OllamaAIChat] Block {block_id} failed: {e}. Storing offline.")
-            self._store_offline_block(block_id, raw_text)
+            self._store_offline_block(block_id, raw_text, error=e, source=source, published=progress["published"])
+            OLLAMA_BLOCKS.inc("offline")
+            return "offline"
 
-    def _process_block_internal(self, raw_text, block_id):
+    def _process_block_internal(self, raw_text, block_id, source=None, progress=None):
         """
-        The actual logic that calls Ollama once for a given block
+        The actual logic that calls Ollama for a given block
         (extracted from your original 'process_block' method).
+        Long blocks go through map-reduce summarisation, everything else is a single call.
         If it fails, it raises an exception, which our caller can handle
         by storing offline or ignoring.
+
+        A bullet point is identified by (block_id, its index in the summary) and is published as
+        soon as it has streamed in. progress["published"] counts the indices already published,
+        by this attempt or by an earlier one that failed part-way; those are skipped, so a block
+        retried from the offline queue never publishes a row twice. The caller stores the count
+        with the block when this raises.
         """
         log_and_print(f"\n[OllamaAIChat] Processing block ID={block_id}, length={len(raw_text)} chars.")
+        if progress is None:
+            progress = {"published": 0}
+        next_index = 0
+
+        def _on_bullet(bullet):
+            nonlocal next_index
+            log_and_print(f"[OllamaAIChat] Block {block_id}: {bullet}")
+            if next_index >= progress["published"]:
+                publish_summary_rows(block_id, [bullet], source)
+                progress["published"] = next_index + 1
+            next_index += 1
+
+        if OLLAMA_MAP_REDUCE_ENABLED and estimate_tokens(raw_text) > OLLAMA_MAP_REDUCE_THRESHOLD_TOKENS:
+            # Not streamed: a failed reduce step is replaced by the sub-block bullet points as a whole
+            tasks = self._map_reduce_tasks(raw_text, block_id)
+        else:
+            tasks = self._generate_tasks(self._build_prompt(raw_text), on_bullet=_on_bullet,
+                                         system=self._summary_system_prompt())
+
+        # Whatever did not stream in (e.g. a reply that had to be repaired) is published now
+        if len(tasks) > progress["published"]:
+            self._log_tasks_to_excel(block_id, tasks[progress["published"]:], source)
+            progress["published"] = len(tasks)
+        if self.summary_cache is not None and tasks:
+            try:
+                self.summary_cache.put(self._summary_cache_key(raw_text), tasks)
+            except Exception as e:
+                log_and_print(f"[OllamaAIChat] Could not store block {block_id} in the summary cache: {e}")
+        log_and_print(f"[OllamaAIChat] Output paths so far: {self.output_path_counts}")
 
-        prompt = self._build_prompt(raw_text)
-        try:
-            response_data = self.client.generate(prompt=prompt, model=self.model, options=self.options)
+    def _count_output_path(self, path):
+        with self._counts_lock:
+            self.output_path_counts[path] += 1
+        OLLAMA_OUTPUT_PATHS.inc(path)
+
+    @staticmethod
+    def _system_kwargs(system):
+        # Only pass 'system' when set, so the model's own system prompt is kept otherwise
+        return {} if system is None else {"system": system}
 
-            #printing and logging filtered resonse without "context" object as it's lengthy and unused
+    def _generate(self, prompt, stream=False, system=None):
+        """
+        Calls client.generate through the circuit breaker, asking for schema-constrained output
+        while the server supports it. Returns (response, constrained). A server that rejects the
+        schema is remembered and the request is repeated without it. For streams the first part
+        is fetched here, because the rejection (or a connection error) only surfaces once the
+        stream is read.
+        """
+        def _request(**kwargs):
+            response = self.client.generate(prompt=prompt, model=self.model, options=self.options, stream=stream,
+                                            keep_alive=OLLAMA_KEEP_ALIVE, **self._system_kwargs(system), **kwargs)
+            if OLLAMA_STREAMING and stream:
+                response = _prepend_part(next(response), response)
+            return response
+
+        if self.structured_output_supported is not False:
             try:
-                # Convert response_data to a dictionary
-                response_dict = vars(response_data)
-                # Create a new dictionary without the "context" key
-                filtered_response_data = {k: v for k, v in response_dict.items() if k != "context"}
-                # Print the filtered response
-                log_and_print(f"\n[OllamaAIChat] Full Response from Ollama:\n{filtered_response_data}")
+                response = self.breaker.call(_request, format=BULLET_LIST_SCHEMA)
+                self.structured_output_supported = True
+                return response, True
+            except ollama.ResponseError as e:
+                if "format" not in str(e).lower():
+                    raise
+                self.structured_output_supported = False
+                log_and_print(f"[OllamaAIChat] Ollama server does not accept a JSON schema format ({e}). Using unconstrained output.")
+
+        response = self.breaker.call(_request)
+        return response, False
+
+    def _generate_tasks(self, prompt, on_bullet=None, system=None, stream=True):
+        """
+        Sends one prompt to Ollama and returns the bullet points parsed from the reply.
+        With OLLAMA_STREAMING (and 'stream'), on_bullet(bullet) is called for each bullet point
+        as soon as it has been generated.
+        Schema-constrained replies are parsed directly; anything else (or a constrained reply
+        that was cut short) goes through bracket extraction and, if needed, the fix prompt.
+        Raises if no valid JSON list of strings can be obtained.
+        """
+        if OLLAMA_STREAMING and stream:
+            return self._stream_tasks(prompt, on_bullet, system)
 
-            except Exception as e:
-                # If an error occurs, print the full response without filtering
-                log_and_print(f"\n[OllamaAIChat] Failed to filter response. Printing full response instead:\n{response_data}")
-                log_and_print(f"Error: {e}")
-
-            raw_response = response_data.get("response", "")
-            # The same bracket extraction + fix prompt logic as before...
-            match = re.search(r"\[.*\]", raw_response, flags=re.DOTALL)
-            if match:
-                bracketed_content = match.group(0)
-            else:
-                if '[' in raw_response and ']' not in raw_response:
-                    attempt = raw_response + "]"
-                    match2 = re.search(r"\[.*\]", attempt, flags=re.DOTALL)
-                    bracketed_content = match2.group(0) if match2 else "[]"
-                elif ']' in raw_response and '[' not in raw_response:
-                    attempt = "[" + raw_response
-                    match2 = re.search(r"\[.*\]", attempt, flags=re.DOTALL)
-                    bracketed_content = match2.group(0) if match2 else "[]"
-                else:
-                    bracketed_content = self._attempt_fix_prompt(raw_response)
-                    if bracketed_content is None:
-                        raise Exception("Fix prompt returned None (dead-end).")
+        response_data, constrained = self._generate(prompt, system=system)
+
+        #printing and logging filtered resonse without "context" object as it's lengthy and unused
+        try:
+            # Convert response_data to a dictionary
+            response_dict = vars(response_data)
+            # Create a new dictionary without the "context" key
+            filtered_response_data = {k: v for k, v in response_dict.items() if k != "context"}
+            # Print the filtered response
+            log_and_print(f"\n[OllamaAIChat] Full Response from Ollama:\n{filtered_response_data}", level=DEBUG)
+
+        except Exception as e:
+            # If an error occurs, print the full response without filtering
+            log_and_print(f"\n[OllamaAIChat] Failed to filter response. Printing full response instead:\n{response_data}", level=DEBUG)
+            log_and_print(f"Error: {e}")
+
+        record_ollama_response(response_data)
+        raw_response = response_data.get("response", "")
+        try:
+            tasks = json.loads(raw_response)
+        except json.JSONDecodeError:
+            tasks = None
+        if self._is_string_list(tasks):
+            self._count_output_path("constrained" if constrained else "unconstrained")
+            log_and_print(f"[OllamaAIChat] Parsed Tasks:\n{tasks}", level=DEBUG)
+            return tasks
+        return self._parse_tasks(raw_response)
+
+    def _stream_tasks(self, prompt, on_bullet=None, system=None):
+        """
+        Streaming variant of _generate_tasks. Each response piece is fed to an incremental
+        JSON array parser, so complete bullet points are available while the model is still
+        generating. Generation is stopped once the closing ']' arrives, or as soon as the reply
+        turns out to be malformed; the prompt is then sent again without streaming and that reply
+        goes through the usual bracket extraction / local repair / fix prompt path as a whole,
+        so a partial reply is never parsed. Bullet points already passed to on_bullet came from
+        the abandoned reply; the caller skips that many of the new reply's bullet points.
+        """
+        parser = JsonArrayStreamParser(max_preamble_chars=OLLAMA_STREAM_MAX_PREAMBLE_CHARS)
+        pieces = []
+        final_part = None
 
+        stream, constrained = self._generate(prompt, stream=True, system=system)
+        try:
+            for part in stream:
+                pieces.append(part.get("response", ""))
+                for bullet in parser.feed(pieces[-1]):
+                    if on_bullet is not None:
+                        on_bullet(bullet)
+                if part.get("done"):
+                    final_part = part
+                if parser.done or parser.malformed:
+                    break
+        except Exception as e:
+            # The connection can also drop halfway through the reply
+            self.breaker.record_failure(e)
+            raise
+        finally:
+            # Closing the stream early drops the connection, which makes Ollama stop generating
+            stream.close()
+
+        raw_response = "".join(pieces)
+        if final_part is not None:
+            record_ollama_response(final_part)
+            try:
+                stats = {k: v for k, v in vars(final_part).items() if k not in ("context", "response")}
+            except TypeError:
+                stats = final_part
+            log_and_print(f"\n[OllamaAIChat] Streamed Response from Ollama:\n{raw_response}\n{stats}", level=DEBUG)
+        else:
+            log_and_print(f"\n[OllamaAIChat] Streamed Response from Ollama (generation stopped early):\n{raw_response}", level=DEBUG)
+
+        if parser.done:
+            self._count_output_path("constrained" if constrained else "unconstrained")
+            log_and_print(f"[OllamaAIChat] Parsed Tasks:\n{parser.items}", level=DEBUG)
+            return parser.items
+        if parser.malformed:
+            log_and_print(f"[OllamaAIChat] Malformed reply detected mid-stream ({parser.malformed}); abandoned it and requesting it again without streaming.")
+            return self._generate_tasks(prompt, system=system, stream=False)
+        return self._parse_tasks(raw_response)
+
+    @staticmethod
+    def _is_string_list(obj):
+        return isinstance(obj, list) and all(isinstance(item, str) for item in obj)
+
+    def _parse_tasks(self, raw_response):
+        """
+        Extracts the JSON array of bullet points from a raw Ollama reply.
+        Uses bracket extraction first, then the local repair parser, and only
+        falls back to the fix prompt (a second LLM call) if both fail.
+        Returns the list of strings, or raises if even the fix prompt cannot produce one.
+        Only the path that produced the result is counted.
+        """
+        match = re.search(r"\[.*\]", raw_response, flags=re.DOTALL)
+        if match:
+            bracketed_content = match.group(0)
+        elif '[' in raw_response and ']' not in raw_response:
+            attempt = raw_response + "]"
+            match2 = re.search(r"\[.*\]", attempt, flags=re.DOTALL)
+            bracketed_content = match2.group(0) if match2 else "[]"
+        elif ']' in raw_response and '[' not in raw_response:
+            attempt = "[" + raw_response
+            match2 = re.search(r"\[.*\]", attempt, flags=re.DOTALL)
+            bracketed_content = match2.group(0) if match2 else "[]"
+        else:
+            bracketed_content = None
+
+        if bracketed_content is not None:
             # Clean up
             bracketed_content = " ".join(bracketed_content.splitlines())
             bracketed_content = re.sub(r'[\n\r\t]', '', bracketed_content)
@@ -287,99 +680,116 @@ class OllamaAIChat:
             # Attempt to parse
             try:
                 tasks = json.loads(bracketed_content.strip())
-                if isinstance(tasks, list) and all(isinstance(item, str) for item in tasks):
-                    log_and_print(f"[OllamaAIChat] Parsed Tasks:\n{tasks}")
-                    self._log_tasks_to_excel(block_id, tasks)
-                else:
-                    log_and_print("[OllamaAIChat] The response is not a valid JSON list of strings. Attempting to fix...")
-                    bracketed_fix = self._attempt_fix_prompt(raw_response)
-                    if bracketed_fix is None:
-                        raise Exception("Fix prompt returned None (structure fix).")
-
-                    try:
-                        tasks2 = json.loads(bracketed_fix.strip())
-                        if isinstance(tasks2, list) and all(isinstance(x, str) for x in tasks2):
-                            log_and_print(f"[OllamaAIChat] Parsed Fixed Tasks (structure fix):\n{tasks2}")
-                            self._log_tasks_to_excel(block_id, tasks2)
-                        else:
-                            raise Exception("Even after fix prompt, not a valid JSON list of strings (structure).")
-                    except json.JSONDecodeError:
-                        raise Exception("Fix prompt failed to parse JSON again (structure).")
-
             except json.JSONDecodeError:
-                log_and_print("[OllamaAIChat] Failed to parse Ollama's response as JSON. Attempting to fix...")
-                bracketed_fix = self._attempt_fix_prompt(raw_response)
-                if bracketed_fix is None:
-                    raise Exception("Fix prompt returned None (parse).")
-
-                try:
-                    tasks2 = json.loads(bracketed_fix.strip())
-                    if isinstance(tasks2, list) and all(isinstance(item, str) for item in tasks2):
-                        log_and_print(f"[OllamaAIChat] Parsed Fixed Tasks:\n{tasks2}")
-                        self._log_tasks_to_excel(block_id, tasks2)
-                    else:
-                        raise Exception("Even after fix prompt, not a valid JSON list of strings.")
-                except json.JSONDecodeError:
-                    raise Exception("Second attempt also failed to parse JSON.")
+                tasks = None
+            if self._is_string_list(tasks):
+                self._count_output_path("bracket_extraction")
+                log_and_print(f"[OllamaAIChat] Parsed Tasks:\n{tasks}", level=DEBUG)
+                return tasks
+
+        repaired = repair_json_array(raw_response)
+        if repaired is not None:
+            self._count_output_path("local_repair")
+            log_and_print(f"[OllamaAIChat] Parsed Tasks (local repair):\n{repaired}", level=DEBUG)
+            return repaired
+
+        log_and_print("[OllamaAIChat] The response is not a valid JSON list of strings and could not be repaired locally. Attempting to fix...")
+        return self._parse_fixed_tasks(raw_response)
+
+    def _parse_fixed_tasks(self, raw_response):
+        """Runs the fix prompt on 'raw_response' and parses its result, raising if it is still invalid."""
+        bracketed_fix = self._attempt_fix_prompt(raw_response)
+        if bracketed_fix is None:
+            raise Exception("Fix prompt returned None.")
 
-        except Exception as e:
-            # Raise so that calling code can handle it (by storing offline).
-            raise e
+        try:
+            tasks = json.loads(bracketed_fix.strip())
+        except json.JSONDecodeError:
+            raise Exception("Second attempt also failed to parse JSON.")
+
+        if not self._is_string_list(tasks):
+            raise Exception("Even after fix prompt, not a valid JSON list of strings.")
+        log_and_print(f"[OllamaAIChat] Parsed Fixed Tasks:\n{tasks}", level=DEBUG)
+        return tasks
 
-    def _log_tasks_to_excel(self, block_id, tasks):
+    def _split_into_sub_blocks(self, raw_text):
         """
-        Tasks have been renamed to Bullet point summary in the generated excel spreadsheet.
-        Originally this porgram was focuesd only on extracting tasks/objectives from speech.
-        Now it's programmed to summarizes everything into a bullet point style summary.
+        Splits a long block on word boundaries into sub-blocks of about OLLAMA_SUB_BLOCK_TOKENS,
+        each starting with the last OLLAMA_SUB_BLOCK_OVERLAP_TOKENS of the previous one.
+        """
+        words = raw_text.split()
+        size_chars = OLLAMA_SUB_BLOCK_TOKENS * CHARS_PER_TOKEN
+        overlap_chars = OLLAMA_SUB_BLOCK_OVERLAP_TOKENS * CHARS_PER_TOKEN
+
+        sub_blocks = []
+        start = 0
+        while start < len(words):
+            end = start
+            length = 0
+            while end < len(words) and (end == start or length + len(words[end]) + 1 <= size_chars):
+                length += len(words[end]) + 1
+                end += 1
+            sub_blocks.append(" ".join(words[start:end]))
+            if end >= len(words):
+                break
+
+            # Step back so the next sub-block repeats the tail of this one (always moving forward)
+            next_start = end
+            overlap = 0
+            while next_start > start + 1 and overlap + len(words[next_start - 1]) + 1 <= overlap_chars:
+                next_start -= 1
+                overlap += len(words[next_start]) + 1
+            start = next_start
+        return sub_blocks
+
+    @staticmethod
+    def _dedupe_bullets(bullet_points):
+        """Removes repeated bullet points (ignoring case, spacing and trailing punctuation), keeping order."""
+        seen = set()
+        unique = []
+        for bullet in bullet_points:
+            key = re.sub(r"\s+", " ", bullet).strip().rstrip(".!;:").lower()
+            if key and key not in seen:
+                seen.add(key)
+                unique.append(bullet)
+        return unique
+
+    def _map_reduce_tasks(self, raw_text, block_id):
+        """
+        Summarises a long block in two stages:
+        1) Map: overlapping sub-blocks are summarised concurrently (at most OLLAMA_MAX_PARALLEL_REQUESTS at once).
+        2) Reduce: the combined bullet points are merged and de-duplicated by a final prompt.
+        A failing sub-block fails the whole block (so it is stored offline). If only the reduce
+        step fails, the locally de-duplicated map output is used instead.
         """
-        global last_chosen_color
+        sub_blocks = self._split_into_sub_blocks(raw_text)
+        log_and_print(f"[OllamaAIChat] Block {block_id} is long; summarising {len(sub_blocks)} sub-blocks with up to {OLLAMA_MAX_PARALLEL_REQUESTS} parallel requests.")
 
-        excel_file = EXCEL_FILE
-        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with ThreadPoolExecutor(max_workers=OLLAMA_MAX_PARALLEL_REQUESTS) as executor:
+            prompts = [self._build_prompt(sub_block) for sub_block in sub_blocks]
+            system = self._summary_system_prompt()
+            mapped = list(executor.map(lambda prompt: self._generate_tasks(prompt, system=system), prompts))
 
-        try:
-            try:
-                workbook = openpyxl.load_workbook(excel_file)
-                sheet = workbook.active
-                log_and_print("[OllamaAIChat] Excel file loaded.")
-            except FileNotFoundError:
-                workbook = openpyxl.Workbook()
-                sheet = workbook.active
-                sheet.append(["Timestamp", "Block ID", "Bullet point summary"])
-                log_and_print("[OllamaAIChat] Excel file created.")
-
-            start_row = sheet.max_row + 1
-            for task in tasks:
-                sheet.append([now, block_id, task])
-
-            end_row = sheet.max_row
-            # Exclude last_chosen_color
-            available_colors = [c for c in EXCEL_COLOR_LIST if c != last_chosen_color]
-            chosen_color = random.choice(available_colors)
-            last_chosen_color = chosen_color
-
-            fill = PatternFill(start_color=chosen_color, end_color=chosen_color, fill_type="solid")
-            for row_idx in range(start_row, end_row + 1):
-                for col_idx in range(1, 4):
-                    sheet.cell(row=row_idx, column=col_idx).fill = fill
-
-            workbook.save(excel_file)
-            log_and_print(f"[OllamaAIChat] Logged {len(tasks)} tasks to Excel file '{excel_file}' with color {chosen_color}.")
-
-        except PermissionError:
-            """
-            This indicates the Excel file is open/locked. We can't save changes.
-            We'll append tasks to a fallback text file that remains the same 
-            throughout the program session, stored in FALLBACK_TEXT_FILE.
-            """
-            log_and_print(f"[OllamaAIChat] Excel file is locked. Falling back to '{FALLBACK_TEXT_FILE}'.")
-            try:
-                with open(FALLBACK_TEXT_FILE, "a", encoding="utf-8") as fallback:
-                    for task in tasks:
-                        fallback.write(f"{now}, {block_id}, {task}\n")
-                log_and_print(f"[OllamaAIChat] Logged {len(tasks)} tasks to fallback file '{FALLBACK_TEXT_FILE}' until Excel is closed.")
-            except Exception as e:
-                log_and_print(f"[OllamaAIChat] Error logging tasks to fallback text file: {e}")
+        combined = self._dedupe_bullets([bullet for bullets in mapped for bullet in bullets])
+        if len(sub_blocks) < 2:
+            return combined
 
+        try:
+            merged = self._generate_tasks(self._build_reduce_prompt(combined))
+            if not merged:
+                raise Exception("Reduce prompt returned no bullet points.")
+            log_and_print(f"[OllamaAIChat] Block {block_id}: reduced {len(combined)} sub-block bullet points to {len(merged)}.")
+            return self._dedupe_bullets(merged)
         except Exception as e:
-            log_and_print(f"[OllamaAIChat] Error logging tasks to Excel: {e}")
+            log_and_print(f"[OllamaAIChat] Reduce step failed for block {block_id}: {e}. Using de-duplicated sub-block bullet points.")
+            return combined
+
+    def _log_tasks_to_excel(self, block_id, tasks, source=None):
+        """
+        Tasks have been renamed to Bullet point summary in the generated excel spreadsheet.
+        Originally this porgram was focuesd only on extracting tasks/objectives from speech.
+        Now it's programmed to summarizes everything into a bullet point style summary.
+        The rows are handed to the sink writer thread, so this never waits on file I/O.
+        """
+        publish_summary_rows(block_id, tasks, source)
+        log_and_print(f"[OllamaAIChat] Published {len(tasks)} tasks from block {block_id} to the output sinks.")
@@ -0,0 +1,119 @@
+import time
+from threading import Lock
+
+import ollama
+
+from config import (
+    OLLAMA_HEALTH_PROBE_TTL,
+    OLLAMA_BREAKER_FAILURE_THRESHOLD,
+    OLLAMA_BREAKER_RESET_SECONDS,
+)
+from logging_utils import log_and_print
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+def _is_outage(error):
+    """Server errors and connection problems count against Ollama; a 4xx reply means it is up and answering."""
+    if isinstance(error, ollama.ResponseError):
+        return getattr(error, "status_code", -1) >= 500
+    return True
+
+class OllamaCircuitBreaker:
+    """
+    Circuit breaker around the Ollama client.
+
+    closed:    requests go through. OLLAMA_BREAKER_FAILURE_THRESHOLD failed requests in a row open the circuit.
+    open:      requests are refused straight away (the caller stores the block offline).
+               After OLLAMA_BREAKER_RESET_SECONDS a liveness probe decides whether to try again.
+    half-open: requests go through; the first success closes the circuit, a failure opens it again.
+
+    The liveness probe lists the local models (/api/tags) rather than running a generation,
+    and its result is cached for OLLAMA_HEALTH_PROBE_TTL seconds.
+    """
+    def __init__(self, client, probe_ttl=OLLAMA_HEALTH_PROBE_TTL,
+                 failure_threshold=OLLAMA_BREAKER_FAILURE_THRESHOLD, reset_seconds=OLLAMA_BREAKER_RESET_SECONDS):
+        self.client = client
+        self.probe_ttl = probe_ttl
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_result = None
+        self._probed_at = 0.0
+        self._lock = Lock()
+
+    def probe(self):
+        """Returns whether Ollama answered the liveness probe, using the cached answer while it is fresh."""
+        with self._lock:
+            if self._probe_result is not None and time.monotonic() - self._probed_at < self.probe_ttl:
+                return self._probe_result
+        try:
+            self.client.list()
+            alive = True
+        except Exception as e:
+            log_and_print(f"[OllamaHealth] Liveness probe failed: {e}")
+            alive = False
+        with self._lock:
+            self._probe_result = alive
+            self._probed_at = time.monotonic()
+            if not alive and self.state != OPEN:
+                self._trip("liveness probe failed")
+        return alive
+
+    def allow_request(self):
+        """Returns whether a request may be sent to Ollama now."""
+        with self._lock:
+            if self.state != OPEN:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_seconds:
+                return False
+        if not self.probe():
+            with self._lock:
+                self._opened_at = time.monotonic()
+            return False
+        with self._lock:
+            if self.state == OPEN:
+                self.state = HALF_OPEN
+                log_and_print("[OllamaHealth] Ollama is answering again; circuit half-open.")
+        return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            if self.state != CLOSED:
+                self.state = CLOSED
+                log_and_print("[OllamaHealth] Request succeeded; circuit closed.")
+            self._probe_result = True
+            self._probed_at = time.monotonic()
+
+    def record_failure(self, error):
+        if not _is_outage(error):
+            return
+        with self._lock:
+            self._failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self._failures >= self.failure_threshold):
+                self._trip(error)
+
+    def call(self, func, *args, **kwargs):
+        """Runs func (a client request) through the breaker and records its outcome."""
+        if not self.allow_request():
+            raise Exception("Ollama is unavailable (circuit open).")
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if _is_outage(e):
+                self.record_failure(e)
+            else:
+                self.record_success()
+            raise
+        self.record_success()
+        return result
+
+    def _trip(self, reason):
+        # Caller holds self._lock
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._probe_result = False
+        self._probed_at = time.monotonic()
+        log_and_print(f"[OllamaHealth] Circuit opened ({reason}); requests are refused for {self.reset_seconds}s.")
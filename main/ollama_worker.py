@@ -1,30 +1,47 @@
 import time
+from functools import partial
 from queue import Queue, Empty
-from logging_utils import log_and_print, shutdown_event
+from logging_utils import log_and_print, shutdown_event, DEBUG
+from config import OFFLINE_DRAIN_INTERVAL, OFFLINE_DRAIN_BATCH_SIZE
+from metrics import OLLAMA_QUEUE_DEPTH, OLLAMA_BLOCK_SECONDS
+from output_sinks import after_commit
+from pipeline_journal import journal_block_done
 
 ollama_queue = Queue()
+OLLAMA_QUEUE_DEPTH.set_function(ollama_queue.qsize)
 
 def ollama_worker(ai_chat):
     """
-    Worker thread that processes text blocks from ollama_queue using OllamaAIChat.
+    Worker thread that processes (source, text) blocks from ollama_queue using OllamaAIChat.
     If an error occurs for a block, store it offline so it's not lost.
+    A callable in the queue is called when its turn comes, i.e. once every block queued before it is done.
     """
     block_id_gen = int(time.time())
     while not shutdown_event.is_set() or not ollama_queue.empty():
         try:
-            text_block = ollama_queue.get(timeout=1)
-            if text_block is None:
+            item = ollama_queue.get(timeout=1)
+            if item is None:
                 continue
+            if callable(item):
+                try:
+                    item()
+                except Exception as e:
+                    log_and_print(f"Error in Ollama worker callback: {e}")
+                ollama_queue.task_done()
+                continue
+            source, text_block = item
 
-            log_and_print(
-                f"[Ollama Worker] Processing block ID={block_id_gen}, length={len(text_block)}, text={text_block}"
-            )
+            log_and_print(f"[Ollama Worker] Processing block ID={block_id_gen} from '{source}', length={len(text_block)}")
+            log_and_print(f"[Ollama Worker] Block {block_id_gen} text: {text_block}", level=DEBUG)
             
             # Attempt to process the block
             # If it fails, an exception is raised
-            ai_chat.process_block(text_block, block_id_gen)
+            start = time.perf_counter()
+            ai_chat.process_block(text_block, block_id_gen, source)
+            OLLAMA_BLOCK_SECONDS.observe(time.perf_counter() - start)
 
-            # If we reach this line, processing succeeded
+            # If we reach this line, processing succeeded; the journal keeps the block until its rows are committed
+            after_commit(partial(journal_block_done, source, text_block))
             ollama_queue.task_done()
             block_id_gen += 1
 
@@ -36,8 +53,9 @@ def ollama_worker(ai_chat):
             log_and_print(f"Error in Ollama worker for block {block_id_gen}: {e}")
             try:
                 # We'll assume you have a method like _store_offline_block(...) in OllamaAIChat
-                ai_chat._store_offline_block(block_id_gen, text_block)
+                ai_chat._store_offline_block(block_id_gen, text_block, source=source)
                 log_and_print(f"Block {block_id_gen} stored offline for later retry.")
+                journal_block_done(source, text_block)
             except Exception as store_err:
                 log_and_print(f"Failed to store block {block_id_gen} offline: {store_err}")
             
@@ -45,3 +63,18 @@ def ollama_worker(ai_chat):
             ollama_queue.task_done()
             # Move on to the next block
             block_id_gen += 1
+
+def offline_queue_worker(ai_chat):
+    """
+    Worker thread that retries blocks from the offline queue once their retry time has come,
+    independently of new blocks, so an outage never slows down the Ollama worker.
+    """
+    while not shutdown_event.is_set():
+        try:
+            attempted = ai_chat._try_offline_queue()
+        except Exception as e:
+            log_and_print(f"Error in offline queue worker: {e}")
+            attempted = 0
+        # A full batch means more blocks may already be due
+        if attempted < OFFLINE_DRAIN_BATCH_SIZE:
+            shutdown_event.wait(OFFLINE_DRAIN_INTERVAL)
@@ -0,0 +1,462 @@
+import csv
+import json
+import os
+import random
+import sqlite3
+import time
+from collections import OrderedDict
+from datetime import datetime
+from queue import Queue, Empty, Full
+
+import openpyxl
+from openpyxl.styles import PatternFill
+
+from config import (
+    EXCEL_FILE,
+    CSV_FILE,
+    JSONL_FILE,
+    SQLITE_FILE,
+    FALLBACK_TEXT_FILE,
+    EXCEL_COLOR_LIST,
+    EXCEL_ROTATION,
+    OUTPUT_SINKS,
+    SINK_COMMIT_INTERVAL,
+    SINK_QUEUE_MAXSIZE,
+)
+from logging_utils import log_and_print
+from metrics import SINK_QUEUE_DEPTH, SINK_ROWS, SINK_COMMIT_SECONDS, SINK_COMMIT_FAILURES
+
+# "Source" comes last so workbooks and CSV files from before multi-source capture keep their layout
+HEADER = ["Timestamp", "Block ID", "Bullet point summary", "Source"]
+
+# Summary rows are (timestamp, block_id, bullet_point, source) tuples waiting for the sink writer thread.
+# A callable is called once every row queued before it has been committed (see after_commit).
+# None tells the writer to commit everything and stop.
+sink_queue = Queue(maxsize=SINK_QUEUE_MAXSIZE)
+SINK_QUEUE_DEPTH.set_function(sink_queue.qsize)
+
+# Callables receiving every row as it is published, on the publishing thread (e.g. the ingest server's sessions)
+summary_listeners = []
+
+def after_commit(callback):
+    """
+    Have the sink writer thread call callback() once every row published so far has been
+    committed to the primary sink, e.g. to forget a block in the crash recovery journal.
+    """
+    sink_queue.put(callback)
+
+def publish_summary_rows(block_id, bullet_points, source=None):
+    """
+    Hand bullet points to the sink writer thread, tagged with the audio source of their block.
+    Only blocks (briefly) if the writer has fallen SINK_QUEUE_MAXSIZE rows behind; never does file I/O itself.
+    """
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for bullet in bullet_points:
+        row = (now, block_id, bullet, source or "")
+        for listener in summary_listeners:
+            listener(row)
+        try:
+            sink_queue.put_nowait(row)
+        except Full:
+            log_and_print("[Sinks] Sink queue is full; waiting for the writer thread to catch up.")
+            sink_queue.put(row)
+        SINK_ROWS.inc()
+
+class OutputSink:
+    """
+    Base class for summary destinations. write_rows() stages a batch of
+    (timestamp, block_id, bullet_point, source) rows, commit() makes everything staged
+    durable and raises if that is not possible (the rows stay staged).
+    """
+    name = "sink"
+
+    def write_rows(self, rows):
+        raise NotImplementedError
+
+    def commit(self):
+        pass
+
+    def close(self):
+        self.commit()
+
+class _Workbook:
+    """One output workbook kept open in memory, with the rows appended since its last save."""
+    def __init__(self, excel_file, color_for):
+        self.excel_file = excel_file
+        self._color_for = color_for
+        self.workbook = None
+        self._mtime = None
+        self.pending_rows = []
+        self._load()
+
+    def _load(self):
+        try:
+            self.workbook = openpyxl.load_workbook(self.excel_file)
+            log_and_print(f"[Sinks] Excel file '{self.excel_file}' loaded.")
+        except FileNotFoundError:
+            self.workbook = openpyxl.Workbook()
+            self.workbook.active.append(HEADER)
+            log_and_print(f"[Sinks] Excel file '{self.excel_file}' created.")
+        sheet = self.workbook.active
+        for col_idx, title in enumerate(HEADER, start=1):
+            if sheet.cell(row=1, column=col_idx).value is None:
+                sheet.cell(row=1, column=col_idx).value = title  # Workbooks from older versions lack newer columns
+        self._mtime = os.path.getmtime(self.excel_file) if os.path.exists(self.excel_file) else None
+
+    def _apply_rows(self, rows):
+        sheet = self.workbook.active
+        for row in rows:
+            sheet.append(list(row))
+            color = self._color_for(row[1])
+            fill = PatternFill(start_color=color, end_color=color, fill_type="solid")
+            for col_idx in range(1, len(HEADER) + 1):
+                sheet.cell(row=sheet.max_row, column=col_idx).fill = fill
+
+    def add_rows(self, rows):
+        self._apply_rows(rows)
+        self.pending_rows.extend(rows)
+
+    def save(self):
+        if not self.pending_rows:
+            return
+        disk_mtime = os.path.getmtime(self.excel_file) if os.path.exists(self.excel_file) else None
+        if disk_mtime != self._mtime:
+            log_and_print(f"[Sinks] '{self.excel_file}' changed on disk; reloading before saving.")
+            self._load()
+            self._apply_rows(self.pending_rows)
+
+        self.workbook.save(self.excel_file)
+        self._mtime = os.path.getmtime(self.excel_file)
+        log_and_print(f"[Sinks] Saved {len(self.pending_rows)} rows to '{self.excel_file}'.")
+        self.pending_rows = []
+
+class ExcelSink(OutputSink):
+    """
+    Keeps the output workbook open in memory for the whole session instead of
+    loading and saving it for every block. Each block's rows share a random fill
+    from EXCEL_COLOR_LIST; the workbook is only saved on commit().
+
+    If the file was changed on disk since our last save (e.g. edited in Excel),
+    it is reloaded before saving and the unsaved rows are re-applied, so user
+    edits are not overwritten. With daily rotation, a previous day's workbook
+    that could not be saved keeps its rows and is saved again on every commit
+    until that works; new rows go to the current day's workbook meanwhile.
+    """
+    name = "xlsx"
+
+    def __init__(self, excel_file=EXCEL_FILE, rotation=EXCEL_ROTATION):
+        self.base_file = excel_file
+        self.rotation = rotation.lower()
+        self.current = None                  # Workbook new rows are appended to
+        self._rotated = []                   # Earlier workbooks whose last rows are not saved yet
+        self._block_colors = OrderedDict()   # Recent block_id -> fill color
+        self._last_color = None
+
+    def _current_file(self):
+        if self.rotation == "daily":
+            root, ext = os.path.splitext(self.base_file)
+            return f"{root}_{datetime.now().strftime('%Y-%m-%d')}{ext}"
+        return self.base_file
+
+    def _color_for(self, block_id):
+        """Rows of one block share a color even if they arrive in several batches."""
+        if block_id not in self._block_colors:
+            # Exclude the last chosen color
+            available_colors = [c for c in EXCEL_COLOR_LIST if c != self._last_color]
+            self._last_color = random.choice(available_colors)
+            self._block_colors[block_id] = self._last_color
+            if len(self._block_colors) > 50:
+                self._block_colors.popitem(last=False)
+        return self._block_colors[block_id]
+
+    def write_rows(self, rows):
+        target_file = self._current_file()
+        if self.current is None or target_file != self.current.excel_file:
+            if self.current is not None and self.current.pending_rows:
+                # Rotation: the previous workbook is saved by the next commit (and kept until one succeeds)
+                self._rotated.append(self.current)
+            self.current = _Workbook(target_file, self._color_for)
+        self.current.add_rows(rows)
+
+    def commit(self):
+        """Saves every workbook with unsaved rows; raises after trying all of them if any save failed."""
+        error = None
+        for workbook in self._rotated + [self.current]:
+            if workbook is None:
+                continue
+            try:
+                workbook.save()
+            except Exception as e:
+                log_and_print(f"[Sinks] Could not save '{workbook.excel_file}': {e}")
+                error = e
+        self._rotated = [workbook for workbook in self._rotated if workbook.pending_rows]
+        if error is not None:
+            raise error
+
+class CsvSink(OutputSink):
+    """Appends rows to a CSV file (header written when the file is new)."""
+    name = "csv"
+
+    def __init__(self, csv_file=CSV_FILE):
+        self.csv_file = csv_file
+        self._pending_rows = []
+
+    def write_rows(self, rows):
+        self._pending_rows.extend(rows)
+
+    def commit(self):
+        if not self._pending_rows:
+            return
+        is_new = not os.path.exists(self.csv_file) or os.path.getsize(self.csv_file) == 0
+        with open(self.csv_file, "a", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            if is_new:
+                writer.writerow(HEADER)
+            writer.writerows(self._pending_rows)
+            f.flush()
+            os.fsync(f.fileno())
+        self._pending_rows = []
+
+class JsonlSink(OutputSink):
+    """Appends one JSON object per row to a JSON Lines file."""
+    name = "jsonl"
+
+    def __init__(self, jsonl_file=JSONL_FILE):
+        self.jsonl_file = jsonl_file
+        self._pending_rows = []
+
+    def write_rows(self, rows):
+        self._pending_rows.extend(rows)
+
+    def commit(self):
+        if not self._pending_rows:
+            return
+        with open(self.jsonl_file, "a", encoding="utf-8") as f:
+            for timestamp, block_id, bullet, source in self._pending_rows:
+                f.write(json.dumps({"timestamp": timestamp, "block_id": block_id, "bullet_point": bullet, "source": source},
+                                   ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._pending_rows = []
+
+class SqliteSink(OutputSink):
+    """Inserts rows into a 'summaries' table; one transaction per commit."""
+    name = "sqlite"
+
+    def __init__(self, sqlite_file=SQLITE_FILE):
+        self.sqlite_file = sqlite_file
+        # Only ever used from the sink writer thread
+        self.conn = sqlite3.connect(sqlite_file, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT, block_id TEXT, bullet_point TEXT, source TEXT)"
+        )
+        if "source" not in [row[1] for row in self.conn.execute("PRAGMA table_info(summaries)")]:
+            self.conn.execute("ALTER TABLE summaries ADD COLUMN source TEXT")
+        self.conn.commit()
+        self._pending_rows = []
+
+    def write_rows(self, rows):
+        self._pending_rows.extend(rows)
+
+    def commit(self):
+        if not self._pending_rows:
+            return
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO summaries (timestamp, block_id, bullet_point, source) VALUES (?, ?, ?, ?)",
+                [(timestamp, str(block_id), bullet, source) for timestamp, block_id, bullet, source in self._pending_rows]
+            )
+        self._pending_rows = []
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+SINK_TYPES = {
+    "xlsx": ExcelSink,
+    "csv": CsvSink,
+    "jsonl": JsonlSink,
+    "sqlite": SqliteSink,
+}
+
+def create_sinks(sink_names=OUTPUT_SINKS):
+    """Instantiate the configured sinks; the first one is the primary sink."""
+    sinks = []
+    for name in sink_names:
+        sink_class = SINK_TYPES.get(name.lower())
+        if sink_class is None:
+            log_and_print(f"[Sinks] Unknown output sink '{name}' ignored. Valid sinks: {', '.join(SINK_TYPES)}")
+            continue
+        sinks.append(sink_class())
+    if not sinks:
+        sinks.append(ExcelSink())
+    return sinks
+
+def _fallback_fields(row):
+    """
+    A row as the three fields of a fallback file line: timestamp, block ID (as "source/block_id"
+    for rows with a source, so lines from older versions still parse) and bullet point.
+    """
+    timestamp, block_id, bullet, source = row
+    return (timestamp, f"{source}/{block_id}" if source else str(block_id), bullet)
+
+class SinkWriter:
+    """
+    Consumes sink_queue on its own thread, stages rows in every sink as they arrive
+    and commits them in batches every SINK_COMMIT_INTERVAL seconds (and at shutdown).
+
+    While the primary sink cannot stage or commit (e.g. the workbook is open in Excel),
+    its unsaved rows are appended to FALLBACK_TEXT_FILE so they are visible somewhere.
+    Rows it could not stage are kept and staged again before every commit.
+    Once a commit succeeds again, the fallback file is reconciled: rows that are now
+    in the primary sink are dropped, rows left over from earlier sessions are written
+    to the primary sink, and the file is removed.
+    """
+    def __init__(self, sinks, commit_interval=SINK_COMMIT_INTERVAL):
+        self.sinks = sinks
+        self.primary = sinks[0]
+        self.commit_interval = commit_interval
+        self._uncommitted = []        # Primary sink rows staged since its last successful commit
+        self._unstaged = []           # Rows the primary sink failed to stage, in arrival order
+        self._fallback_keys = set()   # Rows this session wrote to the fallback file
+        self._after_commit = []       # after_commit callbacks waiting for the staged rows to be committed
+        self._last_commit = time.monotonic()
+
+    def run(self):
+        while True:
+            timeout = max(0.1, self.commit_interval - (time.monotonic() - self._last_commit))
+            stop = False
+            rows = []
+            try:
+                item = sink_queue.get(timeout=timeout)
+                while True:
+                    sink_queue.task_done()
+                    if item is None:
+                        stop = True
+                        break
+                    if callable(item):
+                        self._after_commit.append(item)
+                    else:
+                        rows.append(item)
+                    item = sink_queue.get_nowait()
+            except Empty:
+                pass
+
+            if rows:
+                self._stage(rows)
+            if stop or time.monotonic() - self._last_commit >= self.commit_interval:
+                self._commit_all()
+            if stop:
+                for sink in self.sinks:
+                    try:
+                        sink.close()
+                    except Exception as e:
+                        log_and_print(f"[Sinks] Error closing {sink.name} sink: {e}")
+                return
+
+    def _stage(self, rows):
+        for sink in self.sinks[1:]:
+            try:
+                sink.write_rows(rows)
+            except Exception as e:
+                log_and_print(f"[Sinks] Error staging {len(rows)} rows in {sink.name} sink: {e}")
+        self._stage_primary(rows)
+
+    def _stage_primary(self, rows):
+        """Stages rows (after any earlier ones that failed) in the primary sink; they count as uncommitted only once staged."""
+        rows = self._unstaged + rows
+        if not rows:
+            return
+        try:
+            self.primary.write_rows(rows)
+        except Exception as e:
+            self._unstaged = rows
+            log_and_print(f"[Sinks] Error staging {len(rows)} rows in {self.primary.name} sink, will retry: {e}")
+            return
+        self._unstaged = []
+        self._uncommitted.extend(rows)
+
+    def _timed_commit(self, sink):
+        start = time.perf_counter()
+        try:
+            sink.commit()
+        except Exception:
+            SINK_COMMIT_FAILURES.inc(sink.name)
+            raise
+        SINK_COMMIT_SECONDS.observe(time.perf_counter() - start, sink.name)
+
+    def _commit_all(self):
+        self._last_commit = time.monotonic()
+        for sink in self.sinks[1:]:
+            try:
+                self._timed_commit(sink)
+            except Exception as e:
+                log_and_print(f"[Sinks] Could not commit {sink.name} sink, will retry: {e}")
+
+        self._stage_primary([])
+        try:
+            self._timed_commit(self.primary)
+            if self._unstaged:
+                raise Exception(f"{len(self._unstaged)} rows could not be staged")
+        except Exception as e:
+            log_and_print(f"[Sinks] Could not commit {self.primary.name} sink ({e}). Falling back to '{FALLBACK_TEXT_FILE}'.")
+            self._write_fallback()
+            return
+
+        self._uncommitted = []
+        self._reconcile_fallback()
+
+        callbacks, self._after_commit = self._after_commit, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                log_and_print(f"[Sinks] Error in after-commit callback: {e}")
+
+    def _write_fallback(self):
+        new_rows = [row for row in self._uncommitted + self._unstaged if _fallback_fields(row) not in self._fallback_keys]
+        if not new_rows:
+            return
+        try:
+            with open(FALLBACK_TEXT_FILE, "a", encoding="utf-8") as fallback:
+                for row in new_rows:
+                    fields = _fallback_fields(row)
+                    fallback.write(", ".join(fields) + "\n")
+                    self._fallback_keys.add(fields)
+            log_and_print(f"[Sinks] Logged {len(new_rows)} rows to fallback file '{FALLBACK_TEXT_FILE}' until the {self.primary.name} sink is available.")
+        except Exception as e:
+            log_and_print(f"[Sinks] Error logging rows to fallback text file: {e}")
+
+    def _reconcile_fallback(self):
+        if not os.path.exists(FALLBACK_TEXT_FILE):
+            return
+        try:
+            with open(FALLBACK_TEXT_FILE, "r", encoding="utf-8") as f:
+                lines = [line.rstrip("\n") for line in f if line.strip()]
+
+            missing = []
+            for line in lines:
+                parts = line.split(", ", 2)
+                if len(parts) != 3:
+                    continue
+                if tuple(parts) in self._fallback_keys:
+                    continue  # Already committed with this session's rows
+                timestamp, block_field, bullet = parts
+                source, _, block_id = block_field.rpartition("/")
+                missing.append((timestamp, int(block_id) if block_id.isdigit() else block_id, bullet, source))
+
+            if missing:
+                self.primary.write_rows(missing)
+                # They are already in the fallback file, so they must never be written there again
+                self._fallback_keys.update(_fallback_fields(row) for row in missing)
+                self.primary.commit()
+            os.remove(FALLBACK_TEXT_FILE)
+            self._fallback_keys.clear()
+            log_and_print(f"[Sinks] Reconciled fallback file into the {self.primary.name} sink ({len(missing)} rows from earlier sessions).")
+        except Exception as e:
+            log_and_print(f"[Sinks] Could not reconcile fallback file yet: {e}")
+
+def sink_worker(sink_writer):
+    """Thread target running the sink writer until it receives the stop marker."""
+    sink_writer.run()
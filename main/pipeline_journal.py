@@ -0,0 +1,320 @@
+import itertools
+import json
+import os
+import time
+from collections import defaultdict
+from queue import Queue, Empty
+from threading import Thread, local
+
+import numpy as np
+
+from config import (
+    JOURNAL_FILE,
+    JOURNAL_AUDIO_DIR,
+    JOURNAL_FLUSH_INTERVAL,
+    JOURNAL_AUDIO_DELAY,
+    JOURNAL_COMPACT_BYTES,
+)
+from logging_utils import log_and_print, WARNING
+
+# The open journal (main.py only); while it is None every journal_* call does nothing
+_journal = None
+# Records a thread makes between journal_batch_begin() and journal_batch_done(), written with the batch
+_batch = local()
+
+def _fsync_dir(path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return  # Directories cannot be opened (or fsync'ed) on Windows
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+class JournalState:
+    """
+    The live pipeline state described by a journal: captured chunks not transcribed yet,
+    the transcript segments of each source's unfinished block, and blocks not summarised yet.
+    """
+    def __init__(self):
+        self.chunks = {}                    # chunk id -> chunk record
+        self.segments = defaultdict(list)   # source -> segments of the block being built
+        self.blocks = []                    # (source, text) waiting for Ollama, in order
+        self.last_chunk_id = 0
+
+    def apply(self, record):
+        op = record["op"]
+        if op == "chunk":
+            self.chunks[record["id"]] = record
+            self.last_chunk_id = max(self.last_chunk_id, record["id"])
+        elif op == "chunk_done":
+            self.chunks.pop(record["id"], None)
+        elif op == "batch_done":
+            # What accumulating the batch added, and the end of its chunks, in one record
+            for inner in record["records"]:
+                self.apply(inner)
+            for chunk_id in record["ids"]:
+                self.chunks.pop(chunk_id, None)
+        elif op == "segment":
+            self.segments[record["source"]].append(record["text"])
+        elif op == "block":
+            # A block is everything the source accumulated since its previous block
+            self.segments.pop(record["source"], None)
+            self.blocks.append((record["source"], record["text"]))
+        elif op == "block_done":
+            block = (record["source"], record["text"])
+            if block in self.blocks:
+                self.blocks.remove(block)
+
+    def records(self):
+        """The state as a minimal list of records (what a compacted journal contains)."""
+        records = [self.chunks[chunk_id] for chunk_id in sorted(self.chunks)]
+        # Blocks before segments: replaying a block drops its source's segments
+        records.extend({"op": "block", "source": source, "text": text} for source, text in self.blocks)
+        for source, segments in self.segments.items():
+            records.extend({"op": "segment", "source": source, "text": text} for text in segments)
+        return records
+
+class PipelineJournal:
+    """
+    Write-ahead journal of the pipeline, so a crash or power loss does not lose the audio
+    waiting for Whisper, the transcript of the block being built or blocks waiting for Ollama.
+
+    The workers only hand records to a queue; a writer thread appends them to a JSON-lines
+    file and fsyncs once per JOURNAL_FLUSH_INTERVAL, so the hot path never waits on the disk.
+    A captured chunk is held back for JOURNAL_AUDIO_DELAY: one transcribed by then is never
+    written at all, so audio only reaches the disk while transcription is falling behind.
+    The audio of the chunks written in one batch goes into a single .npz file in JOURNAL_AUDIO_DIR,
+    also with one fsync, which is removed once all of them are transcribed (temp WAV files of "file"
+    capture mode are referenced as they are). Once the journal passes JOURNAL_COMPACT_BYTES it is
+    rewritten with only the live state.
+    """
+    def __init__(self, journal_file=JOURNAL_FILE, audio_dir=JOURNAL_AUDIO_DIR,
+                 flush_interval=JOURNAL_FLUSH_INTERVAL, compact_bytes=JOURNAL_COMPACT_BYTES,
+                 audio_delay=JOURNAL_AUDIO_DELAY):
+        self.journal_file = journal_file
+        self.audio_dir = audio_dir
+        self.flush_interval = flush_interval
+        self.compact_bytes = compact_bytes
+        self.audio_delay = audio_delay
+        self._held = {}  # chunk id -> (due time, chunk record) of chunks not written yet
+        os.makedirs(audio_dir, exist_ok=True)
+        self.state = self._read()
+        self._chunk_ids = itertools.count(self.state.last_chunk_id + 1)
+        self._compact()
+        self._remove_orphaned_audio()
+        self._file = open(journal_file, "a", encoding="utf-8")
+        self._queue = Queue()
+        self._writer = Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def _read(self):
+        """Replay the journal file into a JournalState. A torn last line (crash mid-write) is ignored."""
+        state = JournalState()
+        if not os.path.exists(self.journal_file):
+            return state
+        with open(self.journal_file, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    state.apply(json.loads(line))
+                except (json.JSONDecodeError, KeyError):
+                    continue
+        for chunk_id, record in list(state.chunks.items()):
+            if not os.path.exists(record["path"]):
+                log_and_print(f"[Journal] Audio of journaled chunk {chunk_id} is missing; it cannot be recovered.", level=WARNING)
+                del state.chunks[chunk_id]
+        return state
+
+    def _compact(self):
+        """Atomically replace the journal file with the live state."""
+        tmp_file = self.journal_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            for record in self.state.records():
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.journal_file)
+        _fsync_dir(os.path.dirname(os.path.abspath(self.journal_file)))
+
+    def _remove_orphaned_audio(self):
+        live = {os.path.abspath(record["path"]) for record in self.state.chunks.values()}
+        for name in os.listdir(self.audio_dir):
+            path = os.path.abspath(os.path.join(self.audio_dir, name))
+            if name.endswith(".npz") and path not in live:
+                os.remove(path)
+
+    def record(self, record):
+        """Queue a record for the writer thread (never blocks)."""
+        self._queue.put(record)
+
+    def next_chunk_id(self):
+        return next(self._chunk_ids)  # Atomic, so several capture threads can ask at once
+
+    def _write_loop(self):
+        while True:
+            try:
+                # Held chunks are written once they are due, even if nothing else is recorded
+                batch = [self._queue.get(timeout=self.flush_interval if self._held else None)]
+            except Empty:
+                batch = []
+            # Collect everything recorded during the flush interval into one write and one fsync
+            deadline = time.monotonic() + self.flush_interval
+            while batch and batch[-1] is not None:
+                try:
+                    batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                except Empty:
+                    break
+            stop = None in batch
+            try:
+                self._write_batch([record for record in batch if record is not None], write_held=stop)
+            except Exception as e:
+                log_and_print(f"[Journal] Could not write the pipeline journal: {e}", level=WARNING)
+            for _ in batch:
+                self._queue.task_done()
+            if stop:
+                return
+
+    def _write_batch(self, batch, write_held=False):
+        now = time.monotonic()
+        records = []
+        for record in batch:
+            if record["op"] == "chunk" and "audio" in record:
+                self._held[record["id"]] = (now + self.audio_delay, record)
+                continue
+            done_ids = [record["id"]] if record["op"] == "chunk_done" else record.get("ids", [])
+            for chunk_id in done_ids:
+                self._held.pop(chunk_id, None)  # Transcribed (or dropped) before its audio was written
+            records.append(record)
+        due = [chunk_id for chunk_id, (due_time, _) in self._held.items() if write_held or due_time <= now]
+        batch = [self._held.pop(chunk_id)[1] for chunk_id in sorted(due)] + records
+        if not batch:
+            return
+
+        # The audio of every due chunk goes into one file, saved (and synced) before the records referring to it
+        new_audio = {}
+        for record in batch:
+            if record["op"] == "chunk" and "audio" in record:
+                record["key"] = f"chunk_{record['id']}"
+                new_audio[record["key"]] = record.pop("audio")
+        if new_audio:
+            path = os.path.join(self.audio_dir, f"{next(iter(new_audio))}.npz")
+            with open(path, "wb") as f:
+                np.savez(f, **new_audio)
+                f.flush()
+                os.fsync(f.fileno())
+            for record in batch:
+                if record.get("key") in new_audio:
+                    record["path"] = path
+
+        done_audio = set()
+        for record in batch:
+            done_ids = [record["id"]] if record["op"] == "chunk_done" else record.get("ids", [])
+            for chunk_id in done_ids:
+                chunk = self.state.chunks.get(chunk_id)
+                if chunk is not None and chunk.get("owned"):
+                    done_audio.add(chunk["path"])
+            self.state.apply(record)
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+        # Only now that chunk_done is durable may an audio file go, once none of its chunks is left
+        live = {chunk["path"] for chunk in self.state.chunks.values()}
+        for path in done_audio - live:
+            if os.path.exists(path):
+                os.remove(path)
+        if self._file.tell() > self.compact_bytes:
+            self._file.close()
+            self._compact()
+            self._file = open(self.journal_file, "a", encoding="utf-8")
+
+    def close(self):
+        """Write everything still queued and compact the journal (empty after a clean shutdown)."""
+        self._queue.put(None)
+        self._writer.join(timeout=30)
+        self._file.close()
+        self._compact()
+
+def open_journal():
+    """Open (and replay) the journal; the journal_* hooks record into it from now on."""
+    global _journal
+    _journal = PipelineJournal()
+    state = _journal.state
+    if state.chunks or state.segments or state.blocks:
+        log_and_print(f"[Journal] Recovering {len(state.chunks)} audio chunks, {sum(map(len, state.segments.values()))} transcript "
+                      f"segments and {len(state.blocks)} blocks from the previous session.")
+    return _journal
+
+def load_chunk_audio(record):
+    """The audio of a journaled chunk: its array, or the temp WAV path in "file" capture mode."""
+    if not record.get("owned"):
+        return record["path"]
+    with np.load(record["path"]) as audio:
+        return audio[record["key"]]
+
+def close_journal():
+    global _journal
+    if _journal is not None:
+        _journal.close()
+        _journal = None
+
+def journal_chunk(chunk):
+    """A captured chunk was queued for transcription."""
+    if _journal is None:
+        return
+    chunk.journal_id = _journal.next_chunk_id()
+    record = {"op": "chunk", "id": chunk.journal_id, "source": chunk.source, "start_time": chunk.start_time,
+              "duration": chunk.duration, "overlap": chunk.overlap}
+    if isinstance(chunk.audio, str):
+        record["path"] = chunk.audio  # "file" capture mode: the temp WAV file stays until it is transcribed
+    else:
+        record.update(owned=True, audio=chunk.audio)  # Saved by the writer thread with the rest of its batch
+    _journal.record(record)
+
+def journal_chunk_done(chunk):
+    """A chunk was dropped without being transcribed."""
+    if _journal is not None and chunk.journal_id is not None:
+        _journal.record({"op": "chunk_done", "id": chunk.journal_id})
+
+def journal_batch_begin():
+    """
+    The calling thread starts accumulating a batch of transcribed chunks: the segment and block
+    records it makes are held back and written together with the end of the batch's chunks by
+    journal_batch_done. A journal line is replayed whole or not at all, so after a crash either
+    the chunks are transcribed again or their text is recovered, never both.
+    """
+    if _journal is not None:
+        _batch.records = []
+
+def journal_batch_done(chunks):
+    """The batch's chunks have been accumulated."""
+    records = getattr(_batch, "records", None) or []
+    _batch.records = None
+    if _journal is not None:
+        ids = [chunk.journal_id for chunk in chunks if chunk.journal_id is not None]
+        _journal.record({"op": "batch_done", "ids": ids, "records": records})
+
+def _record(record):
+    records = getattr(_batch, "records", None)
+    if records is not None:
+        records.append(record)
+    else:
+        _journal.record(record)
+
+def journal_segment(source, text):
+    """A transcript segment was added to a source's unfinished block."""
+    if _journal is not None:
+        _record({"op": "segment", "source": source, "text": text})
+
+def journal_block(source, text):
+    """A source's block was queued for Ollama."""
+    if _journal is not None:
+        _record({"op": "block", "source": source, "text": text})
+
+def journal_block_done(source, text):
+    """A block was summarised (or stored in the offline queue, which is durable itself)."""
+    if _journal is not None:
+        _journal.record({"op": "block_done", "source": source, "text": text})
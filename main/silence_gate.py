@@ -0,0 +1,80 @@
+import numpy as np
+import soundfile as sf
+
+from config import (
+    SAMPLERATE,
+    SILENCE_GATE_OPEN_DBFS,
+    SILENCE_GATE_CLOSE_DBFS,
+    SILENCE_GATE_FRAME_MS,
+    SILENCE_GATE_MIN_ACTIVE_FRAMES,
+)
+from logging_utils import log_and_print
+
+class SilenceGate:
+    """
+    Energy-based gate run in front of Whisper so that obviously silent chunks
+    never reach the model.
+
+    Each chunk is split into short frames and the RMS level of every frame is
+    measured in dBFS. A chunk passes if enough frames are above the threshold.
+    The threshold depends on the previous decision (hysteresis): after a silent
+    chunk the louder SILENCE_GATE_OPEN_DBFS level is required, after a speech
+    chunk the quieter SILENCE_GATE_CLOSE_DBFS level is enough, so soft trailing
+    speech is not cut off.
+    """
+    def __init__(self, open_dbfs=SILENCE_GATE_OPEN_DBFS, close_dbfs=SILENCE_GATE_CLOSE_DBFS,
+                 frame_ms=SILENCE_GATE_FRAME_MS, min_active_frames=SILENCE_GATE_MIN_ACTIVE_FRAMES,
+                 samplerate=SAMPLERATE):
+        self.open_dbfs = open_dbfs
+        self.close_dbfs = close_dbfs
+        self.frame_len = max(1, int(samplerate * frame_ms / 1000))
+        self.min_active_frames = min_active_frames
+        self.is_open = False
+        self.passed_count = 0
+        self.skipped_count = 0
+
+    def _load(self, audio_chunk):
+        """Return the chunk as a 1-D float32 array; file-mode chunks are read from disk."""
+        if isinstance(audio_chunk, str):
+            audio, _ = sf.read(audio_chunk, dtype="float32")
+        else:
+            audio = np.asarray(audio_chunk, dtype=np.float32)
+        if audio.ndim > 1:
+            audio = audio.mean(axis=1)
+        return audio
+
+    def frame_levels(self, audio):
+        """RMS level of each full frame in dBFS."""
+        n_frames = len(audio) // self.frame_len
+        if n_frames == 0:
+            return np.empty(0, dtype=np.float32)
+        frames = audio[:n_frames * self.frame_len].reshape(n_frames, self.frame_len)
+        rms = np.sqrt(np.mean(np.square(frames), axis=1))
+        return 20.0 * np.log10(rms + 1e-10)
+
+    def check(self, audio_chunk):
+        """
+        Returns True if the chunk may contain speech and should be transcribed,
+        False if it is silent and can be skipped. Updates the gate state.
+        """
+        try:
+            levels = self.frame_levels(self._load(audio_chunk))
+        except Exception as e:
+            log_and_print(f"[Silence Gate] Could not measure chunk level, passing it to Whisper: {e}")
+            self.passed_count += 1
+            return True
+
+        threshold = self.close_dbfs if self.is_open else self.open_dbfs
+        active_frames = int(np.count_nonzero(levels >= threshold))
+        self.is_open = active_frames >= self.min_active_frames
+
+        if self.is_open:
+            self.passed_count += 1
+        else:
+            self.skipped_count += 1
+            peak = float(levels.max()) if levels.size else float("-inf")
+            log_and_print(
+                f"[Silence Gate] Skipped silent chunk (peak {peak:.1f} dBFS, {active_frames} active frames). "
+                f"Skipped {self.skipped_count} of {self.skipped_count + self.passed_count} chunks so far."
+            )
+        return self.is_open
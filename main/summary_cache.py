@@ -0,0 +1,99 @@
+import hashlib
+import json
+import sqlite3
+import time
+from threading import Lock
+
+from config import (
+    SUMMARY_CACHE_DB,
+    SUMMARY_CACHE_MAX_ENTRIES,
+    SUMMARY_CACHE_MAX_AGE_DAYS,
+)
+from logging_utils import log_and_print
+from metrics import SUMMARY_CACHE_LOOKUPS
+
+class SummaryCache:
+    """
+    Persistent cache of parsed bullet point lists in SQLite (WAL mode), so a block that is
+    summarised again (offline retries, replays after a crash, bulk re-ingests) never goes
+    back to Ollama. Entries are keyed by make_key(); the least recently used ones beyond
+    SUMMARY_CACHE_MAX_ENTRIES and those older than SUMMARY_CACHE_MAX_AGE_DAYS are evicted.
+    """
+    EVICT_EVERY = 100  # Inserts between eviction passes
+
+    def __init__(self, db_file=SUMMARY_CACHE_DB, max_entries=SUMMARY_CACHE_MAX_ENTRIES,
+                 max_age_seconds=SUMMARY_CACHE_MAX_AGE_DAYS * 86400):
+        self.db_file = db_file
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._lock = Lock()
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS summaries ("
+                "key TEXT PRIMARY KEY, bullets TEXT NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS summaries_last_used ON summaries (last_used)")
+        self.evict()
+
+    @staticmethod
+    def make_key(raw_text, model, options, prompt_settings):
+        """
+        SHA-256 of the block text with whitespace normalised, plus everything else that shapes
+        the summary: the model, its options and the prompt settings (instructions, modes).
+        """
+        normalised = " ".join(raw_text.split())
+        material = json.dumps([normalised, model, options, prompt_settings], sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """The cached bullet points for key, or None."""
+        with self._lock, self.conn:
+            row = self.conn.execute("SELECT bullets FROM summaries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                SUMMARY_CACHE_LOOKUPS.inc("miss")
+                return None
+            self.conn.execute("UPDATE summaries SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+        SUMMARY_CACHE_LOOKUPS.inc("hit")
+        return json.loads(row[0])
+
+    def put(self, key, bullet_points):
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO summaries (key, bullets, created, last_used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(bullet_points, ensure_ascii=False), now, now)
+            )
+            self._puts += 1
+            evict = self._puts % self.EVICT_EVERY == 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """Drop entries past the age limit, then the least recently used ones beyond max_entries."""
+        with self._lock, self.conn:
+            removed = 0
+            if self.max_age_seconds > 0:
+                removed += self.conn.execute("DELETE FROM summaries WHERE created < ?",
+                                             (time.time() - self.max_age_seconds,)).rowcount
+            removed += self.conn.execute(
+                "DELETE FROM summaries WHERE key IN (SELECT key FROM summaries ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (max(self.max_entries, 0),)
+            ).rowcount
+        if removed:
+            log_and_print(f"[SummaryCache] Evicted {removed} cached summaries.")
+
+    def __len__(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,56 @@
+import os
+import sys
+
+# The modules in main/ import each other by their flat names
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import ollama_ai_chat
+from offline_queue import OfflineQueue
+from ollama_health import OllamaCircuitBreaker
+
+class FakeOllamaClient:
+    """
+    Stands in for ollama.Client. Every generate call takes the next scripted reply: the reply
+    text, or a list of the pieces a stream delivers. A ConnectionError in that list is raised
+    when the stream reaches it, like a connection dropped halfway through the reply.
+    """
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.prompts = []
+        self.streams_read_to_end = 0
+
+    def list(self):
+        return {"models": []}
+
+    def generate(self, prompt, model=None, options=None, stream=False, keep_alive=None, **kwargs):
+        self.prompts.append(prompt)
+        reply = self.replies.pop(0)
+        pieces = [reply] if isinstance(reply, str) else reply
+        if not stream:
+            for piece in pieces:
+                if isinstance(piece, Exception):
+                    raise piece
+            return {"response": "".join(pieces), "done": True}
+        return self._stream(pieces)
+
+    def _stream(self, pieces):
+        for piece in pieces:
+            if isinstance(piece, Exception):
+                raise piece
+            yield {"response": piece, "done": False}
+        self.streams_read_to_end += 1
+        yield {"response": "", "done": True}
+
+@pytest.fixture
+def make_chat(tmp_path, monkeypatch):
+    """Builds an OllamaAIChat talking to a FakeOllamaClient, with its offline queue in tmp_path."""
+    monkeypatch.setattr(ollama_ai_chat, "OfflineQueue",
+                        lambda: OfflineQueue(str(tmp_path / "offline.sqlite"), str(tmp_path / "offline.jsonl")))
+    def _make(replies):
+        chat = ollama_ai_chat.OllamaAIChat(use_summary_cache=False)
+        chat.client = FakeOllamaClient(replies)
+        chat.breaker = OllamaCircuitBreaker(chat.client)
+        return chat
+    return _make
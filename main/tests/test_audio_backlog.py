@@ -0,0 +1,18 @@
+import numpy as np
+
+from audio_backlog import BoundedAudioQueue
+from audio_capture import AudioChunk
+
+def _chunk(start, final=False):
+    return AudioChunk(np.zeros(16, dtype=np.float32), start, 1.0, source="session-1", final=final)
+
+def test_drop_oldest_never_drops_a_final_chunk():
+    queue = BoundedAudioQueue(maxsize=2, policy="drop_oldest")
+    last = _chunk(1.0, final=True)
+    queue.put(last)
+    queue.put(_chunk(2.0))
+    queue.put(_chunk(3.0))
+
+    assert queue.dropped == 1
+    assert queue.get_nowait() is last
+    assert queue.get_nowait().start_time == 3.0
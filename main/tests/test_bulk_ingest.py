@@ -0,0 +1,38 @@
+from bulk_ingest import BulkIngest, IngestState
+
+class _OfflineChat:
+    """Stands in for OllamaAIChat while Ollama is down: every block goes to the offline queue."""
+    def __init__(self):
+        self.queued = set()
+
+    def process_block(self, raw_text, block_id, source=None):
+        self.queued.add((block_id, source))
+        return "offline"
+
+    def contains(self, block_id, source):
+        return (block_id, source) in self.queued
+
+def test_block_stored_offline_keeps_its_file_unfinished(tmp_path):
+    recording = tmp_path / "meeting.wav"
+    recording.write_bytes(b"audio")
+    state = IngestState(str(tmp_path / "state.sqlite"))
+    path = str(recording)
+    state.start_file(path)
+    state.add_block(path, 0, "We moved the review to Thursday.")
+    state.set_file_status(path, "transcribed")
+
+    ingest = BulkIngest([path], 1, 1, 1, state)
+    chat = _OfflineChat()
+    ingest.work_queue.put((path, 0, "We moved the review to Thursday."))
+    ingest.work_queue.put(None)
+    ingest._ollama_worker(chat)
+
+    assert ingest.blocks_summarised == 0
+    assert state.file_status(path) == "transcribed"
+    assert state.pending_blocks(path) == []  # Not re-sent; the offline queue retries it
+    assert not state.add_block(path, 0, "We moved the review to Thursday.")
+
+    chat.queued.clear()  # The offline queue published it
+    ingest.finish_offline_blocks(chat)
+    assert ingest.blocks_summarised == 1
+    assert state.file_status(path) == "done"
@@ -0,0 +1,52 @@
+import ollama_ai_chat
+from json_array_stream import JsonArrayStreamParser
+
+def _feed_pieces(text, size):
+    parser = JsonArrayStreamParser()
+    items = []
+    for i in range(0, len(text), size):
+        items.extend(parser.feed(text[i:i + size]))
+    return parser, items
+
+def test_clean_array_any_piece_size():
+    text = '["The team ships on Friday.", "Maria updates the \\"budget\\" sheet."]'
+    for size in (1, 3, 7, len(text)):
+        parser, items = _feed_pieces(text, size)
+        assert parser.done and not parser.malformed
+        assert items == ["The team ships on Friday.", 'Maria updates the "budget" sheet.']
+
+def test_unescaped_inner_quote_is_kept_in_the_bullet():
+    text = '["He said "hi" to me", "Second"]'
+    for size in (1, 2, 5, len(text)):
+        parser, items = _feed_pieces(text, size)
+        assert parser.done and not parser.malformed
+        assert items == ['He said "hi" to me', "Second"]
+
+def test_string_is_not_emitted_before_its_end_is_clear():
+    parser = JsonArrayStreamParser()
+    assert parser.feed('["He said "') == []
+    assert parser.feed('hi" to me", ') == []
+    assert parser.feed('"Second"]') == ['He said "hi" to me', "Second"]
+
+def test_malformed_stream_is_abandoned_and_requested_again(make_chat, monkeypatch):
+    monkeypatch.setattr(ollama_ai_chat, "OLLAMA_STREAMING", True)
+    chat = make_chat([
+        ['["First"', ' "Second"', ', "Third"]'],  # Missing comma
+        '["First", "Second", "Third"]',
+    ])
+    streamed = []
+
+    tasks = chat._generate_tasks("prompt", on_bullet=streamed.append)
+
+    assert tasks == ["First", "Second", "Third"]
+    assert chat.client.streams_read_to_end == 0
+    assert chat.client.replies == []
+    assert streamed == ["First"]
+
+def test_streamed_inner_quote_reply(make_chat, monkeypatch):
+    monkeypatch.setattr(ollama_ai_chat, "OLLAMA_STREAMING", True)
+    chat = make_chat([['["He said "h', 'i" to me", "Sec', 'ond"]']])
+    streamed = []
+
+    assert chat._generate_tasks("prompt", on_bullet=streamed.append) == ['He said "hi" to me', "Second"]
+    assert streamed == ['He said "hi" to me', "Second"]
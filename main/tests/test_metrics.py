@@ -0,0 +1,20 @@
+import metrics
+import ollama_ai_chat
+from metrics import OLLAMA_OUTPUT_PATHS
+
+def test_fix_prompt_rate_counts_each_reply_once(make_chat, monkeypatch):
+    monkeypatch.setattr(ollama_ai_chat, "OLLAMA_STREAMING", False)
+    monkeypatch.setattr(OLLAMA_OUTPUT_PATHS, "_values", {})
+    chat = make_chat([
+        '["The bins go out on Monday."]',            # Parsed directly
+        'Sure! ["The bins go out on Monday."]',      # Bracket extraction
+        '["The bins go out" "on Monday."]',          # Local repair (missing comma)
+        'There is nothing to summarise here.',       # Fix prompt...
+        '["The bins go out on Monday."]',            # ...and its reply
+    ])
+
+    for _ in range(4):
+        chat._generate_tasks("prompt")
+
+    assert OLLAMA_OUTPUT_PATHS.snapshot() == {"constrained": 1, "bracket_extraction": 1, "local_repair": 1, "fix_prompt": 1}
+    assert metrics.snapshot()["fix_prompt_rate"] == 0.25
@@ -0,0 +1,23 @@
+import json
+
+import pytest
+
+import offline_queue
+from offline_queue import OfflineQueue
+
+def test_legacy_file_is_imported_once_even_if_its_removal_fails(tmp_path, monkeypatch):
+    db_file, legacy_file = str(tmp_path / "offline.sqlite"), tmp_path / "offline.jsonl"
+    legacy_file.write_text(json.dumps({"block_id": 7, "raw_text": "Queued before the upgrade."}) + "\n", encoding="utf-8")
+
+    real_remove = offline_queue.os.remove
+    def _crash(path):
+        raise KeyboardInterrupt("crashed before the file was removed")
+    monkeypatch.setattr(offline_queue.os, "remove", _crash)
+    with pytest.raises(KeyboardInterrupt):
+        OfflineQueue(db_file, str(legacy_file))
+    monkeypatch.setattr(offline_queue.os, "remove", real_remove)
+
+    queue = OfflineQueue(db_file, str(legacy_file))
+    assert len(queue) == 1
+    assert not legacy_file.exists()
+    queue.close()
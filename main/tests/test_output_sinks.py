@@ -0,0 +1,84 @@
+from datetime import datetime
+
+import openpyxl
+
+import output_sinks
+from output_sinks import ExcelSink, OutputSink, SinkWriter
+
+class _Day:
+    """Stands in for datetime so the test decides which day it is."""
+    today = datetime(2026, 3, 1)
+
+    @classmethod
+    def now(cls):
+        return cls.today
+
+def _saved_bullets(path):
+    return [row[2] for row in openpyxl.load_workbook(path).active.iter_rows(min_row=2, values_only=True)]
+
+def test_rotation_keeps_rows_of_a_workbook_that_cannot_be_saved(tmp_path, monkeypatch):
+    monkeypatch.setattr(output_sinks, "datetime", _Day)
+    locked = set()
+    real_save = openpyxl.Workbook.save
+    def _save(workbook, filename):
+        if filename in locked:
+            raise PermissionError(f"'{filename}' is open in Excel")
+        real_save(workbook, filename)
+    monkeypatch.setattr(openpyxl.Workbook, "save", _save)
+
+    sink = ExcelSink(str(tmp_path / "summary.xlsx"), rotation="daily")
+    sink.write_rows([("t1", 1, "Yesterday", "kitchen")])
+    yesterday = sink.current.excel_file
+    locked.add(yesterday)
+
+    _Day.today = datetime(2026, 3, 2)
+    sink.write_rows([("t2", 2, "Today", "kitchen")])  # Does not raise, the new batch is staged
+    try:
+        sink.commit()
+        assert False, "commit should report the failed save"
+    except PermissionError:
+        pass
+    assert _saved_bullets(sink.current.excel_file) == ["Today"]
+
+    locked.clear()
+    sink.commit()
+    assert _saved_bullets(yesterday) == ["Yesterday"]
+
+class _FlakySink(OutputSink):
+    """Primary sink whose write_rows fails until 'broken' is cleared."""
+    name = "flaky"
+
+    def __init__(self):
+        self.broken = True
+        self.staged = []
+        self.committed = []
+
+    def write_rows(self, rows):
+        if self.broken:
+            raise OSError("cannot stage")
+        self.staged.extend(rows)
+
+    def commit(self):
+        self.committed.extend(self.staged)
+        self.staged = []
+
+def test_rows_the_primary_sink_could_not_stage_are_kept(tmp_path, monkeypatch):
+    fallback = tmp_path / "fallback.txt"
+    monkeypatch.setattr(output_sinks, "FALLBACK_TEXT_FILE", str(fallback))
+    primary = _FlakySink()
+    writer = SinkWriter([primary])
+    callbacks = []
+    writer._after_commit.append(lambda: callbacks.append("done"))
+
+    writer._stage([("t1", 1, "First", "kitchen")])
+    writer._commit_all()
+    assert primary.committed == []
+    assert callbacks == []
+    assert fallback.read_text(encoding="utf-8") == "t1, kitchen/1, First\n"
+
+    primary.broken = False
+    writer._stage([("t2", 2, "Second", "kitchen")])
+    writer._commit_all()
+    assert [row[2] for row in primary.committed] == ["First", "Second"]
+    assert callbacks == ["done"]
+    assert not fallback.exists()
@@ -0,0 +1,32 @@
+from queue import Queue
+
+import numpy as np
+
+from audio_capture import AudioChunk
+from whisper_transcribe import TranscriptionPipeline
+
+def _utt(text, start_time, end_time):
+    return {"text": text, "start_time": start_time, "end_time": end_time, "no_speech_prob": 0.05}
+
+def _chunk(start_time, duration, overlap):
+    return AudioChunk(np.zeros(16000, dtype=np.float32), start_time, duration, overlap, source="test")
+
+def _transcript(pipeline):
+    """Everything the pipeline sent on, whichever blocks pauses split it into."""
+    pipeline.drain()
+    return " ".join(pipeline.block_queue.get_nowait()[1] for _ in range(pipeline.block_queue.qsize()))
+
+def test_utterance_longer_than_overlap_is_kept_once():
+    # Speech from 15 s to 22 s, chunks of 0-20 s and 18-38 s sharing 2 s
+    pipeline = TranscriptionPipeline("test", block_queue=Queue())
+    pipeline.accumulate_chunk(_chunk(0.0, 20.0, 2.0), [_utt("Hello there.", 1.0, 4.0), _utt("We meet on Friday", 15.0, 20.0)])
+    pipeline.accumulate_chunk(_chunk(18.0, 20.0, 2.0), [_utt("We meet on Friday at ten.", 0.0, 4.0), _utt("Bring the slides.", 6.0, 9.0)])
+
+    assert _transcript(pipeline) == "Hello there. We meet on Friday at ten. Bring the slides."
+
+def test_utterance_inside_overlap_is_not_repeated():
+    pipeline = TranscriptionPipeline("test", block_queue=Queue())
+    pipeline.accumulate_chunk(_chunk(0.0, 20.0, 2.0), [_utt("First.", 2.0, 5.0), _utt("Second.", 18.5, 19.5)])
+    pipeline.accumulate_chunk(_chunk(18.0, 20.0, 2.0), [_utt("Second.", 0.5, 1.5), _utt("Third.", 5.0, 7.0)])
+
+    assert _transcript(pipeline) == "First. Second. Third."
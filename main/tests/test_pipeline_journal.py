@@ -0,0 +1,58 @@
+import numpy as np
+
+import pipeline_journal
+from audio_capture import AudioChunk
+from pipeline_journal import PipelineJournal
+
+def _open(tmp_path, monkeypatch, audio_delay=0):
+    journal = PipelineJournal(str(tmp_path / "journal.jsonl"), str(tmp_path / "audio"), flush_interval=0.01,
+                              audio_delay=audio_delay)
+    monkeypatch.setattr(pipeline_journal, "_journal", journal)
+    return journal
+
+def _reopen(journal, tmp_path):
+    journal._queue.put(None)  # Stop the writer without the clean-shutdown compaction, as in a crash
+    journal._writer.join()
+    journal._file.close()
+    return PipelineJournal(str(tmp_path / "journal.jsonl"), str(tmp_path / "audio")).state
+
+def test_segments_of_an_unfinished_batch_are_not_recovered(tmp_path, monkeypatch):
+    journal = _open(tmp_path, monkeypatch)
+    chunk = AudioChunk(np.zeros(16, dtype=np.float32), 0.0, 1.0, source="kitchen")
+    pipeline_journal.journal_chunk(chunk)
+
+    pipeline_journal.journal_batch_begin()
+    pipeline_journal.journal_segment("kitchen", "Sam will send the notes.")
+    # Crash before journal_batch_done: the chunk is transcribed again, its text must not be recovered too
+    pipeline_journal._batch.records = None
+    state = _reopen(journal, tmp_path)
+
+    assert list(state.chunks) == [chunk.journal_id]
+    assert not state.segments
+
+def test_finished_batch_is_recovered_as_text(tmp_path, monkeypatch):
+    journal = _open(tmp_path, monkeypatch)
+    chunk = AudioChunk(np.zeros(16, dtype=np.float32), 0.0, 1.0, source="kitchen")
+    pipeline_journal.journal_chunk(chunk)
+
+    pipeline_journal.journal_batch_begin()
+    pipeline_journal.journal_segment("kitchen", "Sam will send the notes.")
+    pipeline_journal.journal_batch_done([chunk])
+    state = _reopen(journal, tmp_path)
+
+    assert not state.chunks
+    assert state.segments["kitchen"] == ["Sam will send the notes."]
+
+def test_chunk_transcribed_within_the_audio_delay_is_never_written(tmp_path, monkeypatch):
+    journal = _open(tmp_path, monkeypatch, audio_delay=60)
+    chunk = AudioChunk(np.zeros(16, dtype=np.float32), 0.0, 1.0, source="kitchen")
+    pipeline_journal.journal_chunk(chunk)
+    journal._queue.join()
+    assert list((tmp_path / "audio").iterdir()) == []
+
+    pipeline_journal.journal_batch_begin()
+    pipeline_journal.journal_batch_done([chunk])
+    state = _reopen(journal, tmp_path)
+
+    assert list((tmp_path / "audio").iterdir()) == []
+    assert not state.chunks
@@ -0,0 +1,57 @@
+import ollama_ai_chat
+
+BLOCK = "We agreed to move the review to Thursday and Sam will send the notes."
+
+def _record_rows(monkeypatch):
+    rows = []
+    monkeypatch.setattr(ollama_ai_chat, "publish_summary_rows",
+                        lambda block_id, bullets, source=None: rows.extend((block_id, bullet, source) for bullet in bullets))
+    return rows
+
+def test_block_failing_mid_stream_publishes_each_row_once(make_chat, monkeypatch):
+    monkeypatch.setattr(ollama_ai_chat, "OLLAMA_STREAMING", True)
+    rows = _record_rows(monkeypatch)
+    chat = make_chat([
+        ['["First bullet", "Sec', ConnectionError("connection dropped")],
+        ['["First bullet", ', '"Second bullet"]'],
+    ])
+
+    chat.process_block(BLOCK, 1, "kitchen")
+    assert rows == [(1, "First bullet", "kitchen")]  # Published while streaming
+    assert len(chat.offline_queue) == 1
+
+    assert chat._try_offline_queue(ignore_schedule=True) == 1
+    assert rows == [(1, "First bullet", "kitchen"), (1, "Second bullet", "kitchen")]
+    assert len(chat.offline_queue) == 0
+
+def test_published_count_survives_a_second_failure(make_chat, monkeypatch):
+    monkeypatch.setattr(ollama_ai_chat, "OLLAMA_STREAMING", True)
+    rows = _record_rows(monkeypatch)
+    chat = make_chat([
+        ['["One", "Tw', ConnectionError("connection dropped")],
+        ['["One", "Two", "Thr', ConnectionError("connection dropped")],
+        '["One", "Two", "Three"]',
+    ])
+
+    chat.process_block(BLOCK, 3, "hall")
+    chat._try_offline_queue(ignore_schedule=True)
+    chat._try_offline_queue(ignore_schedule=True)
+    assert [bullet for _, bullet, _ in rows] == ["One", "Two", "Three"]
+    assert len(chat.offline_queue) == 0
+
+def test_failed_reduce_step_publishes_only_the_fallback(make_chat, monkeypatch):
+    monkeypatch.setattr(ollama_ai_chat, "OLLAMA_STREAMING", True)
+    monkeypatch.setattr(ollama_ai_chat, "OLLAMA_MAP_REDUCE_THRESHOLD_TOKENS", 5)
+    monkeypatch.setattr(ollama_ai_chat, "OLLAMA_SUB_BLOCK_TOKENS", 12)
+    monkeypatch.setattr(ollama_ai_chat, "OLLAMA_SUB_BLOCK_OVERLAP_TOKENS", 0)
+    monkeypatch.setattr(ollama_ai_chat, "OLLAMA_MAX_PARALLEL_REQUESTS", 1)
+    rows = _record_rows(monkeypatch)
+    chat = make_chat([
+        '["The review moved to Thursday."]',
+        '["Sam will send the notes."]',
+        ['["The review moved to Thursday and Sam sends the notes.", "', ConnectionError("connection dropped")],
+    ])
+
+    chat.process_block(BLOCK, 2, "kitchen")
+    assert chat.client.replies == []  # Both sub-blocks and the reduce step were requested
+    assert rows == [(2, "The review moved to Thursday.", "kitchen"), (2, "Sam will send the notes.", "kitchen")]
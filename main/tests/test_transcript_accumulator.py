@@ -0,0 +1,27 @@
+from queue import Queue
+
+from transcript_accumulator import TranscriptAccumulator, estimate_tokens
+from whisper_transcribe import TranscriptionPipeline
+
+LONG_SEGMENT = " ".join(f"word{i}" for i in range(40))
+
+def test_split_keeps_words_and_fits_budget():
+    accumulator = TranscriptAccumulator(token_budget=10)
+    pieces = accumulator.split(LONG_SEGMENT)
+    assert len(pieces) > 1
+    assert all(estimate_tokens(piece) <= 10 for piece in pieces)
+    assert " ".join(pieces) == LONG_SEGMENT
+
+def test_split_leaves_segments_within_budget_alone():
+    assert TranscriptAccumulator(token_budget=10).split("short text") == ["short text"]
+
+def test_over_budget_segment_is_spread_over_blocks():
+    pipeline = TranscriptionPipeline("test", block_queue=Queue())
+    pipeline.incoming_transcript = TranscriptAccumulator(token_budget=10)
+    pipeline._add_to_block(LONG_SEGMENT)
+    pipeline.drain()
+
+    blocks = [pipeline.block_queue.get_nowait()[1] for _ in range(pipeline.block_queue.qsize())]
+    assert len(blocks) > 1
+    assert all(estimate_tokens(block) <= 10 for block in blocks)
+    assert " ".join(blocks) == LONG_SEGMENT
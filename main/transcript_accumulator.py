@@ -0,0 +1,82 @@
+from logging_utils import text_lock
+
+CHARS_PER_TOKEN = 4  # Rough average for English text with llama-style tokenizers
+
+def estimate_tokens(text):
+    """Rough token count for English text."""
+    return max(1, (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN)
+
+class TranscriptAccumulator:
+    """
+    Collects transcript segments for the block currently being built.
+    Segments are kept in a list with a running token estimate instead of one
+    ever-growing string, and the block is flushed once the next segment would
+    push it past token_budget, so a block always fits the model's context.
+    A segment that is over the budget on its own has to be split first (see split).
+    All access goes through text_lock, so the shutdown drain can safely run
+    from another thread.
+    """
+    def __init__(self, token_budget):
+        self.token_budget = token_budget
+        self._segments = []
+        self._tokens = 0
+        self._lock = text_lock
+
+    def add(self, text):
+        """
+        Append a segment. If it would not fit in the token budget, the block collected so far
+        is taken out first and returned so the caller can send it on; otherwise returns None.
+        """
+        tokens = estimate_tokens(text)
+        with self._lock:
+            full_block = None
+            if self._segments and self._tokens + tokens > self.token_budget:
+                full_block = self._take()
+            self._segments.append(text)
+            self._tokens += tokens
+            return full_block
+
+    def split(self, text):
+        """The segment as pieces that each fit the token budget, split at word boundaries."""
+        if estimate_tokens(text) <= self.token_budget:
+            return [text]
+        max_chars = self.token_budget * CHARS_PER_TOKEN
+        pieces = []
+        current = ""
+        for word in text.split():
+            while len(word) > max_chars:
+                # No word boundary to split at
+                if current:
+                    pieces.append(current)
+                    current = ""
+                pieces.append(word[:max_chars])
+                word = word[max_chars:]
+            candidate = f"{current} {word}" if current else word
+            if len(candidate) > max_chars:
+                pieces.append(current)
+                current = word
+            else:
+                current = candidate
+        if current:
+            pieces.append(current)
+        return pieces
+
+    def drain(self):
+        """Atomically take the accumulated block (or "" if there is none) and reset."""
+        with self._lock:
+            return self._take()
+
+    def _take(self):
+        text = " ".join(self._segments)
+        self._segments = []
+        self._tokens = 0
+        return text
+
+    @property
+    def token_count(self):
+        with self._lock:
+            return self._tokens
+
+    def __bool__(self):
+        with self._lock:
+            return bool(self._segments)
@@ -0,0 +1,252 @@
+import multiprocessing as mp
+import signal
+import time
+import traceback
+from multiprocessing import shared_memory
+from queue import Empty
+
+import numpy as np
+
+from config import (
+    SAMPLERATE,
+    WHISPER_MODEL,
+    WHISPER_BACKEND,
+    WHISPER_DEVICE,
+    WHISPER_COMPUTE_TYPE,
+    WHISPER_TASK,
+    WHISPER_PROCESS_COUNT,
+    WHISPER_PROCESS_DEVICE_INDICES,
+    WHISPER_PROCESS_TIMEOUT,
+)
+from logging_utils import log_and_print, WARNING
+
+def _attach_shared_memory(name):
+    """Attach to a buffer created (and later unlinked) by the main process."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        # Spawned processes share the main process's resource tracker, which already knows the buffer
+        return shared_memory.SharedMemory(name=name)
+
+def _close_all(attached):
+    for shm in attached.values():
+        try:
+            shm.close()
+        except BufferError:
+            pass  # A view is still alive; the mapping goes away with the process
+    attached.clear()
+
+def _whisper_process_main(device_index, task_queue, result_queue):
+    """
+    Entry point of a Whisper worker process. Loads the model, then transcribes tasks until it receives None.
+    Tasks are (task_id, buffer_name, items) where each item is either (offset, length) into the shared
+    float32 buffer, or the path of a temp WAV file. Results are (task_id, utterance lists, error).
+    The process never logs itself (the main process owns the log file); errors go back with the result.
+    """
+    import whisper_s2t
+
+    # Ctrl+C reaches the whole process group; the main process decides when this one stops
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        model = whisper_s2t.load_model(
+            model_identifier=WHISPER_MODEL,
+            backend=WHISPER_BACKEND,
+            device=WHISPER_DEVICE,
+            device_index=device_index,
+            compute_type=WHISPER_COMPUTE_TYPE
+        )
+    except Exception:
+        result_queue.put(("ready", None, traceback.format_exc()))
+        return
+    result_queue.put(("ready", None, None))
+
+    attached = {}  # buffer name -> SharedMemory
+    files = None
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        task_id, buffer_name, items = task
+        try:
+            if task_id == "warmup":
+                dummy_audio = (np.random.default_rng(0).standard_normal(SAMPLERATE) * 0.01).astype(np.float32)
+                model.transcribe([dummy_audio], lang_codes=['en'], tasks=[WHISPER_TASK], initial_prompts=[None], batch_size=1)
+                result_queue.put((task_id, None, None))
+                continue
+
+            if buffer_name is not None and buffer_name not in attached:
+                # The main process replaced the buffer with a bigger one; drop the old one
+                _close_all(attached)
+                attached = {buffer_name: _attach_shared_memory(buffer_name)}
+            files = []
+            for item in items:
+                if isinstance(item, str):
+                    files.append(item)
+                else:
+                    offset, length = item
+                    buf = attached[buffer_name].buf
+                    files.append(np.ndarray((length,), dtype=np.float32, buffer=buf, offset=offset * 4))
+
+            # Same call as whisper_transcribe._transcribe_audio_chunks uses in-process
+            out = model.transcribe_with_vad(
+                files,
+                lang_codes=['en'] * len(files),
+                tasks=[WHISPER_TASK] * len(files),
+                initial_prompts=[None] * len(files),
+                batch_size=16
+            )
+            result_queue.put((task_id, list(out), None))
+        except Exception:
+            result_queue.put((task_id, None, traceback.format_exc()))
+        finally:
+            files = None  # Release the views into the shared buffer
+
+    _close_all(attached)
+
+class _WhisperProcess:
+    """One worker process with its own task/result queues and reusable shared audio buffer."""
+    def __init__(self, context, device_index):
+        self.device_index = device_index
+        self.task_queue = context.Queue()
+        self.result_queue = context.Queue()
+        self.process = context.Process(target=_whisper_process_main,
+                                       args=(device_index, self.task_queue, self.result_queue), daemon=True)
+        self.buffer = None
+        self._old_buffers = []
+        self.process.start()
+
+    def buffer_for(self, num_samples):
+        """Return a shared buffer holding at least num_samples float32 values, growing it if needed."""
+        if self.buffer is None or self.buffer.size < num_samples * 4:
+            if self.buffer is not None:
+                # The worker may still be attached; unlink it once the next task is done
+                self._old_buffers.append(self.buffer)
+            self.buffer = shared_memory.SharedMemory(create=True, size=max(num_samples * 4, 1))
+        return self.buffer
+
+    def release_old_buffers(self):
+        for shm in self._old_buffers:
+            shm.close()
+            shm.unlink()
+        self._old_buffers = []
+
+    def close(self):
+        if self.buffer is not None:
+            self._old_buffers.append(self.buffer)
+            self.buffer = None
+        self.release_old_buffers()
+
+class WhisperProcessPool:
+    """
+    Runs Whisper in WHISPER_PROCESS_COUNT separate processes, so model work never competes
+    with the audio callback and the Ollama threads for the GIL.
+
+    Audio is copied once into a shared memory buffer per process instead of being pickled;
+    only offsets and the small utterance results go over the queues. A batch is split
+    evenly across the processes and the results are returned in the original order.
+    A process that dies is restarted, and its chunks are reported as failed (None).
+    """
+    def __init__(self, count=WHISPER_PROCESS_COUNT, device_indices=WHISPER_PROCESS_DEVICE_INDICES):
+        # "spawn" works on every platform and is the only safe choice once CUDA is initialised
+        self._context = mp.get_context("spawn")
+        self._device_indices = [device_indices[i % len(device_indices)] for i in range(max(count, 1))]
+        self._task_counter = 0
+        self._closed = False
+        self.processes = []
+        for device_index in self._device_indices:
+            self.processes.append(self._start_process(device_index))
+        log_and_print(f"Whisper running in {len(self.processes)} worker process(es) on device indices {self._device_indices}.")
+
+    def _start_process(self, device_index):
+        worker = _WhisperProcess(self._context, device_index)
+        try:
+            _, _, error = worker.result_queue.get(timeout=WHISPER_PROCESS_TIMEOUT)
+        except Empty:
+            error = f"no answer within {WHISPER_PROCESS_TIMEOUT}s"
+        if error is not None:
+            worker.process.terminate()
+            worker.close()
+            raise Exception(f"Whisper worker process failed to load the model: {error}")
+        return worker
+
+    def _wait_for_result(self, worker, task_id):
+        """Wait for the worker's answer to task_id. Returns (out, error); a dead or stuck worker is restarted."""
+        deadline = time.monotonic() + WHISPER_PROCESS_TIMEOUT
+        while time.monotonic() < deadline:
+            try:
+                result_id, out, error = worker.result_queue.get(timeout=1)
+            except Empty:
+                if not worker.process.is_alive():
+                    break
+                continue
+            if result_id == task_id:
+                return out, error
+        if self._closed:
+            return None, "Whisper worker processes were stopped"
+        index = self.processes.index(worker)
+        log_and_print(f"Whisper worker process {worker.process.pid} stopped responding; restarting it.", level=WARNING)
+        worker.process.terminate()
+        worker.close()
+        self.processes[index] = self._start_process(worker.device_index)
+        return None, "worker process stopped responding"
+
+    def transcribe(self, audio_list):
+        """
+        Transcribe a list of audio items (float32 arrays or temp WAV paths).
+        Returns one utterance list per item, or None for items whose worker failed.
+        """
+        shares = np.array_split(np.arange(len(audio_list)), len(self.processes))
+        submitted = []
+        for worker, indices in zip(self.processes, shares):
+            if len(indices) == 0:
+                continue
+            items = [audio_list[i] for i in indices]
+            arrays = [a for a in items if not isinstance(a, str)]
+            buffer = worker.buffer_for(sum(len(a) for a in arrays)) if arrays else None
+            offset = 0
+            task_items = []
+            for item in items:
+                if isinstance(item, str):
+                    task_items.append(item)
+                else:
+                    np.ndarray((len(item),), dtype=np.float32, buffer=buffer.buf, offset=offset * 4)[:] = item
+                    task_items.append((offset, len(item)))
+                    offset += len(item)
+            self._task_counter += 1
+            worker.task_queue.put((self._task_counter, buffer.name if buffer else None, task_items))
+            submitted.append((worker, indices, self._task_counter))
+
+        results = [None] * len(audio_list)
+        for worker, indices, task_id in submitted:
+            out, error = self._wait_for_result(worker, task_id)
+            worker.release_old_buffers()
+            if error is not None:
+                log_and_print(f"Error transcribing audio in worker process: {error}")
+                continue
+            for i, utterances in zip(indices, out):
+                results[i] = utterances
+        return results
+
+    def warm_up(self):
+        """Run the warm-up inference in every worker process (in parallel)."""
+        for worker in self.processes:
+            worker.task_queue.put(("warmup", None, None))
+        errors = [self._wait_for_result(worker, "warmup")[1] for worker in list(self.processes)]
+        errors = [error for error in errors if error is not None]
+        if errors:
+            raise Exception(errors[0])
+
+    def close(self):
+        """Stop the worker processes and free the shared buffers."""
+        self._closed = True
+        for worker in self.processes:
+            try:
+                worker.task_queue.put(None)
+            except Exception:
+                pass
+        for worker in self.processes:
+            worker.process.join(timeout=10)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            worker.close()
+        self.processes = []
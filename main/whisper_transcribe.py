@@ -1,30 +1,67 @@
 import os
 import re
+import time
 from queue import Empty
 from audio_capture import temp_audio_files
 from config import (
     NO_SPEECH_PROB_CUTOFF,
-    MAX_CONSECUTIVE_SPEECH_CHUNKS,
+    SAMPLERATE,
+    TRANSCRIPT_TOKEN_BUDGET,
     WHISPER_MODEL,
     WHISPER_BACKEND,
     WHISPER_DEVICE,
     WHISPER_COMPUTE_TYPE,
-    WHISPER_TASK
+    WHISPER_TASK,
+    WHISPER_MAX_BATCH_CHUNKS,
+    WHISPER_DEGRADED_MODEL,
+    WHISPER_DEGRADED_COMPUTE_TYPE,
+    AUDIO_OVERLOAD_POLICY,
+    AUDIO_DEGRADE_HIGH_WATER,
+    AUDIO_DEGRADE_LOW_WATER,
+    WHISPER_EXECUTION_MODE,
+    SILENCE_GATE_ENABLED,
+    SPEECH_GAP_FLUSH_SECONDS,
+    AUDIO_SOURCE_BATCH_WAIT,
 )
-from logging_utils import log_and_print, shutdown_event, text_lock
+from logging_utils import log_and_print, shutdown_event, INFO, WARNING
 from ollama_worker import ollama_queue
+from silence_gate import SilenceGate
+from whisper_process import WhisperProcessPool
+from pipeline_journal import journal_segment, journal_block, journal_batch_begin, journal_batch_done
+from metrics import (
+    WHISPER_CHUNKS,
+    WHISPER_BATCH_SECONDS,
+    WHISPER_REAL_TIME_FACTOR,
+    WHISPER_DEGRADED,
+    TRANSCRIPTION_LAG,
+    TRANSCRIPTION_LAG_SECONDS,
+)
+from transcript_accumulator import TranscriptAccumulator, estimate_tokens
 
+import numpy as np
 import whisper_s2t
 
-incoming_text = ""
-consecutive_speech_chunks = 0
-last_transcription = ""
 whisper_model = None
+full_whisper_model = None      # WHISPER_MODEL
+degraded_whisper_model = None  # WHISPER_DEGRADED_MODEL, only loaded for the "degrade" overload policy
+whisper_pool = None            # WhisperProcessPool in "process" execution mode
+pipelines = {}                 # Audio source name -> TranscriptionPipeline
 
 def initialize_whisper_model():
-    global whisper_model
+    global whisper_model, full_whisper_model, degraded_whisper_model, whisper_pool
+    if WHISPER_EXECUTION_MODE.lower() == "process":
+        try:
+            whisper_pool = WhisperProcessPool()
+            log_and_print("Whisper model loaded successfully.")
+        except Exception as e:
+            log_and_print(f"Error loading Whisper model: {e}")
+            raise e
+        if AUDIO_OVERLOAD_POLICY.lower() == "degrade":
+            log_and_print("The \"degrade\" overload policy is not available in \"process\" execution mode; overload will only drop chunks.", level=WARNING)
+        return
+
     try:
-        whisper_model = whisper_s2t.load_model(
+        whisper_model = full_whisper_model = whisper_s2t.load_model(
             model_identifier=WHISPER_MODEL,
             backend=WHISPER_BACKEND,
             device=WHISPER_DEVICE,
@@ -35,97 +72,401 @@ def initialize_whisper_model():
         log_and_print(f"Error loading Whisper model: {e}")
         raise e
 
-def _transcribe_audio_chunk(audio_file):
-    """Transcribe the audio in the given file using WhisperS2T, returning (transcription, min_no_speech_prob)."""
+    # Loaded up front so switching under load does not stall transcription even further
+    if AUDIO_OVERLOAD_POLICY.lower() == "degrade":
+        try:
+            degraded_whisper_model = whisper_s2t.load_model(
+                model_identifier=WHISPER_DEGRADED_MODEL,
+                backend=WHISPER_BACKEND,
+                device=WHISPER_DEVICE,
+                compute_type=WHISPER_DEGRADED_COMPUTE_TYPE
+            )
+            log_and_print(f"Degraded Whisper model '{WHISPER_DEGRADED_MODEL}' loaded for overload handling.")
+        except Exception as e:
+            log_and_print(f"Error loading degraded Whisper model; overload will only drop chunks: {e}", level=WARNING)
+
+def _adjust_model_for_backlog(backlog):
+    """
+    "degrade" overload policy: use the faster model while at least AUDIO_DEGRADE_HIGH_WATER chunks
+    are waiting, and go back to the normal model once the backlog is down to AUDIO_DEGRADE_LOW_WATER.
+    """
     global whisper_model
+    if degraded_whisper_model is None:
+        return
+    if whisper_model is full_whisper_model and backlog >= AUDIO_DEGRADE_HIGH_WATER:
+        whisper_model = degraded_whisper_model
+        WHISPER_DEGRADED.set(1)
+        log_and_print(f"{backlog} audio chunks waiting; switching to the faster '{WHISPER_DEGRADED_MODEL}' Whisper model.", level=WARNING)
+    elif whisper_model is degraded_whisper_model and backlog <= AUDIO_DEGRADE_LOW_WATER:
+        whisper_model = full_whisper_model
+        WHISPER_DEGRADED.set(0)
+        log_and_print(f"Audio backlog drained; switching back to the '{WHISPER_MODEL}' Whisper model.")
+
+def warm_up_whisper_model():
+    """
+    Transcribe one second of quiet noise so CUDA/CTranslate2 initialisation happens now
+    instead of on the first real chunk. VAD is skipped so the decoder runs as well.
+    Failures are logged only; transcription still works, just slower the first time.
+    """
+    dummy_audio = (np.random.default_rng(0).standard_normal(SAMPLERATE) * 0.01).astype(np.float32)
+    start = time.perf_counter()
     try:
-        files=[audio_file]
-        lang_codes=['en']
-        tasks=[WHISPER_TASK]
-        initial_prompts=[None]
-        batch_size=16
-        out = whisper_model.transcribe_with_vad(
-            files,
-            lang_codes=lang_codes,
-            tasks=tasks,
-            initial_prompts=initial_prompts,
-            batch_size=batch_size
-        )
-        if os.path.exists(audio_file):
-            os.remove(audio_file)
-        if audio_file in temp_audio_files:
-            temp_audio_files.remove(audio_file)
-
-        utterances = out[0]
-        # We'll use the min no_speech_prob from each utterance
-        min_no_speech_prob = min(utt['no_speech_prob'] for utt in utterances if 'no_speech_prob' in utt) if utterances else 1.0
-        transcription = " ".join(utt['text'] for utt in utterances)
-        return transcription, min_no_speech_prob
+        if whisper_pool is not None:
+            whisper_pool.warm_up()
+        else:
+            whisper_model.transcribe([dummy_audio], lang_codes=['en'], tasks=[WHISPER_TASK], initial_prompts=[None], batch_size=1)
+        log_and_print(f"Whisper warm-up finished in {time.perf_counter() - start:.2f}s.")
+    except Exception as e:
+        log_and_print(f"Whisper warm-up failed after {time.perf_counter() - start:.2f}s: {e}")
+
+def _remove_temp_audio_file(audio_chunk):
+    """Delete a transcribed temp WAV file (legacy "file" capture mode only)."""
+    if isinstance(audio_chunk, str):
+        if os.path.exists(audio_chunk):
+            os.remove(audio_chunk)
+        if audio_chunk in temp_audio_files:
+            temp_audio_files.remove(audio_chunk)
+
+def _transcribe_audio_chunks(audio_chunks):
+    """
+    Transcribe several AudioChunks with a single batched WhisperS2T call.
+    Each chunk's audio is either a 16 kHz mono NumPy array ("stream" capture mode) or the path
+    to a temp WAV file ("file" capture mode), which is deleted once transcribed.
+    In "process" execution mode the call runs in the Whisper worker processes instead.
+    Returns the list of utterances for each chunk in the same order as the input,
+    or None for every chunk if the call fails.
+    """
+    global whisper_model
+    try:
+        start = time.perf_counter()
+        files=[chunk.audio for chunk in audio_chunks]
+        if whisper_pool is not None:
+            out = whisper_pool.transcribe(files)
+        else:
+            lang_codes=['en'] * len(files)
+            tasks=[WHISPER_TASK] * len(files)
+            initial_prompts=[None] * len(files)
+            batch_size=16
+            out = whisper_model.transcribe_with_vad(
+                files,
+                lang_codes=lang_codes,
+                tasks=tasks,
+                initial_prompts=initial_prompts,
+                batch_size=batch_size
+            )
+        out = list(out)
+        elapsed = time.perf_counter() - start
+        WHISPER_BATCH_SECONDS.observe(elapsed)
+        audio_seconds = sum(chunk.duration for chunk in audio_chunks)
+        if audio_seconds > 0:
+            # A batched call has no per-chunk timing, so every chunk gets the batch's factor
+            for _ in audio_chunks:
+                WHISPER_REAL_TIME_FACTOR.observe(elapsed / audio_seconds)
+
+        for audio_chunk in files:
+            _remove_temp_audio_file(audio_chunk)
+
+        return out
     except Exception as e:
         log_and_print(f"Error transcribing audio: {e}")
-        return None, None
+        return [None] * len(audio_chunks)
+
+def _join_utterances(utterances):
+    """Returns (transcription, min_no_speech_prob) for a chunk's utterances."""
+    # We'll use the min no_speech_prob from each utterance
+    min_no_speech_prob = min(utt['no_speech_prob'] for utt in utterances if 'no_speech_prob' in utt) if utterances else 1.0
+    transcription = " ".join(utt['text'] for utt in utterances)
+    return transcription, min_no_speech_prob
 
-def transcription_worker(audio_queue):
+def _is_speech(utt):
+    return utt.get('no_speech_prob', 1.0) < NO_SPEECH_PROB_CUTOFF and re.search(r"[^\s]", utt['text'])
+
+class TranscriptionPipeline:
     """
-    Worker that continuously pulls audio file paths from audio_queue,
-    transcribes them, and accumulates text if valid speech is detected.
-    If max consecutive speech or silence is encountered, it enqueues to ollama_queue.
+    Accumulation state of one audio source (microphone or file): the block being built,
+    the overlap and speech timing of its last chunk and its own silence gate.
+    Every source has one, while the Whisper model is shared by all of them.
+    Finished blocks are put on block_queue as (source, text) tuples.
+    Pipelines feeding ollama_queue record their segments and blocks in the crash recovery journal.
     """
-    global incoming_text, consecutive_speech_chunks, last_transcription
+    def __init__(self, source, block_queue=ollama_queue):
+        self.source = source
+        self.block_queue = block_queue
+        self.journaled = block_queue is ollama_queue
+        self.incoming_transcript = TranscriptAccumulator(TRANSCRIPT_TOKEN_BUDGET)
+        self.last_transcription = ""
+        self.emitted_until = None     # Session time at which the last utterance kept from an overlapping chunk ended
+        self.last_speech_end = None   # Session time at which the last accumulated speech utterance ended
+        self.silence_gate = SilenceGate() if SILENCE_GATE_ENABLED else None
 
-    while not shutdown_event.is_set():
-        try:
-            audio_file = audio_queue.get(timeout=1)
-        except Empty:
-            continue
-        if audio_file is None:
-            continue
+    def _log(self, message, level=INFO):
+        if len(pipelines) > 1:
+            message = f"[{self.source}] {message}"
+        log_and_print(message, level=level)
+
+    def _trim_overlap(self, chunk, utterances):
+        """
+        With overlapping chunks the shared audio is transcribed twice. An utterance that runs
+        into the overlap at the end of a chunk is held back, because the next chunk hears it
+        again and emits it; that chunk in turn drops anything ending before the end of the last
+        utterance already emitted. This holds for utterances longer than the overlap too.
+        Utterance times from transcribe_with_vad are relative to the chunk, so they are shifted
+        onto the session timeline first.
+        """
+        if chunk.overlap <= 0:
+            self.emitted_until = None
+            return utterances
+
+        overlap_start = chunk.end_time - chunk.overlap
+        kept = []
+        for utt in utterances:
+            utt_end = chunk.start_time + utt.get('end_time', chunk.duration)
+            if self.emitted_until is not None and utt_end <= self.emitted_until:
+                continue  # Already emitted by the previous chunk
+            if utt_end > overlap_start and not chunk.final:
+                continue  # The next chunk hears this utterance again and will emit it
+            kept.append(utt)
+            self.emitted_until = utt_end
+
+        dropped = len(utterances) - len(kept)
+        if dropped:
+            self._log(f"Overlap de-duplication dropped {dropped} of {len(utterances)} utterances at chunk boundaries.")
+        return kept
+
+    def _emit_block(self, block):
+        if self.journaled:
+            journal_block(self.source, block)
+        self.block_queue.put((self.source, block))
+
+    def _flush_on_silence(self):
+        """Silence ends the current block: send the accumulated transcript to Ollama."""
+        block = self.incoming_transcript.drain()
+        if block:
+            self._emit_block(block)
+        self.last_speech_end = None
+
+    def _add_to_block(self, text):
+        """Add a transcript segment; if the block was already full, it goes to Ollama first."""
+        pieces = self.incoming_transcript.split(text)
+        if len(pieces) > 1:
+            self._log(f"Transcript segment of ~{estimate_tokens(text)} tokens is over the block budget of {TRANSCRIPT_TOKEN_BUDGET}; "
+                      f"splitting it into {len(pieces)} parts.", level=WARNING)
+        for piece in pieces:
+            full_block = self.incoming_transcript.add(piece)
+            if full_block:
+                self._log("Transcript token budget reached; enqueuing accumulated transcription to Ollama queue.")
+                self._emit_block(full_block)
+            if self.journaled:
+                journal_segment(self.source, piece)
+
+    def restore_segments(self, segments):
+        """Put the journaled segments of the block that was being built before a crash back."""
+        journaled = True  # They are still in the journal, unless a full block is sent on in between
+        for text in segments:
+            full_block = self.incoming_transcript.add(text)
+            if full_block:
+                self._emit_block(full_block)
+                journaled = False
+            if not journaled and self.journaled:
+                journal_segment(self.source, text)
 
-        transcription, min_no_speech_prob = _transcribe_audio_chunk(audio_file)
+    def accumulate_chunk(self, chunk, utterances):
+        """
+        Accumulate one transcribed chunk.
+        With SPEECH_GAP_FLUSH_SECONDS set, speech vs. silence is decided per utterance: a pause
+        between utterances longer than the threshold ends the current block right there, and so
+        does a long enough pause at the end of the chunk, without waiting for the next one.
+        Otherwise the whole chunk is judged by its min_no_speech_prob as before.
+        """
+        if utterances is None:
+            self._log("No transcription obtained; skipping this chunk.")
+            return
+
+        kept = self._trim_overlap(chunk, utterances)
+        if SPEECH_GAP_FLUSH_SECONDS <= 0:
+            self._accumulate_transcription(*_join_utterances(kept))
+            return
+
+        speech = [utt for utt in kept if _is_speech(utt)]
+        self._log(f"Transcription chunk: {len(kept)} utterances, {len(speech)} with speech.")
+        if not speech and any(_is_speech(utt) for utt in utterances):
+            self._log("All speech in this chunk runs into the overlap; the next chunk will emit it.")
+            return
+        if not speech:
+            self._log("No speech utterances in this chunk; treating it as silence.")
+            self._flush_on_silence()
+            return
+
+        transcription = " ".join(utt['text'] for utt in speech)
+        if transcription == self.last_transcription:
+            self._log("Transcription is identical to the last one; skipping accumulation.")
+        else:
+            for utt in speech:
+                utt_start = chunk.start_time + utt.get('start_time', 0.0)
+                if self.last_speech_end is not None and utt_start - self.last_speech_end > SPEECH_GAP_FLUSH_SECONDS:
+                    self._log(f"Pause of {utt_start - self.last_speech_end:.1f}s between utterances; ending the current block.")
+                    self._flush_on_silence()
+                self._add_to_block(utt['text'])
+                self.last_speech_end = chunk.start_time + utt.get('end_time', chunk.duration)
+            self.last_transcription = transcription
+            self._log(f"Accumulated transcription tokens: ~{self.incoming_transcript.token_count} of {TRANSCRIPT_TOKEN_BUDGET}")
+
+        # Speech still running into the overlap (owned by the next chunk) counts as activity too
+        activity_ends = [chunk.start_time + utt.get('end_time', chunk.duration) for utt in utterances if _is_speech(utt)]
+        if self.last_speech_end is not None:
+            activity_ends.append(self.last_speech_end)
+        trailing_pause = chunk.end_time - max(activity_ends)
+        if self.incoming_transcript and trailing_pause > SPEECH_GAP_FLUSH_SECONDS:
+            self._log(f"Pause of {trailing_pause:.1f}s at the end of the chunk; ending the current block.")
+            self._flush_on_silence()
+
+    def _accumulate_transcription(self, transcription, min_no_speech_prob):
+        """
+        Accumulate one chunk's transcription if it is valid speech.
+        If the token budget is reached or silence is encountered, it enqueues to block_queue.
+        """
         if transcription is None:
-            log_and_print("No transcription obtained; skipping this chunk.")
-            audio_queue.task_done()
-            continue
+            self._log("No transcription obtained; skipping this chunk.")
+            return
 
         char_count = len(transcription)
-        log_and_print(f"Transcription chunk character count: {char_count}, min prob:{min_no_speech_prob:.3f}")
+        self._log(f"Transcription chunk character count: {char_count}, min prob:{min_no_speech_prob:.3f}")
 
         if transcription and re.search(r"[^\s]", transcription):
             if min_no_speech_prob < NO_SPEECH_PROB_CUTOFF:
-                if transcription == last_transcription:
-                    log_and_print("Transcription is identical to the last one; skipping accumulation.")
+                if transcription == self.last_transcription:
+                    self._log("Transcription is identical to the last one; skipping accumulation.")
                 else:
-                    with text_lock:
-                        incoming_text += " " + transcription
-                    last_transcription = transcription
-                    consecutive_speech_chunks += 1
-                    log_and_print(f"Accumulated transcription length: {len(incoming_text)}; consecutive: {consecutive_speech_chunks}")
-
-                if consecutive_speech_chunks >= MAX_CONSECUTIVE_SPEECH_CHUNKS:
-                    log_and_print("Maximum consecutive speech chunks reached; enqueuing accumulated transcription to Ollama queue.")
-                    ollama_queue.put(incoming_text)
-                    with text_lock:
-                        incoming_text = ""
-                    consecutive_speech_chunks = 0
+                    self._add_to_block(transcription)
+                    self.last_transcription = transcription
+                    self._log(f"Accumulated transcription tokens: ~{self.incoming_transcript.token_count} of {TRANSCRIPT_TOKEN_BUDGET}")
             else:
-                log_and_print(f"no_speech_prob = {min_no_speech_prob:.3f} indicates silence or unclear audio.")
-                if incoming_text:
-                    ollama_queue.put(incoming_text)
-                    with text_lock:
-                        incoming_text = ""
-                consecutive_speech_chunks = 0
+                self._log(f"no_speech_prob = {min_no_speech_prob:.3f} indicates silence or unclear audio.")
+                self._flush_on_silence()
         else:
-            log_and_print("Transcription chunk contains only whitespace; skipping.")
+            self._log("Transcription chunk contains only whitespace; skipping.")
+
+    def skip_silent_chunk(self, chunk):
+        """A chunk rejected by the silence gate ends the current block like any other silence."""
+        _remove_temp_audio_file(chunk.audio)
+        self._trim_overlap(chunk, [])
+        self._flush_on_silence()
+
+    def end_of_stream(self):
+        """
+        The source's audio has ended (e.g. the end of a file in bulk_ingest): send the
+        accumulated transcript on as a block and reset the state carried between chunks.
+        """
+        self._flush_on_silence()
+        self.last_transcription = ""
+        self.emitted_until = None
+        if self.silence_gate is not None:
+            self.silence_gate = SilenceGate()
+
+    def drain(self):
+        """Send the leftover accumulated transcript on (graceful shutdown)."""
+        leftover = self.incoming_transcript.drain()
+        if leftover.strip():
+            self._log("[Transcription Worker] Draining leftover text to Ollama queue before shutdown.")
+            self._emit_block(leftover)
+
+def get_pipeline(source):
+    """The pipeline of an audio source, created (feeding ollama_queue) the first time the source is seen."""
+    if source not in pipelines:
+        pipelines[source] = TranscriptionPipeline(source)
+    return pipelines[source]
+
+def _collect_batch(audio_queue, first_chunk, batch_wait=AUDIO_SOURCE_BATCH_WAIT):
+    """
+    Drain whatever else is already waiting in audio_queue (up to WHISPER_MAX_BATCH_CHUNKS in total)
+    so a backlog is transcribed in one batched call instead of one chunk at a time.
+    With several sources, waits up to batch_wait seconds for the other sources'
+    chunks of the same interval, so all rooms share one Whisper call.
+    """
+    batch = [first_chunk]
+    deadline = time.monotonic() + batch_wait
+    while len(batch) < WHISPER_MAX_BATCH_CHUNKS:
+        try:
+            if len({chunk.source for chunk in batch}) < len(pipelines):
+                audio_chunk = audio_queue.get(timeout=max(deadline - time.monotonic(), 0))
+            else:
+                audio_chunk = audio_queue.get_nowait()
+        except Empty:
+            break
+        if audio_chunk is None:
+            continue
+        batch.append(audio_chunk)
+    return batch
+
+def transcribe_batch(batch):
+    """
+    Transcribe AudioChunks (from any mix of sources) with one batched Whisper call and
+    accumulate each chunk in its own source's pipeline, in the order they were captured.
+    Chunks rejected by their source's silence gate skip Whisper but still end that source's block.
+    A source's final chunk ends its stream and removes its pipeline.
+    """
+    chunk_pipelines = [get_pipeline(chunk.source) for chunk in batch]
+    has_speech = [pipeline.silence_gate is None or pipeline.silence_gate.check(chunk.audio)
+                  for chunk, pipeline in zip(batch, chunk_pipelines)]
+
+    speech_chunks = [chunk for chunk, keep in zip(batch, has_speech) if keep]
+    WHISPER_CHUNKS.inc("speech", amount=len(speech_chunks))
+    WHISPER_CHUNKS.inc("silence", amount=len(batch) - len(speech_chunks))
+    results = iter(_transcribe_audio_chunks(speech_chunks) if speech_chunks else [])
+    for chunk, pipeline, keep in zip(batch, chunk_pipelines, has_speech):
+        if keep:
+            pipeline.accumulate_chunk(chunk, next(results))
+        else:
+            pipeline.skip_silent_chunk(chunk)
+        if chunk.final:
+            pipeline.end_of_stream()
+            pipelines.pop(chunk.source, None)
+
+def transcription_worker(audio_queue, batch_wait=AUDIO_SOURCE_BATCH_WAIT):
+    """
+    Worker that continuously pulls AudioChunks from audio_queue,
+    transcribes them, and accumulates text if valid speech is detected.
+    When chunks have piled up, they are transcribed together in one batch and
+    accumulated in the order they were captured. Chunks rejected by the silence
+    gate skip Whisper but still end the current block like any other silence.
+    """
+    while not shutdown_event.is_set():
+        try:
+            audio_chunk = audio_queue.get(timeout=1)
+        except Empty:
+            continue
+        if audio_chunk is None:
+            continue
+
+        batch = _collect_batch(audio_queue, audio_chunk, batch_wait)
+        if len(batch) > len(pipelines):
+            log_and_print(f"Audio queue backed up; transcribing {len(batch)} chunks in one batch.")
+        # Compared per source, so N rooms capturing in step do not count as a backlog by themselves
+        _adjust_model_for_backlog((audio_queue.qsize() + len(batch)) / max(len(pipelines), 1))
+
+        journal_batch_begin()
+        transcribe_batch(batch)
+        journal_batch_done(batch)
+        for chunk in batch:
+            audio_queue.task_done()
+
+        # How far behind real time transcription is running
+        now = time.time()
+        for chunk in batch:
+            TRANSCRIPTION_LAG.observe(now - chunk.end_time)
+        TRANSCRIPTION_LAG_SECONDS.set(now - batch[-1].end_time)
 
-        audio_queue.task_done()
+def shutdown_whisper_processes():
+    """Stop the Whisper worker processes ("process" execution mode only)."""
+    global whisper_pool
+    if whisper_pool is not None:
+        whisper_pool.close()
+        whisper_pool = None
 
 def _drain_accumulated_text():
     """
-    Called during graceful shutdown to enqueue leftover 'incoming_text' to Ollama queue
-    so that no transcription is lost before the program exits.
+    Called during graceful shutdown to enqueue every source's leftover accumulated transcript
+    to the Ollama queue so that no transcription is lost before the program exits.
     """
-    global incoming_text
-    if incoming_text.strip():
-        log_and_print("[Transcription Worker] Draining leftover text to Ollama queue before shutdown.")
-        ollama_queue.put(incoming_text)
-        incoming_text = ""
\ No newline at end of file
+    for pipeline in list(pipelines.values()):
+        pipeline.drain()